@@ -1,32 +1,21 @@
-import numpy as np
-from numpy import sin, cos
+from moment_tensor import sdr_to_cmt
 
-S  = np.deg2rad(310)
-D  = np.deg2rad(66)
-R  = np.deg2rad(-171)
+S  = 310
+D  = 66
+R  = -171
 
-Mxx = -1.0 * ( sin(D) * cos(R) * sin (2*S) + sin(2*D) * sin(R) * sin(S)*sin(S) )
-Myy =        ( sin(D) * cos(R) * sin (2*S) - sin(2*D) * sin(R) * cos(S)*cos(S) )
-Mzz = -1.0 * ( Mxx + Myy)
-Mxy =        ( sin(D) * cos(R) * cos (2*S) + 0.5 * sin(2*D) * sin(R) * sin(2*S) )
-Mxz = -1.0 * ( cos(D) * cos(R) * cos (S)   + cos(2*D) * sin(R) * sin(S) )
-Myz = -1.0 * ( cos(D) * cos(R) * sin (S)   - cos(2*D) * sin(R) * cos(S) )
+# Same conversion as strike_dip_rake_to_CMTSOLUTION.c; S, D, R may also be
+# arrays of many mechanisms, see moment_tensor.py for the batch CLI
+(Mxx, Myy, Mzz, Mxy, Mxz, Myz), (Mrr, Mtt, Mpp, Mrt, Mrp, Mtp) = \
+    sdr_to_cmt(S, D, R)
 
-printf("\nOutput Aki&Richards1980:  Mxx  Myy  Mzz  Mxy  Mxz  Myz \n")
-printf("%9.5f %9.5f %9.5f %9.5f %9.5f %9.5f\n",Mxx, Myy, Mzz, Mxy, Mxz, Myz)
+print("\nOutput Aki&Richards1980:  Mxx  Myy  Mzz  Mxy  Mxz  Myz ")
+print("%9.5f %9.5f %9.5f %9.5f %9.5f %9.5f" % (Mxx, Myy, Mzz, Mxy, Mxz, Myz))
 
-Mtt = Mxx
-Mpp = Myy
-Mrr = Mzz
-Mtp = Mxy * -1.0
-Mrt = Mxz
-Mrp = Myz * -1.0
-
-
-printf("\nOutput Harvard CMTSOLUTION:  Mrr Mtt Mpp Mrt Mrp Mtp\n")
-printf("Mrr: %9.5f\n",Mrr)
-printf("Mtt: %9.5f\n",Mtt)
-printf("Mpp: %9.5f\n",Mpp)
-printf("Mrt: %9.5f\n",Mrt)
-printf("Mrp: %9.5f\n",Mrp)
-printf("Mtp: %9.5f\n\n",Mtp)
+print("\nOutput Harvard CMTSOLUTION:  Mrr Mtt Mpp Mrt Mrp Mtp")
+print("Mrr: %9.5f" % Mrr)
+print("Mtt: %9.5f" % Mtt)
+print("Mpp: %9.5f" % Mpp)
+print("Mrt: %9.5f" % Mrt)
+print("Mrp: %9.5f" % Mrp)
+print("Mtp: %9.5f\n" % Mtp)
@@ -0,0 +1,95 @@
+"""
+Benchmark the single-pass SPECFEM ASCII parser against the old read_sem path
+(two np.loadtxt calls, or a readlines() loop for comma separated files).
+
+Synthetic 140k-sample seismograms (NSTEP = 140000 for our Venus runs) are
+written in both ASCII dialects to a temporary directory, so nothing here
+needs real simulation output.
+
+    python benchmarks/bench_read_sem.py [--npts 140000] [--repeat 3]
+"""
+import os
+import sys
+import argparse
+import tempfile
+from time import perf_counter
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+from sem_ascii import read_sem_ascii
+from fixtures import write_sem_whitespace, write_sem_comma
+
+
+def read_sem_legacy(fid):
+    """
+    Verbatim copy of the parsing block that read_sem used before the single
+    pass parser, kept here as the benchmark baseline
+    """
+    try:
+        times = np.loadtxt(fname=fid, usecols=0)
+        data = np.loadtxt(fname=fid, usecols=1)
+    except ValueError:
+        times, data = [], []
+        with open(fid, 'r') as f:
+            lines = f.readlines()
+        for line in lines:
+            try:
+                time_, data_ = line.strip().split(',')
+            except ValueError:
+                if "*" in line:
+                    time_ = data_ = line.split('*')[-1]
+                else:
+                    raise ValueError
+            times.append(float(time_))
+            data.append(float(data_))
+
+        times = np.array(times)
+        data = np.array(data)
+
+    return times, data
+
+
+def best_of(func, fid, repeat):
+    """
+    Return the fastest wall time of `repeat` calls, plus the last result
+    """
+    timings = []
+    for _ in range(repeat):
+        tstart = perf_counter()
+        result = func(fid)
+        timings.append(perf_counter() - tstart)
+    return min(timings), result
+
+
+def main(npts=140000, repeat=3, dt=0.05):
+    times = np.arange(npts) * dt
+    data = 1E-6 * np.sin(2 * np.pi * 0.014 * times) * np.exp(-times / 2000)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for dialect, writer in [("whitespace", write_sem_whitespace),
+                                ("comma", write_sem_comma)]:
+            fid = os.path.join(tmpdir, f"XX.S000.BXX.semd.{dialect}")
+            writer(fid, times, data)
+            size_mb = os.path.getsize(fid) / 1E6
+
+            t_old, (times_old, data_old) = best_of(read_sem_legacy, fid,
+                                                   repeat)
+            t_new, (times_new, data_new) = best_of(read_sem_ascii, fid,
+                                                   repeat)
+            assert np.array_equal(times_old, times_new)
+            assert np.array_equal(data_old, data_new)
+
+            print(f"{dialect:>10} ({npts} samples, {size_mb:.1f} MB): "
+                  f"legacy {t_old*1E3:8.1f} ms | "
+                  f"single-pass {t_new*1E3:8.1f} ms | "
+                  f"speedup {t_old/t_new:5.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--npts", type=int, default=140000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    main(npts=args.npts, repeat=args.repeat)
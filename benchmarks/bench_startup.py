@@ -0,0 +1,103 @@
+"""
+Benchmark the startup cost of processes that read seismograms with specfem_io.
+
+Measures, in fresh interpreters, how long `import specfem_io` takes and which
+heavy packages it drags in, against importing what the old io.py loaded
+eagerly (matplotlib.pyplot, ObsPy, scipy.signal; PySEP too if installed).
+Then times spawned pool workers from submission to the first parsed
+seismogram, which is what every read_sem_dir worker pays on platforms that
+spawn rather than fork.
+
+    python benchmarks/bench_startup.py [--repeat 5] [--workers 2]
+"""
+import os
+import sys
+import argparse
+import tempfile
+import subprocess
+import multiprocessing
+from time import perf_counter
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, ROOT)
+
+# Packages that should only be imported by plotting or SAC header code
+HEAVY = ["matplotlib", "scipy", "pysep", "h5py", "cv2"]
+
+
+def time_import(statement, repeat=5):
+    """
+    Fastest wall time of running `statement` in a fresh interpreter, minus
+    the interpreter's own startup, and the heavy packages it imported
+    """
+    check = (f"import sys; {statement}; "
+             f"print(','.join(_ for _ in {HEAVY} if _ in sys.modules))")
+    env = dict(os.environ, PYTHONPATH=ROOT, MPLBACKEND="Agg")
+
+    def run(code):
+        tstart = perf_counter()
+        out = subprocess.run([sys.executable, "-c", code], env=env,
+                             check=True, capture_output=True, text=True)
+        return perf_counter() - tstart, out.stdout.strip()
+
+    bare = min(run("pass")[0] for _ in range(repeat))
+    timings, loaded = zip(*[run(check) for _ in range(repeat)])
+    return min(timings) - bare, loaded[-1]
+
+
+def _first_read(fid):
+    """
+    Worker task: import the reader and parse one seismogram
+    """
+    from specfem_io import read_sem
+    return len(read_sem(fid)[0].data)
+
+
+def time_workers(fid, workers=2, repeat=5):
+    """
+    Fastest time from creating a spawn pool to every worker having parsed
+    one seismogram
+    """
+    ctx = multiprocessing.get_context("spawn")
+    timings = []
+    for _ in range(repeat):
+        tstart = perf_counter()
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as ex:
+            list(ex.map(_first_read, [fid] * workers))
+        timings.append(perf_counter() - tstart)
+    return min(timings)
+
+
+def main(repeat=5, workers=2, npts=140000, dt=0.05):
+    baseline = "import matplotlib.pyplot, obspy, scipy.signal"
+    try:
+        import pysep  # NOQA
+        baseline += ", pysep"
+    except ImportError:
+        pass
+
+    for name, statement in [("old io.py imports", baseline),
+                            ("import specfem_io", "import specfem_io")]:
+        elapsed, loaded = time_import(statement, repeat)
+        print(f"{name:>18}: {elapsed * 1E3:7.1f} ms, heavy packages: "
+              f"{loaded or 'none'}")
+
+    times = np.arange(npts) * dt
+    data = 1E-6 * np.sin(2 * np.pi * 0.014 * times)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        fid = os.path.join(tmpdir, "XX.S000.BXX.semd")
+        np.savetxt(fid, np.column_stack([times, data]), fmt="%15.7E")
+        elapsed = time_workers(fid, workers, repeat)
+    print(f"{workers} spawned workers to first seismogram: "
+          f"{elapsed * 1E3:7.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+    main(repeat=args.repeat, workers=args.workers)
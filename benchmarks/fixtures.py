@@ -0,0 +1,106 @@
+"""
+Synthetic inputs for the benchmarks, written offline to a temporary
+directory so that nothing needs simulation output, model files or a network:
+seismograms in both SPECFEM ASCII dialects, Dumoulin style .out profiles,
+strike/dip/rake CSVs and a define_external_model.f90 template. Sizes default
+to those of our Venus runs (NSTEP = 140000, 500 row profiles).
+
+    from fixtures import synthetic_trace, write_sem_whitespace
+"""
+import numpy as np
+
+
+R_VENUS = 6051.8
+
+# Radii (km) of the core-mantle, lower/upper mantle, deep mantle and crust
+# boundaries of the synthetic profiles, ordered by depth
+BOUNDARIES = [2900., 4940., 5590., 6000.]
+
+
+def synthetic_trace(npts=140000, dt=0.05, t0=0., seed=0):
+    """
+    Decaying wave packets at random times, roughly the look of a
+    displacement seismogram
+
+    :rtype: tuple of np.ndarray
+    :return: (times, data)
+    """
+    rng = np.random.default_rng(seed)
+    times = t0 + np.arange(npts) * dt
+    data = np.zeros(npts)
+    for onset in np.sort(rng.uniform(times[0], times[-1], 5)):
+        after = np.clip(times - onset, 0, None)
+        data += (times >= onset) * np.sin(2 * np.pi * 0.014 * after) * \
+            np.exp(-after / 800) * rng.uniform(0.2, 1)
+    return times, 1E-6 * data
+
+
+def write_sem_whitespace(fid, times, data):
+    """
+    Two column format, e.g., '  0.0000000E+00  1.2345678E-10'
+    """
+    np.savetxt(fid, np.column_stack([times, data]), fmt="%15.7E")
+
+
+def write_sem_comma(fid, times, data):
+    """
+    Post-2018 comma separated format, with Fortran list-directed repeats
+    (2*value) whenever time and data are identical, e.g., the first sample
+    """
+    with open(fid, "w") as f:
+        for t, d in zip(times, data):
+            if t == d:
+                f.write(f"   2*{t:.7E}\n")
+            else:
+                f.write(f"  {t:.7E},  {d:.7E}\n")
+
+
+def write_dumoulin(fid, nrows=500, seed=0):
+    """
+    Dumoulin et al. 2017 style profile: one header line, then radius (km),
+    temperature (K), an unused column, density (kg/m^3), vp and vs (km/s)
+    on a uniform radius grid, smooth within layers and jumping at
+    BOUNDARIES, with a fluid core
+    """
+    rng = np.random.default_rng(seed)
+    radius = np.linspace(R_VENUS / nrows, R_VENUS, nrows)
+    layer = np.searchsorted(BOUNDARIES, radius)
+    depth = 1 - radius / R_VENUS
+
+    temperature = 1184. + 2000. * depth ** 1.5
+    density = np.array([11800., 5500., 4300., 3600., 2950.])[layer] + \
+        1500. * depth ** 2
+    vp = np.array([9.9, 13.0, 10.5, 8.2, 5.8])[layer] + 2. * depth ** 2
+    vs = np.array([0., 7.0, 5.6, 4.5, 3.2])[layer] * (1 + 0.2 * depth ** 2)
+    # Small perturbations, so no two synthetic models are identical
+    vp *= 1 + 1E-3 * rng.standard_normal()
+
+    np.savetxt(fid, np.column_stack([radius, temperature, np.zeros(nrows),
+                                     density, vp, vs]), header="hdr",
+               comments="")
+
+
+def write_mechanisms(fid, n=1000, seed=0):
+    """
+    CSV of random strike, dip, rake and scalar moment, with a header line,
+    as read by moment_tensor.py
+    """
+    rng = np.random.default_rng(seed)
+    data = np.column_stack([rng.uniform(0, 360, n), rng.uniform(0, 90, n),
+                            rng.uniform(-180, 180, n),
+                            10 ** rng.uniform(20, 25, n)])
+    np.savetxt(fid, data, fmt="%.4f,%.4f,%.4f,%.6e",
+               header="strike,dip,rake,m0", comments="")
+
+
+def write_external_model_template(fid):
+    """
+    The parts of define_external_model.f90 that get_model.py rewrites: the
+    NR_AK135F_NO_MUD parameter, the tables and the outer core clamp
+    """
+    with open(fid, "w") as f:
+        f.write("  integer, parameter :: NR_AK135F_NO_MUD = 1\n"
+                "  radius_ak135(  1) =   0.000000000000000E+000\n"
+                "  Qmu_ak135(  1) =   0.000000000000000E+000\n"
+                "  if (material_element(ispec) == IREGION_OUTER_CORE .and. "
+                "ii < 2) ii = 2\n")
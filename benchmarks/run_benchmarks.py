@@ -0,0 +1,359 @@
+"""
+Time every stage of the seismogram, model and source tooling across input
+sizes, with peak memory, and store the results as JSON to compare commits.
+
+Inputs are synthesized offline by fixtures.py: .semd files in both ASCII
+dialects, Dumoulin style .out profiles and strike/dip/rake CSVs, while
+STATIONS files come from make_stations.py itself. Each stage runs once to
+warm up, `--repeat` times for the best and median wall time, and once more
+under tracemalloc for the peak of Python and NumPy allocations. The C
+moment tensor tool is compiled with `cc` if one is available, and its stage
+is skipped otherwise.
+
+    python benchmarks/run_benchmarks.py -o bench_f914498.json
+    python benchmarks/run_benchmarks.py --quick -s read_sem_comma filter_plot \
+        --compare bench_f914498.json
+"""
+import io
+import os
+import sys
+import json
+import argparse
+import platform
+import resource
+import tempfile
+import subprocess
+import tracemalloc
+from datetime import datetime
+from time import perf_counter
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, ROOT)
+
+import fixtures  # NOQA
+
+
+def setup_read_sem(tmpdir, size, writer):
+    """
+    One seismogram of `size` samples, parsed into an ObsPy Stream
+    """
+    from specfem_io import read_sem
+
+    fid = os.path.join(tmpdir, f"XX.S000.BXX.{size}.semd")
+    writer(fid, *fixtures.synthetic_trace(size))
+    return (lambda: read_sem(fid)), {"bytes": os.path.getsize(fid)}
+
+
+def setup_read_sem_whitespace(tmpdir, size):
+    return setup_read_sem(tmpdir, size, fixtures.write_sem_whitespace)
+
+
+def setup_read_sem_comma(tmpdir, size):
+    return setup_read_sem(tmpdir, size, fixtures.write_sem_comma)
+
+
+def setup_read_sem_block(tmpdir, size, npts=140000):
+    """
+    `size` seismograms of a run parsed serially into one SemBlock
+    """
+    from specfem_io import read_sem_block
+
+    times, data = fixtures.synthetic_trace(npts)
+    fids = []
+    for i in range(size):
+        fid = os.path.join(tmpdir, f"XX.S{i:03d}.BXX.semd")
+        if not fids:
+            fixtures.write_sem_whitespace(fid, times, data)
+        else:
+            os.link(fids[0], fid)
+        fids.append(fid)
+    nbytes = sum(os.path.getsize(_) for _ in fids)
+    return (lambda: read_sem_block(fids, workers=1)), {"bytes": nbytes}
+
+
+def setup_filter_plot(tmpdir, size, npts=140000):
+    """
+    Lowpass, decimate, normalize and draw a record section of `size`
+    receivers, the per-figure loop of specfem_io.record_section
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+    from matplotlib import pyplot as plt
+    from specfem_io import SemBlock
+
+    data = np.stack([fixtures.synthetic_trace(npts, seed=i)[1]
+                     for i in range(size)])
+    stations = [f"S{i:03d}" for i in range(size)]
+
+    def run():
+        block = SemBlock(data.copy(), 0., 0.05, stations, "XX", "BXX")
+        block.lowpass(0.018, decimate=True)
+        block.normalize()
+        fig, ax = plt.subplots(figsize=(8, 10))
+        block.plot(ax)
+        fig.canvas.draw()
+        plt.close(fig)
+
+    return run, {"samples": data.size}
+
+
+def setup_get_model(tmpdir, size):
+    """
+    get_model.py on a `size` row profile: read, find the named boundaries,
+    format the tables and splice them into define_external_model.f90
+    """
+    from dumoulin_model import read_dumoulin, PROPS
+    from get_model import (find_named_boundaries, model_table,
+                           write_define_external_model)
+
+    fid = os.path.join(tmpdir, f"V5-Th.{size}.out")
+    template = os.path.join(tmpdir, "define_external_model.f90")
+    output = os.path.join(tmpdir, "define_external_model.out.f90")
+    fixtures.write_dumoulin(fid, size)
+    fixtures.write_external_model_template(template)
+
+    def run():
+        radius, values = read_dumoulin(fid)
+        density, vp, vs = values[0, [PROPS["density"], PROPS["vp"],
+                                     PROPS["vs"]]]
+        boundaries = find_named_boundaries(radius, vs)
+        table = model_table(radius, density, vp, vs, boundaries)
+        write_define_external_model(table, len(radius) + 1, template, output)
+
+    return run, {"bytes": os.path.getsize(fid)}
+
+
+def setup_resample_profiles(tmpdir, size, nrows=500):
+    """
+    Thin a stack of `size` profiles to a 1E-3 tolerance
+    """
+    from dumoulin_model import read_dumoulin, resample_profiles
+
+    fids = [os.path.join(tmpdir, f"V{i}.out") for i in range(size)]
+    for i, fid in enumerate(fids):
+        fixtures.write_dumoulin(fid, nrows, seed=i)
+    radius, values = read_dumoulin(fids)
+    return (lambda: resample_profiles(radius, values, 1E-3)), \
+        {"rows": values.shape[0] * values.shape[-1]}
+
+
+def setup_make_stations(tmpdir, size):
+    """
+    Write a STATIONS file of `size` surface receivers and read it back
+    """
+    from make_stations import station_lines
+    from specfem_data import read_stations_file
+
+    angles = np.round(np.linspace(90, -90, size)).astype(int)
+    fid = os.path.join(tmpdir, f"STATIONS.{size}")
+
+    def run():
+        with open(fid, "w") as f:
+            f.write("\n".join(station_lines(angles)) + "\n")
+        return read_stations_file(fid)
+
+    return run, {}
+
+
+def setup_moment_tensor(tmpdir, size):
+    """
+    moment_tensor.py converting `size` mechanisms to CMTSOLUTION blocks
+    """
+    import moment_tensor
+
+    fid = os.path.join(tmpdir, f"mechanisms.{size}.csv")
+    fixtures.write_mechanisms(fid, size)
+    return (lambda: moment_tensor.main(fid, "cmt", output=io.StringIO())), \
+        {"bytes": os.path.getsize(fid)}
+
+
+def setup_moment_tensor_c(tmpdir, size):
+    """
+    strike_dip_rake_to_CMTSOLUTION.c, one process per mechanism as it is
+    used, for `size` mechanisms. None if it cannot be compiled here
+    """
+    exe = os.path.join(tmpdir, "strike_dip_rake_to_CMTSOLUTION")
+    src = os.path.join(ROOT, "strike_dip_rake_to_CMTSOLUTION.c")
+    try:
+        subprocess.run(["cc", "-O2", "-o", exe, src, "-lm"], check=True,
+                       capture_output=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+    fid = os.path.join(tmpdir, f"mechanisms.{size}.csv")
+    fixtures.write_mechanisms(fid, size)
+    mechanisms = np.loadtxt(fid, delimiter=",", skiprows=1)[:, :3]
+
+    def run():
+        for sdr in mechanisms:
+            subprocess.run([exe, *[f"{_:.4f}" for _ in sdr]], check=True,
+                           capture_output=True)
+
+    return run, {}
+
+
+# Stage name: (setup, sizes, --quick sizes, what the size counts)
+STAGES = {
+    "read_sem_whitespace": (setup_read_sem_whitespace, [14000, 140000],
+                            [14000], "samples"),
+    "read_sem_comma": (setup_read_sem_comma, [14000, 140000], [14000],
+                       "samples"),
+    "read_sem_block": (setup_read_sem_block, [12, 48], [4], "files"),
+    "filter_plot": (setup_filter_plot, [12, 48], [4], "receivers"),
+    "get_model": (setup_get_model, [500, 5000], [500], "rows"),
+    "resample_profiles": (setup_resample_profiles, [10, 100], [10],
+                          "models"),
+    "make_stations": (setup_make_stations, [1000, 100000], [1000],
+                      "stations"),
+    "moment_tensor": (setup_moment_tensor, [1000, 100000], [1000],
+                      "mechanisms"),
+    "moment_tensor_c": (setup_moment_tensor_c, [10, 100], [10],
+                        "mechanisms"),
+}
+
+
+def measure(func, repeat=3):
+    """
+    Wall time and peak traced memory of a benchmark callable
+
+    :type func: function
+    :param func: stage to time, called without arguments
+    :type repeat: int
+    :param repeat: number of timed calls, after one warm up call
+    :rtype: dict
+    :return: best and median time (s), peak allocations (MB)
+    """
+    func()
+    timings = []
+    for _ in range(repeat):
+        tstart = perf_counter()
+        func()
+        timings.append(perf_counter() - tstart)
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {"best": min(timings), "median": float(np.median(timings)),
+            "peak_mb": peak / 1E6}
+
+
+def git_commit():
+    """
+    Commit of the working tree, with '-dirty' if it has local changes, or
+    None outside a git checkout
+    """
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT,
+                                check=True, capture_output=True,
+                                text=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "-uno"],
+                               cwd=ROOT, check=True, capture_output=True,
+                               text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ("-dirty" if dirty else "")
+
+
+def run_suite(stages=None, quick=False, repeat=3):
+    """
+    Run benchmark stages on fresh fixtures
+
+    :type stages: list of str
+    :param stages: names of STAGES to run, defaults to all
+    :type quick: bool
+    :param quick: only the small sizes, e.g., as a smoke test
+    :type repeat: int
+    :param repeat: timed calls per stage and size
+    :rtype: dict
+    :return: environment and one result per stage and size, as stored
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for name in stages or STAGES:
+            setup, sizes, quick_sizes, unit = STAGES[name]
+            for size in quick_sizes if quick else sizes:
+                workdir = os.path.join(tmpdir, f"{name}.{size}")
+                os.mkdir(workdir)
+                stage = setup(workdir, size)
+                if stage is None:
+                    print(f"{name:>20} {size:>8} {unit:<10} skipped")
+                    results.append({"stage": name, "size": size,
+                                    "unit": unit, "skipped": True})
+                    break
+                func, info = stage
+                result = {"stage": name, "size": size, "unit": unit,
+                          **measure(func, repeat), **info}
+                results.append(result)
+                print(f"{name:>20} {size:>8} {unit:<10} "
+                      f"{result['best'] * 1E3:10.1f} ms "
+                      f"{result['peak_mb']:9.1f} MB")
+
+    return {"commit": git_commit(), "date": datetime.now().isoformat(),
+            "python": platform.python_version(), "numpy": np.__version__,
+            "platform": platform.platform(), "repeat": repeat,
+            "maxrss_mb": resource.getrusage(
+                resource.RUSAGE_SELF).ru_maxrss / 1E3,
+            "results": results}
+
+
+def compare(suite, baseline, threshold=1.2):
+    """
+    Print the timing ratio of every stage and size to a stored baseline
+
+    :type suite: dict
+    :param suite: output of `run_suite`
+    :type baseline: dict
+    :param baseline: an earlier output of `run_suite`, read from its JSON
+    :type threshold: float
+    :param threshold: ratio above which a stage is flagged as slower
+    :rtype: list of tuple
+    :return: (stage, size) of the stages that got slower
+    """
+    before = {(_["stage"], _["size"]): _ for _ in baseline["results"]
+              if not _.get("skipped")}
+    print(f"compared to {baseline.get('commit')} ({baseline.get('date')}):")
+    slower = []
+    for result in suite["results"]:
+        key = (result["stage"], result["size"])
+        if result.get("skipped") or key not in before:
+            continue
+        ratio = result["best"] / before[key]["best"]
+        flag = ""
+        if ratio > threshold:
+            flag = "  SLOWER"
+            slower.append(key)
+        print(f"{key[0]:>20} {key[1]:>8} {ratio:6.2f}x time "
+              f"{result['peak_mb'] - before[key]['peak_mb']:+9.1f} MB{flag}")
+    return slower
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("-s", "--stages", nargs="+", default=None,
+                        choices=list(STAGES), help="stages to run")
+    parser.add_argument("--quick", action="store_true",
+                        help="only the smallest sizes")
+    parser.add_argument("-r", "--repeat", type=int, default=3,
+                        help="timed calls per stage and size")
+    parser.add_argument("-o", "--output", default=None,
+                        help="write the results to this JSON file")
+    parser.add_argument("--compare", default=None,
+                        help="JSON results of an earlier run to compare to")
+    parser.add_argument("--threshold", type=float, default=1.2,
+                        help="time ratio flagged as a regression")
+    args = parser.parse_args()
+
+    suite = run_suite(args.stages, args.quick, args.repeat)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(suite, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            slower = compare(suite, json.load(f), args.threshold)
+        sys.exit(1 if slower else 0)
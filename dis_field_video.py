@@ -1,28 +1,224 @@
 """
-Create a video from a sequence of JPG images.
+Create videos from the wavefield snapshot JPGs SPECFEM2D writes.
 
-This script reads JPG images from the 'step_wavefeild' directory,
-determines the dimensions from the first image, and generates:
-1. An AVI video file ('video_V1_Th.avi') at 20 fps 
+For every run directory given, the JPG images in its 'step_wavefeild'
+directory are decoded by a pool of threads (OpenCV releases the GIL while
+decoding) into a bounded prefetch queue, and written in order to
+'video_<model>.avi', where <model> is the run directory name. Only `prefetch`
+frames are ever held in memory, however many snapshots a run has, and
+several runs can be encoded at once in separate processes:
 
+    python dis_field_video.py venus_models_2D/V1_Th venus_models_2D/V5_Th \
+        --fps 20 --stride 2 --scale 0.5 --codec MJPG --workers 2
 """
-import cv2
 import os
+import argparse
+from glob import glob
+from collections import deque
+from time import perf_counter
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import cv2
+
+
+def list_frames(image_folder, pattern="*.jpg", stride=1):
+    """
+    Sorted snapshot images of a run, keeping every `stride`-th one
+
+    :type image_folder: str
+    :param image_folder: directory with the snapshots
+    :type pattern: str
+    :param pattern: glob of the snapshot files
+    :type stride: int
+    :param stride: only use every `stride`-th snapshot
+    :rtype: list of str
+    :return: paths of the frames in the order they are written
+    """
+    return sorted(glob(os.path.join(image_folder, pattern)))[::stride]
+
+
+def read_frame(fid, scale=None):
+    """
+    Decode one image, optionally resized by `scale`
+
+    :type fid: str
+    :param fid: path to the image
+    :type scale: float
+    :param scale: resize factor, e.g., 0.5 for half width and height
+    :rtype: np.ndarray
+    :return: (height, width, 3) BGR image
+    :raises ValueError: if OpenCV cannot read the image
+    """
+    frame = cv2.imread(fid)
+    if frame is None:
+        raise ValueError(f"could not read image {fid}")
+    if scale and scale != 1:
+        frame = cv2.resize(frame, None, fx=scale, fy=scale,
+                           interpolation=cv2.INTER_AREA)
+    return frame
+
+
+def iter_frames(fids, scale=None, threads=4, prefetch=16):
+    """
+    Decode frames in a thread pool and yield them in order, with at most
+    `prefetch` decoded or decoding frames held at any time
+
+    :type fids: list of str
+    :param fids: image paths, in order
+    :type scale: float
+    :param scale: see `read_frame`
+    :type threads: int
+    :param threads: number of decoding threads
+    :type prefetch: int
+    :param prefetch: number of frames decoded ahead of the writer
+    :rtype: generator of np.ndarray
+    """
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        queue = deque()
+        for fid in fids:
+            if len(queue) >= prefetch:
+                yield queue.popleft().result()
+            queue.append(executor.submit(read_frame, fid, scale))
+        while queue:
+            yield queue.popleft().result()
+
+
+def write_video(frames, video_name, fps=20, codec="MJPG"):
+    """
+    Encode a stream of frames, sizing the writer from the first one
+
+    :type frames: iterable of np.ndarray
+    :param frames: (height, width, 3) BGR uint8 images, e.g., from
+        `iter_frames`; consumed one at a time
+    :type video_name: str
+    :param video_name: output video file
+    :type fps: float
+    :param fps: frames per second of the video
+    :type codec: str
+    :param codec: four character code passed to OpenCV, e.g., 'MJPG',
+        'XVID' or 'mp4v', or 'raw' for uncompressed frames (very large files)
+    :rtype: tuple of int
+    :return: (number of frames, width, height)
+    :raises RuntimeError: if OpenCV cannot open a writer for the codec
+    """
+    video = None
+    nframes, width, height = 0, 0, 0
+    try:
+        for frame in frames:
+            if video is None:
+                height, width = frame.shape[:2]
+                fourcc = 0 if codec == "raw" else \
+                    cv2.VideoWriter_fourcc(*codec)
+                video = cv2.VideoWriter(video_name, fourcc, fps,
+                                        (width, height))
+                if not video.isOpened():
+                    raise RuntimeError(f"could not open {video_name} with "
+                                       f"codec {codec}")
+            video.write(frame)
+            nframes += 1
+    finally:
+        if video is not None:
+            video.release()
+
+    return nframes, width, height
+
+
+def make_video(image_folder, video_name, fps=20, codec="MJPG", stride=1,
+               scale=None, pattern="*.jpg", threads=4, prefetch=16):
+    """
+    Encode the snapshots of one run into a video
+
+    :type image_folder: str
+    :param image_folder: directory with the snapshots
+    :type video_name: str
+    :param video_name: output video file
+    :param fps, codec: see `write_video`
+    :param stride, pattern: see `list_frames`
+    :param scale, threads, prefetch: see `iter_frames`
+    :rtype: dict
+    :return: summary with the number of frames and the frames/s achieved
+    :raises FileNotFoundError: if there are no snapshots to encode
+    """
+    tstart = perf_counter()
+    fids = list_frames(image_folder, pattern, stride)
+    if not fids:
+        raise FileNotFoundError(f"no {pattern} images in {image_folder}")
+
+    nframes, width, height = write_video(
+        iter_frames(fids, scale, threads, prefetch), video_name, fps, codec)
+
+    elapsed = perf_counter() - tstart
+    return {"video": video_name, "frames": nframes, "width": width,
+            "height": height, "time": elapsed, "fps": nframes / elapsed}
+
+
+def make_videos(runs, image_folder="step_wavefeild", output_dir=".",
+                workers=None, **kwargs):
+    """
+    Encode one video per run directory, runs in parallel processes
+
+    :type runs: list of str
+    :param runs: run directories, each with an `image_folder` of snapshots
+    :type image_folder: str
+    :param image_folder: snapshot directory inside each run
+    :type output_dir: str
+    :param output_dir: where to write the video_<model>.avi files
+    :type workers: int
+    :param workers: number of processes, 1 runs serially without a pool
+    :param kwargs: passed to `make_video`
+    :rtype: list of dict
+    :return: one summary per run, in the order of `runs`
+    """
+    jobs = []
+    for run in runs:
+        model = os.path.basename(os.path.abspath(run))
+        jobs.append((os.path.join(run, image_folder),
+                     os.path.join(output_dir, f"video_{model}.avi")))
 
-model = 'V1_Th'
-image_folder = 'step_wavefeild'
-video_name = f'video_{model}.avi'
+    if workers == 1:
+        return [make_video(*job, **kwargs) for job in jobs]
 
-images = [img for img in os.listdir(image_folder) if img.endswith(".jpg")]
-images.sort()  
-frame = cv2.imread(os.path.join(image_folder, images[0]))
-height, width, layers = frame.shape
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(make_video, *job, **kwargs)
+                   for job in jobs]
+        return [future.result() for future in futures]
 
-video = cv2.VideoWriter(video_name, 0, 20, (width, height))
 
-for image in images:
-	video.write(cv2.imread(os.path.join(image_folder, image)))
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("runs", nargs="*", default=["."],
+                        help="run directories, the video is named after "
+                             "each directory")
+    parser.add_argument("-i", "--image-folder", default="step_wavefeild",
+                        help="snapshot directory inside each run")
+    parser.add_argument("-o", "--output", default=".",
+                        help="directory to write the videos to")
+    parser.add_argument("--fps", type=float, default=20,
+                        help="frames per second of the video")
+    parser.add_argument("--codec", default="MJPG",
+                        help="OpenCV four character codec code, or 'raw' "
+                             "for uncompressed frames")
+    parser.add_argument("--stride", type=int, default=1,
+                        help="use every n-th snapshot")
+    parser.add_argument("--scale", type=float, default=None,
+                        help="resize frames by this factor")
+    parser.add_argument("--threads", type=int, default=4,
+                        help="decoding threads per video")
+    parser.add_argument("--prefetch", type=int, default=16,
+                        help="frames decoded ahead of the encoder")
+    parser.add_argument("-w", "--workers", type=int, default=None,
+                        help="number of videos encoded in parallel")
+    args = parser.parse_args()
 
-cv2.destroyAllWindows()
-video.release()
-print(f"Video '{video_name}' created successfully.")
+    tstart = perf_counter()
+    videos = make_videos(args.runs, image_folder=args.image_folder,
+                         output_dir=args.output, workers=args.workers,
+                         fps=args.fps, codec=args.codec, stride=args.stride,
+                         scale=args.scale, threads=args.threads,
+                         prefetch=args.prefetch)
+    for video in videos:
+        print(f"Video '{video['video']}' created successfully: "
+              f"{video['frames']} frames of {video['width']}x"
+              f"{video['height']} in {video['time']:.2f}s "
+              f"({video['fps']:.1f} frames/s)")
+    print(f"{len(videos)} videos in {perf_counter() - tstart:.2f}s")
@@ -0,0 +1,314 @@
+"""
+Shared tools for the 1D Venus interior profiles of Dumoulin et al. 2017
+(the V?-T?.out files), used by get_model.py, get_layer_avg.py and
+plot_dumoulin2017_models.py.
+
+Everything works on a whole stack of models at once, so hundreds of candidate
+profiles can be screened without Python loops over models, layers or rows.
+Values are stacked as (nmodels, nprops, nrows) where nprops runs over the file
+columns after radius (see COLUMNS).
+
+The profiles can also be thinned to the rows needed to reproduce them within
+a tolerance, which shortens the define_external_model.f90 tables (see
+get_model.py --tolerance):
+
+    python dumoulin_model.py V*.out --tolerance 1E-3
+"""
+import argparse
+import numpy as np
+
+
+# Columns of a Dumoulin .out file, after one header line
+COLUMNS = ["radius", "temperature", "unknown", "density", "vp", "vs"]
+# Units: radius (km), temperature (K), density (kg/m^3), vp/vs (km/s)
+
+# Index of each property in the stacked values array (i.e. without radius)
+PROPS = {name: i for i, name in enumerate(COLUMNS[1:])}
+ELASTIC = [PROPS["density"], PROPS["vp"], PROPS["vs"]]
+
+
+def read_dumoulin(fids):
+    """
+    Read one or more Dumoulin .out files into a single stacked array
+
+    :type fids: str or list of str
+    :param fids: path(s) to .out files, e.g., sorted(glob('V[145]-*.out'))
+    :rtype: tuple of np.ndarray
+    :return: (radius, values); radius has shape (nrows,) and is taken from
+        the first file, values has shape (nmodels, 5, nrows) with properties
+        ordered as COLUMNS[1:]
+    :raises ValueError: if the files do not share the same radius sampling
+    """
+    if isinstance(fids, str):
+        fids = [fids]
+
+    tables = [np.loadtxt(fid, skiprows=1).T for fid in fids]
+    radius = tables[0][0]
+    for fid, table in zip(fids, tables):
+        if table.shape != tables[0].shape or \
+                not np.allclose(table[0], radius):
+            raise ValueError(f"{fid} does not share the radius sampling of "
+                             f"{fids[0]}, models cannot be stacked")
+
+    return radius, np.stack([table[1:] for table in tables])
+
+
+def find_discontinuities(values, n=None, threshold=None, return_jumps=False):
+    """
+    Find layer boundaries as the largest jumps between adjacent rows, looking
+    at all given properties at once. Each property's jumps are normalized by
+    that property's range in the model, so density in kg/m^3 does not drown
+    out velocities in km/s, and the largest normalized jump of any property
+    scores the interface.
+
+    Boundary index i means the jump lies between rows i and i+1, i.e., row i
+    is the last row of its layer.
+
+    :type values: np.ndarray
+    :param values: (nmodels, nprops, nrows), (nprops, nrows) or (nrows,)
+        e.g., values[:, ELASTIC] for density, vp and vs only
+    :type n: int
+    :param n: return the `n` largest jumps of each model
+    :type threshold: float
+    :param threshold: instead of `n`, return every jump whose normalized
+        score is at least `threshold` (0-1, fraction of the property range)
+    :type return_jumps: bool
+    :param return_jumps: also return the normalized score of each boundary,
+        e.g., to rank boundaries by size
+    :rtype: np.ndarray or list of np.ndarray
+    :return: boundary indices sorted by row, shape (nmodels, n) (or (n,) for
+        a single model) when `n` is given, a list with one array per model
+        when `threshold` is given
+    """
+    if (n is None) == (threshold is None):
+        raise ValueError("exactly one of `n` or `threshold` is required")
+
+    values = np.asarray(values, dtype=float)
+    single = values.ndim < 3
+    values = values.reshape((1,) * (3 - values.ndim) + values.shape)
+
+    diffs = np.abs(np.diff(values, axis=-1))
+    span = np.ptp(values, axis=-1, keepdims=True)
+    score = (diffs / np.where(span > 0, span, 1)).max(axis=1)
+
+    if n is not None:
+        idxs = np.argpartition(-score, n - 1, axis=-1)[:, :n]
+        idxs.sort(axis=-1)
+        jumps = np.take_along_axis(score, idxs, axis=-1)
+        if single:
+            idxs, jumps = idxs[0], jumps[0]
+    else:
+        idxs = [np.flatnonzero(s >= threshold) for s in score]
+        jumps = [s[i] for s, i in zip(score, idxs)]
+        if single:
+            idxs, jumps = idxs[0], jumps[0]
+
+    if return_jumps:
+        return idxs, jumps
+    return idxs
+
+
+def layer_means(values, boundaries):
+    """
+    Mean of every property within every layer of every model, computed with
+    a single np.add.reduceat over the flattened stack
+
+    :type values: np.ndarray
+    :param values: (nmodels, nprops, nrows), or (nprops, nrows) for one model
+    :type boundaries: np.ndarray or list of np.ndarray
+    :param boundaries: output of `find_discontinuities` for the same models
+    :rtype: np.ndarray or list of np.ndarray
+    :return: layer means, shape (nmodels, nprops, nlayers) (or
+        (nprops, nlayers) for a single model), ordered by row like the input.
+        A list of (nprops, nlayers) arrays if models have different numbers
+        of layers
+    """
+    values = np.asarray(values, dtype=float)
+    single = values.ndim == 2
+    if single:
+        values, boundaries = values[None], [boundaries]
+    nmodels, nprops, nrows = values.shape
+
+    # Each layer starts one row after a boundary
+    starts = [np.concatenate([[0], np.asarray(b, dtype=int) + 1])
+              for b in boundaries]
+    counts = [np.diff(np.append(s, nrows)) for s in starts]
+    flat_starts = np.concatenate([s + i * nrows for i, s in enumerate(starts)])
+
+    flat = values.transpose(1, 0, 2).reshape(nprops, nmodels * nrows)
+    sums = np.add.reduceat(flat, flat_starts, axis=1)
+    means = sums / np.concatenate(counts)
+
+    splits = np.cumsum([len(s) for s in starts])[:-1]
+    means = np.split(means, splits, axis=1)
+    if single:
+        return means[0]
+    if len(set(len(s) for s in starts)) == 1:
+        return np.stack(means)
+    return means
+
+
+def layer_ranges(radius, boundaries):
+    """
+    Radius of the first and last row of every layer
+
+    :type radius: np.ndarray
+    :param radius: radius of each row, as returned by `read_dumoulin`
+    :type boundaries: np.ndarray
+    :param boundaries: boundary indices of one model
+    :rtype: tuple of np.ndarray
+    :return: (first, last) radius of each layer
+    """
+    boundaries = np.asarray(boundaries, dtype=int)
+    first = radius[np.concatenate([[0], boundaries + 1])]
+    last = radius[np.append(boundaries, len(radius) - 1)]
+    return first, last
+
+
+def _interpolate_kept(radius, values, keep):
+    """
+    Linear interpolation of every row from the nearest kept rows below and
+    above it, for all models at once
+
+    :type radius: np.ndarray
+    :param radius: (nrows,) radius of each row
+    :type values: np.ndarray
+    :param values: (nmodels, nprops, nrows)
+    :type keep: np.ndarray
+    :param keep: (nmodels, nrows) rows kept, including the first and last
+    :rtype: np.ndarray
+    :return: (nmodels, nprops, nrows) interpolated values, equal to `values`
+        on kept rows
+    """
+    nrows = len(radius)
+    rows = np.arange(nrows)
+    lo = np.maximum.accumulate(np.where(keep, rows, 0), axis=-1)
+    hi = np.minimum.accumulate(np.where(keep, rows, nrows - 1)[:, ::-1],
+                               axis=-1)[:, ::-1]
+
+    span = radius[hi] - radius[lo]
+    weight = np.where(span > 0, (radius - radius[lo]) / np.where(
+        span > 0, span, 1), 0.)[:, None]
+    v_lo = np.take_along_axis(values, lo[:, None], axis=-1)
+    v_hi = np.take_along_axis(values, hi[:, None], axis=-1)
+    return v_lo + weight * (v_hi - v_lo)
+
+
+def resample_profiles(radius, values, tolerance=1E-3, props=None,
+                      boundaries=None, threshold=0.02):
+    """
+    Thin a stack of profiles to the rows needed for linear interpolation to
+    stay within `tolerance` of every original row, all models at once.
+
+    Both rows around every discontinuity are always kept, so jumps are
+    reproduced exactly (duplicated-radius pairs, as in AK135 style tables,
+    stay duplicated). Starting from those and the end rows, every segment
+    between kept rows gets the row it misfits most added if that misfit is
+    above the tolerance, for all segments of all models in one step, until
+    no segment needs another row.
+
+    :type radius: np.ndarray
+    :param radius: (nrows,) radius of each row, ascending
+    :type values: np.ndarray
+    :param values: (nmodels, nprops, nrows), as returned by `read_dumoulin`
+    :type tolerance: float
+    :param tolerance: largest interpolation error allowed, as a fraction of
+        each property's range in the model (as in `find_discontinuities`)
+    :type props: list of int
+    :param props: properties that must meet the tolerance, defaults to
+        ELASTIC (density, vp, vs). Other properties are thinned along
+    :type boundaries: np.ndarray or list of np.ndarray
+    :param boundaries: boundary indices to keep, one array shared by every
+        model or one array per model, see `find_discontinuities`. Defaults
+        to every jump of at least `threshold`
+    :type threshold: float
+    :param threshold: normalized jump that counts as a discontinuity when
+        `boundaries` are not given
+    :rtype: tuple
+    :return: (keep, report); keep is an (nmodels, nrows) boolean mask of the
+        rows to write, e.g., radius[keep[i]] and values[i][:, keep[i]],
+        report a structured array with each model's original and kept
+        number of rows and its largest relative and absolute (per property
+        in `props`) interpolation error
+    :raises ValueError: if `boundaries` holds one array per model but not
+        for every model
+    """
+    values = np.asarray(values, dtype=float)
+    if values.ndim == 2:
+        values = values[None]
+    props = ELASTIC if props is None else props
+    nmodels, _, nrows = values.shape
+    checked = values[:, props]
+
+    if boundaries is None:
+        boundaries = find_discontinuities(checked, threshold=threshold)
+    # One array of indices for all models, or one array per model
+    if not len(boundaries) or np.ndim(boundaries[0]) == 0:
+        boundaries = [boundaries] * nmodels
+    elif len(boundaries) != nmodels:
+        raise ValueError(f"{len(boundaries)} boundary arrays for {nmodels} "
+                         f"models")
+
+    keep = np.zeros((nmodels, nrows), dtype=bool)
+    keep[:, [0, -1]] = True
+    # Exactly duplicated radii are discontinuities in every model
+    dup = np.flatnonzero(np.diff(radius) == 0)
+    keep[:, dup] = keep[:, dup + 1] = True
+    for i, idx in enumerate(boundaries):
+        idx = np.asarray(idx, dtype=int)
+        keep[i, idx] = keep[i, idx + 1] = True
+
+    span = np.ptp(checked, axis=-1, keepdims=True)
+    span = np.where(span > 0, span, 1)
+    rows = np.arange(nrows)
+    while True:
+        error = np.abs(_interpolate_kept(radius, checked, keep) - checked)
+        error = (error / span).max(axis=1)
+        error[keep] = 0
+
+        # Worst row of every segment, segments numbered by their first row
+        segment = np.maximum.accumulate(np.where(keep, rows, 0), axis=-1)
+        segment = segment + nrows * np.arange(nmodels)[:, None]
+        order = np.lexsort((-error.ravel(), segment.ravel()))
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = segment.ravel()[order][1:] != segment.ravel()[order][:-1]
+        worst = order[first]
+        worst = worst[error.ravel()[worst] > tolerance]
+        if not len(worst):
+            break
+        keep.ravel()[worst] = True
+
+    error = np.abs(_interpolate_kept(radius, checked, keep) - checked)
+    report = np.zeros(nmodels, dtype=[("nrows", "i8"), ("nkept", "i8"),
+                                      ("max_error", "f8"),
+                                      ("abs_error", "f8", (len(props),))])
+    report["nrows"] = nrows
+    report["nkept"] = keep.sum(axis=-1)
+    report["max_error"] = (error / span).max(axis=(1, 2))
+    report["abs_error"] = error.max(axis=-1)
+    return keep, report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Report how far Dumoulin .out profiles can be thinned")
+    parser.add_argument("fids", nargs="+", help="Dumoulin .out model files")
+    parser.add_argument("--tolerance", type=float, default=1E-3,
+                        help="largest interpolation error, as a fraction of "
+                             "each property's range")
+    parser.add_argument("--threshold", type=float, default=0.02,
+                        help="normalized jump that counts as a "
+                             "discontinuity")
+    args = parser.parse_args()
+
+    radius, values = read_dumoulin(args.fids)
+    keep, report = resample_profiles(radius, values, args.tolerance,
+                                     threshold=args.threshold)
+    names = [COLUMNS[1:][_] for _ in ELASTIC]
+    print(f"{'model':<24} {'rows':>5} {'kept':>5} {'saved':>6} "
+          f"{'max err':>8} " + " ".join(f"{_:>10}" for _ in names))
+    for fid, row in zip(args.fids, report):
+        print(f"{fid:<24} {row['nrows']:5d} {row['nkept']:5d} "
+              f"{1 - row['nkept'] / row['nrows']:6.1%} "
+              f"{row['max_error']:8.2e} " +
+              " ".join(f"{_:10.3g}" for _ in row["abs_error"]))
@@ -0,0 +1,223 @@
+"""
+Evaluate the AK135F/Venus external model of define_external_model.f90 in
+Python, exactly as the solver does, to QC a mesh + model before running it.
+
+The Fortran tables (radius_ak135, density_ak135, ...) are parsed straight from
+define_external_model.f90, together with its outer core clamp ('ii < 273'), so
+the values match whatever the solver would be compiled with. Instead of a
+linear do-while scan over the radii for every GLL point, the layer of every
+point is found at once with np.searchsorted, followed by the same linear
+interpolation between rows ii-1 and ii and the same fluid core overrides:
+
+    python external_model.py venus_models_2D/V5_Th/define_external_model.f90 \
+        -m MESH
+"""
+import re
+import argparse
+from time import perf_counter
+
+import numpy as np
+
+from specfem_mesh import read_mesh
+
+
+# Region flags (idoubling) shared by the mesher and define_external_model.f90
+IREGION_MANTLE_CRUST_ABOVE_d670 = 1
+IREGION_MANTLE_BELOW_d670 = 2
+IREGION_OUTER_CORE = 3
+IREGION_INNER_CORE = 4
+REGIONS = {IREGION_MANTLE_CRUST_ABOVE_d670: "mantle/crust above d670",
+           IREGION_MANTLE_BELOW_d670: "mantle below d670",
+           IREGION_OUTER_CORE: "outer core",
+           IREGION_INNER_CORE: "inner core"}
+
+# SPECFEM2D constants.h, Q used to switch attenuation off in the fluid cores
+ATTENUATION_COMP_MAXIMUM = 9000.
+
+# Fortran table names -> names of the evaluated values
+TABLES = {"radius": "radius", "density": "rho", "vp": "vp", "vs": "vs",
+          "Qkappa": "Qkappa", "Qmu": "Qmu"}
+
+
+def read_external_model(fid):
+    """
+    Read the model tables and the outer core clamp of a
+    define_external_model.f90
+
+    :type fid: str
+    :param fid: path to define_external_model.f90
+    :rtype: tuple
+    :return: (tables, outer_core_clamp); tables maps the TABLES keys to
+        arrays of NR_AK135F_NO_MUD rows (radius in m, density as written,
+        vp/vs in km/s) as the compiled Fortran sees them, outer_core_clamp
+        is the 1-based table index outer core points are clamped to, or None
+        if the file has no clamp
+    :raises ValueError: if a table is missing or has the wrong length
+    """
+    with open(fid, "r") as f:
+        src = f.read()
+
+    nrows = int(re.search(r"NR_AK135F_NO_MUD\s*=\s*(\d+)", src).group(1))
+    rows = re.findall(r"(?m)^\s*(\w+)_ak135\(\s*(\d+)\)\s*=\s*(\S+)", src)
+
+    tables = {name: np.full(nrows, np.nan) for name in TABLES}
+    for name, i, value in rows:
+        if name in tables:
+            value = value.lower()
+            # Literals without a d exponent are default (single precision)
+            # reals in Fortran, so the solver sees them rounded to float32
+            if "d" in value:
+                value = float(value.replace("d", "e"))
+            else:
+                value = float(np.float32(value))
+            tables[name][int(i) - 1] = value
+    for name, table in tables.items():
+        if np.isnan(table).any():
+            raise ValueError(f"{fid}: {name}_ak135 does not define all "
+                             f"{nrows} rows of NR_AK135F_NO_MUD")
+
+    # Only an active (uncommented) clamp counts
+    clamp = re.search(r"(?m)^[ \t]*if \(material_element\(ispec\) == "
+                      r"IREGION_OUTER_CORE \.and\. ii < (\d+)\) ii = (\d+)",
+                      src)
+    outer_core_clamp = None
+    if clamp:
+        if clamp.group(1) != clamp.group(2):
+            raise ValueError(f"{fid}: outer core clamp 'ii < {clamp.group(1)})"
+                             f" ii = {clamp.group(2)}' is not supported")
+        outer_core_clamp = int(clamp.group(2))
+
+    return tables, outer_core_clamp
+
+
+def evaluate_model(r, material, tables, outer_core_clamp=None):
+    """
+    Evaluate the model at any number of points, reproducing the per-point
+    loop of define_external_model.f90
+
+    :type r: np.ndarray
+    :param r: radius of each point in m, any shape
+    :type material: np.ndarray
+    :param material: region flag of each point, broadcastable to `r`, e.g.,
+        materials[:, None] for (nspec, ngnod) points
+    :type tables: dict
+    :param tables: model tables, see `read_external_model`
+    :type outer_core_clamp: int
+    :param outer_core_clamp: 1-based table index below which outer core
+        points are clamped, see `read_external_model`
+    :rtype: dict
+    :return: rho, vp, vs (m/s), Qkappa and Qmu, each shaped like `r`
+    :raises ValueError: for region flags other than those in REGIONS, like
+        the solver's 'wrong flag number in external model'
+    """
+    r = np.asarray(r, dtype=float)
+    material = np.broadcast_to(material, r.shape)
+    if not np.isin(material, list(REGIONS)).all():
+        raise ValueError("wrong flag number in external model")
+
+    radius = tables["radius"]
+    nrows = len(radius)
+
+    # do while(r >= radius(ii) .and. ii /= NR) stops at the first radius
+    # above r, capped at the last row
+    ii = np.minimum(np.searchsorted(radius, r, side="right"), nrows - 1)
+    outer_core = material == IREGION_OUTER_CORE
+    if outer_core_clamp is not None:
+        ii = np.where(outer_core & (ii < outer_core_clamp - 1),
+                      outer_core_clamp - 1, ii)
+
+    # Interpolate between ii-1 and ii; ii == 0 (Fortran ii == 1) takes row 0
+    lo = np.maximum(ii - 1, 0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        frac = np.where(ii > 0, (r - radius[lo]) / (radius[ii] - radius[lo]),
+                        0.)
+
+    values = {}
+    for name, key in TABLES.items():
+        if name == "radius":
+            continue
+        table = tables[name]
+        values[key] = table[lo] + frac * (table[ii] - table[lo])
+
+    # Fluid outer and (for Venus) inner core
+    fluid = outer_core | (material == IREGION_INNER_CORE)
+    values["vs"][fluid] = 0.
+    values["Qkappa"][fluid] = ATTENUATION_COMP_MAXIMUM
+    values["Qmu"][fluid] = ATTENUATION_COMP_MAXIMUM
+
+    # Convert to m/s
+    values["vp"] *= 1000.
+    values["vs"] *= 1000.
+
+    return values
+
+
+def evaluate_mesh(model, path="MESH"):
+    """
+    Evaluate a define_external_model.f90 at the control nodes of every
+    element of a mesh
+
+    :type model: str
+    :param model: path to define_external_model.f90
+    :type path: str
+    :param path: directory with the mesher output
+    :rtype: tuple
+    :return: (coords, materials, values); coords is (nspec, 9, 2) in m,
+        materials (nspec,), values as in `evaluate_model` shaped (nspec, 9)
+    """
+    tables, outer_core_clamp = read_external_model(model)
+    nodes, elements, materials = read_mesh(path)
+    coords = nodes[elements]
+    r = np.sqrt(coords[..., 0] ** 2 + coords[..., 1] ** 2)
+    values = evaluate_model(r, materials[:, None], tables, outer_core_clamp)
+
+    return coords, materials, values
+
+
+def summarize(materials, values):
+    """
+    Per region value ranges plus the checks that catch a bad model: NaNs
+    and solid points without a shear velocity
+
+    :rtype: str
+    :return: printable summary
+    """
+    lines = []
+    for flag, region in REGIONS.items():
+        mask = materials == flag
+        if not mask.any():
+            continue
+        lines.append(f"{region} ({mask.sum()} elements)")
+        for key, value in values.items():
+            value = value[mask]
+            lines.append(f"    {key:>6}: {np.nanmin(value):14.6f} "
+                         f"{np.nanmax(value):14.6f}")
+
+    nan = sum(int(np.isnan(value).sum()) for value in values.values())
+    solid = np.isin(materials, [IREGION_MANTLE_CRUST_ABOVE_d670,
+                                IREGION_MANTLE_BELOW_d670])
+    no_shear = int((values["vs"][solid] <= 0).sum())
+    lines.append(f"NaN values: {nan}")
+    lines.append(f"solid nodes with Vs <= 0: {no_shear}")
+
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("model", nargs="?",
+                        default="define_external_model.f90",
+                        help="define_external_model.f90 to evaluate")
+    parser.add_argument("-m", "--mesh", default="MESH",
+                        help="directory with the mesher output")
+    parser.add_argument("-o", "--output", default=None,
+                        help="optional .npz to save coords and values to")
+    args = parser.parse_args()
+
+    tstart = perf_counter()
+    coords, materials, values = evaluate_mesh(args.model, args.mesh)
+    print(summarize(materials, values))
+    print(f"evaluated {coords.shape[0] * coords.shape[1]} nodes in "
+          f"{perf_counter() - tstart:.2f}s")
+    if args.output:
+        np.savez(args.output, coords=coords, materials=materials, **values)
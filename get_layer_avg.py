@@ -1,33 +1,27 @@
 import numpy as np
 
+from dumoulin_model import read_dumoulin, find_discontinuities, layer_means, \
+    ELASTIC
 
-fid = "V1-Tc.out"
-depth, _, _, density, vp, vs = np.loadtxt(fid, skiprows=1).T
-depth = depth[::-1]
-
-depth_idxs = [0, len(depth) - 500, len(depth) - 495, len(depth) - 439, len(depth) - 276, -1]
 
-            # 0  700 2950 6015
-print(depth_idxs)
-for i, top in enumerate(depth_idxs[:-1]):
-    bottom = depth_idxs[i+1]
-    print(f"[{depth[top]}-{depth[bottom]}]")
-    print(f"rho = {density[top:bottom].mean():.2f}")
-    print(f"Vp  = {vp[top:bottom].mean():.2f}")
-    print(f"Vs] = {vs[top:bottom].mean():.2f}\n")
+# Add more files (e.g., "V1-Th.out") to average several models in one go
+fids = ["V1-Tc.out"]
+nboundaries = 3  # core, lower mantle, upper mantle, crust
 
-'''
-fid = "V1-Th.out"
-depth, _, _, density, vp, vs = np.loadtxt(fid, skiprows=1).T
+depth, values = read_dumoulin(fids)
 depth = depth[::-1]
 
-depth_idxs = [0, len(depth) - 292, len(depth) - 245, 503, -1]
-            # 0  700 2950 6015
+# Layer boundaries from the largest jumps in rho, Vp or Vs, then the mean of
+# each of those within every layer, for all models at once
+boundaries = find_discontinuities(values[:, ELASTIC], n=nboundaries)
+averages = layer_means(values[:, ELASTIC], boundaries)
 
-for i, top in enumerate(depth_idxs[:-1]):
-    bottom = depth_idxs[i+1]
-    print(f"[{depth[top]}-{depth[bottom]}]")
-    print(f"rho = {density[top:bottom].mean():.2f}")
-    print(f"Vp  = {vp[top:bottom].mean():.2f}")
-    print(f"Vs] = {vs[top:bottom].mean():.2f}\n")
-'''
\ No newline at end of file
+for fid, bounds, means in zip(fids, boundaries, averages):
+    print(fid, bounds)
+    tops = np.concatenate([[0], bounds + 1])
+    bottoms = np.append(bounds, len(depth) - 1)
+    for top, bottom, (rho, vp, vs) in zip(tops, bottoms, means.T):
+        print(f"[{depth[top]}-{depth[bottom]}]")
+        print(f"rho = {rho:.2f}")
+        print(f"Vp  = {vp:.2f}")
+        print(f"Vs  = {vs:.2f}\n")
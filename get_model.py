@@ -1,196 +1,293 @@
+"""
+Write a Dumoulin et al. 2017 Venus model as the radius/density/vp/vs/Qkappa/Qmu
+tables of SPECFEM2D's define_external_model.f90.
+
+Every column is formatted in bulk with np.char, and the result can be spliced
+straight into a copy of define_external_model.f90 with NR_AK135F_NO_MUD set to
+the model's row count, so no more pasting by hand:
+
+    python get_model.py V5-Th.out \
+        -t venus_models_2D/V5_Th/define_external_model.f90 \
+        -o define_external_model.f90
+
+With --tolerance, rows that linear interpolation reproduces within that
+fraction of each property's range are dropped first (both rows of every
+discontinuity are kept). The outer core clamp is always moved to the
+model's core-mantle boundary row:
+
+    python get_model.py V5-Th.out --tolerance 1E-3 \
+        -t venus_models_2D/V5_Th/define_external_model.f90
+"""
+import re
+import argparse
 import numpy as np
 
-# Variable units: rho (kg/m^3), Vp (km/s), Vs (km/s)
-radius, _, _, density, vp, vs = np.loadtxt("V5-Th.out", skiprows=1).T
-
-# Find layer boundaries for each model based on jumps in values
-# Only do this for the first (density), then share with other values
-diffs = abs(vs[:-1] - vs[1:])
-
-for i in [1, 2, 3, 4]:
-    bigval = np.sort(diffs)[-i]
-    big_idx = np.where(np.isin(diffs, bigval))[0]
-    rad = (radius[big_idx], big_idx)
-    print(rad)
-    if i == 1:
-        CoreMantB = rad[0]
-    if i == 2:
-        CrustantB = rad[0]
-    if i == 3:
-        UpMantLowMantB = rad[0]
-    if i == 4:
-        DownMantB = rad[0]
-print(CoreMantB, UpMantLowMantB, CrustantB, DownMantB)
-
-output = open("model_layers.txt", "w")
-for i, rad in enumerate(radius):
-    rad = float(rad)*1000
-    if i == 0:
-        output.write('  radius_ak135(  1) =  0.000000000000000E+000\n')
-    if 100 < rad < 1000:
-        if len(str(i+2)) == 1:
-            output.write(f"  radius_ak135(  {i+2}) =   {rad:.10f}\n")
-        elif len(str(i+2)) == 2:
-            output.write(f"  radius_ak135( {i+2}) =   {rad:.10f}\n")
-        elif len(str(i+2)) == 3:
-            output.write(f"  radius_ak135({i+2}) =   {rad:.10f}\n")
-    elif rad > 1000:
-        if len(str(i+2)) == 1:
-            output.write(f"  radius_ak135(  {i+2}) =   {rad:.9f}\n")
-        elif len(str(i+2)) == 2:
-            output.write(f"  radius_ak135( {i+2}) =   {rad:.9f}\n")
-        elif len(str(i+2)) == 3:
-            output.write(f"  radius_ak135({i+2}) =   {rad:.9f}\n") 
-    elif rad < 100:
-        if len(str(i+2)) == 1:
-            output.write(f"  radius_ak135(  {i+2}) =   {rad:.11f}\n")
-        elif len(str(i+2)) == 2:
-            output.write(f"  radius_ak135( {i+2}) =   {rad:.11f}\n")
-        elif len(str(i+2)) == 3:
-            output.write(f"  radius_ak135({i+2}) =   {rad:.11f}\n")
-
-output.write("\n")
-for i, den in enumerate(density):
-    dens =  float(den/1000)
-    if dens < 10:
-        if i == 0:
-            output.write(f'  density_ak135(  1) =   {dens:.14f}\n')
-        if len(str(i+2)) == 1:
-            output.write(f"  density_ak135(  {i+2}) =   {dens:.14f}\n")
-        elif len(str(i+2)) == 2:
-            output.write(f"  density_ak135( {i+2}) =   {dens:.14f}\n")
-        elif len(str(i+2)) == 3:
-            output.write(f"  density_ak135({i+2}) =   {dens:.14f}\n")
-    elif dens >= 10:
-        if i == 0:
-            output.write(f'  density_ak135(  1) =   {dens:.13f}\n')
-        if len(str(i+2)) == 1:
-            output.write(f"  density_ak135(  {i+2}) =   {dens:.13f}\n")
-        elif len(str(i+2)) == 2:
-            output.write(f"  density_ak135( {i+2}) =   {dens:.13f}\n")
-        elif len(str(i+2)) == 3:
-            output.write(f"  density_ak135({i+2}) =   {dens:.13f}\n")
-
-output.write("\n")
-for i, vel_p in enumerate(vp):
-    vel_p = float(vel_p)
-    if vel_p < 10:
-        if i == 0:
-            output.write(f'  vp_ak135(  1) =   {vel_p:.14f}\n')
-        if len(str(i+2)) == 1:
-            output.write(f"  vp_ak135(  {i+2}) =   {vel_p:.14f}\n")
-        elif len(str(i+2)) == 2:
-            output.write(f"  vp_ak135( {i+2}) =   {vel_p:.14f}\n")
-        elif len(str(i+2)) == 3:
-            output.write(f"  vp_ak135({i+2}) =   {vel_p:.14f}\n")
-    elif vel_p >= 10:
-        if i == 0:
-            output.write(f'  vp_ak135(  1) =   {vel_p:.13f}\n')
-        if len(str(i+2)) == 1:
-            output.write(f"  vp_ak135(  {i+2}) =   {vel_p:.13f}\n")
-        elif len(str(i+2)) == 2:
-            output.write(f"  vp_ak135( {i+2}) =   {vel_p:.13f}\n")
-        elif len(str(i+2)) == 3:
-            output.write(f"  vp_ak135({i+2}) =   {vel_p:.13f}\n")
-
-output.write("\n")
-for i, vel_s in enumerate(vs):
-    vel_s = float(vel_s)
-    if i == 0:
-        output.write(f'  vs_ak135(  {i+1}) =  0.000000000000000E+000\n')
-    if int(vel_s) == 0:
-        if len(str(i+2)) == 1:
-            output.write(f'  vs_ak135(  {i+2}) =  0.000000000000000E+000\n')
-        elif len(str(i+2)) == 2:    
-            output.write(f'  vs_ak135( {i+2}) =  0.000000000000000E+000\n')
-        elif len(str(i+2)) == 3:
-            output.write(f'  vs_ak135({i+2}) =  0.000000000000000E+000\n')
-    else:
-        if len(str(i+2)) == 1:
-            output.write(f"  vs_ak135(  {i+2}) =   {vel_s:.14f}\n")
-        elif len(str(i+2)) == 2:
-            output.write(f"  vs_ak135( {i+2}) =   {vel_s:.14f}\n")
-        elif len(str(i+2)) == 3:
-            output.write(f"  vs_ak135({i+2}) =   {vel_s:.14f}\n")
-
-output.write("\n")
-for i, rad in enumerate(radius):
-
-    if rad <= CoreMantB:
-        qkappa = 57822.0
-        if i == 0:
-            output.write(f'  Qkappa_ak135(  1) =   {qkappa:.12f}\n')
-        if len(str(i+2)) == 1:
-            output.write(f"  Qkappa_ak135(  {i+2}) =   {qkappa:.12f}\n")
-        elif len(str(i+2)) == 2:
-            output.write(f"  Qkappa_ak135( {i+2}) =   {qkappa:.12f}\n")
-        elif len(str(i+2)) == 3:
-            output.write(f"  Qkappa_ak135({i+2}) =   {qkappa:.12f}\n")
-
-    elif rad <= UpMantLowMantB:
-
-        qkappa = 1085.40170213
-        if len(str(i+2)) == 1:
-            output.write(f"  Qkappa_ak135(  {i+2}) =   {qkappa:.13f}\n")
-        elif len(str(i+2)) == 2:
-            output.write(f"  Qkappa_ak135( {i+2}) =   {qkappa:.13f}\n")
-        elif len(str(i+2)) == 3:
-            output.write(f"  Qkappa_ak135({i+2}) =   {qkappa:.13f}\n")
-
-    elif rad <= CrustantB:
-        qkappa = 328.05937500
-        if len(str(i+2)) == 1:
-            output.write(f"  Qkappa_ak135(  {i+2}) =   {qkappa:.14f}\n")
-        elif len(str(i+2)) == 2:
-            output.write(f"  Qkappa_ak135( {i+2}) =   {qkappa:.14f}\n")
-        elif len(str(i+2)) == 3:
-            output.write(f"  Qkappa_ak135({i+2}) =   {qkappa:.14f}\n")
-
-    elif rad > CrustantB:
-        qkappa = 1170.39500000
-        if len(str(i+2)) == 1:
-            output.write(f"  Qkappa_ak135(  {i+2}) =   {qkappa:.13f}\n")
-        elif len(str(i+2)) == 2:
-            output.write(f"  Qkappa_ak135( {i+2}) =   {qkappa:.13f}\n")
-        elif len(str(i+2)) == 3:
-            output.write(f"  Qkappa_ak135({i+2}) =   {qkappa:.13f}\n")
-
-output.write("\n")
-for i, rad in enumerate(radius):
-    if rad <= CoreMantB:
-        if i == 0:
-            output.write(f'  Qmu_ak135(  {i+1}) =  0.000000000000000E+000\n')
-        if len(str(i+2)) == 1:
-            output.write(f'  Qmu_ak135(  {i+2}) =  0.000000000000000E+000\n')
-        elif len(str(i+2)) == 2:    
-            output.write(f'  Qmu_ak135( {i+2}) =  0.000000000000000E+000\n')
-        elif len(str(i+2)) == 3:
-            output.write(f'  Qmu_ak135({i+2}) =  0.000000000000000E+000\n')
-    elif rad <= UpMantLowMantB:
-        qmu = 430.81553191
-        if len(str(i+2)) == 1:
-            output.write(f"  Qmu_ak135(  {i+2}) =   {qmu:.14f}\n")
-        elif len(str(i+2)) == 2:
-            output.write(f"  Qmu_ak135( {i+2}) =   {qmu:.14f}\n")
-        elif len(str(i+2)) == 3:
-            output.write(f"  Qmu_ak135({i+2}) =   {qmu:.14f}\n")
-
-    elif rad <= CrustantB:
-        qmu = 130.54500000
-        if len(str(i+2)) == 1:
-            output.write(f"  Qmu_ak135(  {i+2}) =   {qmu:.14f}\n")
-        elif len(str(i+2)) == 2:
-            output.write(f"  Qmu_ak135( {i+2}) =   {qmu:.14f}\n")
-        elif len(str(i+2)) == 3:
-            output.write(f"  Qmu_ak135({i+2}) =   {qmu:.14f}\n")
-
-    elif rad > CrustantB:
-        qmu = 501.96000000
-        if len(str(i+2)) == 1:
-            output.write(f"  Qmu_ak135(  {i+2}) =   {qmu:.14f}\n")
-        elif len(str(i+2)) == 2:
-            output.write(f"  Qmu_ak135( {i+2}) =   {qmu:.14f}\n")
-        elif len(str(i+2)) == 3:
-            output.write(f"  Qmu_ak135({i+2}) =   {qmu:.14f}\n")
-output.close()
+from dumoulin_model import (read_dumoulin, find_discontinuities,
+                            resample_profiles, PROPS, ELASTIC)
+
+
+# Fortran zero written by the original tables for fluid Vs, Qmu and radius(1)
+ZERO = "0.000000000000000E+000"
+
+# Qkappa, Qmu for the core, lower mantle, upper mantle and crust
+QKAPPA = np.array([57822.0, 1085.40170213, 328.05937500, 1170.39500000])
+QMU = np.array([0., 430.81553191, 130.54500000, 501.96000000])
+
+
+def find_named_boundaries(radius, vs):
+    """
+    Find the core-mantle, crust, upper/lower mantle and deeper mantle
+    boundaries as the four largest jumps in Vs, named by jump size
+
+    :type radius: np.ndarray
+    :param radius: radius of each row in km
+    :type vs: np.ndarray
+    :param vs: S-wave velocity of each row
+    :rtype: tuple of float
+    :return: (CoreMantB, CrustantB, UpMantLowMantB, DownMantB) radii in km
+    """
+    idxs, jumps = find_discontinuities(vs, n=4, return_jumps=True)
+    return tuple(radius[idxs[np.argsort(-jumps)]])
+
+
+def outer_core_clamp_index(radius, core_mantle_boundary):
+    """
+    Table index that define_external_model.f90 clamps outer core points to
+    (the 'ii < 273' Venus edit): the first row at or above the core-mantle
+    boundary, counting the center row that `model_tables` prepends. It
+    moves with the number of rows, so every model needs its own
+
+    :type radius: np.ndarray
+    :param radius: radius in km of the model rows, ascending
+    :type core_mantle_boundary: float
+    :param core_mantle_boundary: CoreMantB of `find_named_boundaries` in km
+    :rtype: int
+    :return: 1-based Fortran table index
+    """
+    return int(np.searchsorted(np.concatenate([[0.], radius]),
+                               core_mantle_boundary, "left")) + 1
+
+
+def digits_for(values, limits, decimals):
+    """
+    Number of decimals to write each value with, so that the tables keep
+    their fixed number of significant digits, e.g., values < 10 get 14
+    decimals and larger values 13 for 15 significant digits
+
+    :type values: np.ndarray
+    :param values: values to format
+    :type limits: list of float
+    :param limits: ascending magnitudes where the number of decimals changes
+    :type decimals: list of int
+    :param decimals: decimals below the first limit, between limits, and
+        above the last, i.e., len(limits) + 1 entries
+    :rtype: np.ndarray
+    :return: number of decimals per value
+    """
+    return np.asarray(decimals)[np.searchsorted(limits, values, side="right")]
+
+
+def format_column(name, values, decimals, zero=None):
+    """
+    Format one Fortran array assignment per value, e.g.,
+    '  vp_ak135( 12) =   9.98060333349434'
+
+    :type name: str
+    :param name: Fortran array name
+    :type values: np.ndarray
+    :param values: one value per row, row i is written as index i+1
+    :type decimals: np.ndarray
+    :param decimals: decimals per value, see `digits_for`
+    :type zero: np.ndarray
+    :param zero: optional boolean mask of rows written as the Fortran zero
+        literal instead, as the original tables do for fluid layers
+    :rtype: np.ndarray
+    :return: formatted lines, without newlines
+    """
+    values = np.asarray(values, dtype=float)
+    text = np.empty(values.shape, dtype=object)
+    for d in np.unique(decimals):
+        mask = decimals == d
+        text[mask] = np.char.mod(f"  %.{d}f", values[mask])
+    if zero is not None:
+        text[zero] = f" {ZERO}"
+
+    index = np.char.mod(f"  {name}(%3d) = ", np.arange(1, values.size + 1))
+    return np.char.add(index.astype(object), text).astype(str)
+
+
+def model_tables(radius, density, vp, vs, boundaries):
+    """
+    Build the arrays of the six define_external_model.f90 tables for one
+    model. Row 1 is the center of the planet (radius 0, copying the first
+    model row), so the tables have one row more than the model
+
+    :type radius: np.ndarray
+    :param radius: radius in km, ascending
+    :type density: np.ndarray
+    :param density: density in kg/m^3
+    :type vp: np.ndarray
+    :param vp: P-wave velocity in km/s
+    :type vs: np.ndarray
+    :param vs: S-wave velocity in km/s
+    :type boundaries: tuple of float
+    :param boundaries: output of `find_named_boundaries`
+    :rtype: tuple
+    :return: (tables, region); tables maps radius (m), density (g/cm^3),
+        vp, vs (km/s), Qkappa and Qmu to arrays, as external_model.py reads
+        them back from the Fortran, region is 0-3 for the core, lower
+        mantle, upper mantle and crust
+    """
+    CoreMantB, CrustantB, UpMantLowMantB, _ = boundaries
+
+    # Prepend the planet's center to every column
+    radius = np.concatenate([[0.], radius]) * 1000
+    density = np.concatenate([density[:1], density]) / 1000
+    vp = np.concatenate([vp[:1], vp])
+    vs = np.concatenate([[0.], vs])
+
+    # Region 0-3: core, lower mantle, upper mantle, crust; the first
+    # boundary at or above a row's radius, checked in this order like the
+    # original if/elif chain, as the boundaries are named by jump size and
+    # need not be sorted by radius
+    below = radius[:, None] <= np.array([CoreMantB, UpMantLowMantB,
+                                         CrustantB]) * 1000
+    region = np.where(below.any(axis=1), below.argmax(axis=1), 3)
+    tables = {"radius": radius, "density": density, "vp": vp, "vs": vs,
+              "Qkappa": QKAPPA[region], "Qmu": QMU[region]}
+
+    return tables, region
+
+
+def model_table(radius, density, vp, vs, boundaries):
+    """
+    Format all six define_external_model.f90 tables for one model, see
+    `model_tables`
+
+    :rtype: str
+    :return: the Fortran assignments, blank line separated
+    """
+    tables, region = model_tables(radius, density, vp, vs, boundaries)
+    radius, density, vp, vs = [tables[_] for _ in
+                               ["radius", "density", "vp", "vs"]]
+
+    blocks = [
+        format_column("radius_ak135", radius,
+                      digits_for(radius, [100, 1000], [11, 10, 9]),
+                      zero=radius == 0),
+        format_column("density_ak135", density,
+                      digits_for(density, [10], [14, 13])),
+        format_column("vp_ak135", vp, digits_for(vp, [10], [14, 13])),
+        # Anything below 1 km/s is the fluid core
+        format_column("vs_ak135", vs, np.full(vs.size, 14),
+                      zero=vs.astype(int) == 0),
+        format_column("Qkappa_ak135", tables["Qkappa"],
+                      np.array([12, 13, 14, 13])[region]),
+        format_column("Qmu_ak135", tables["Qmu"], np.full(vs.size, 14),
+                      zero=region == 0),
+    ]
+
+    return "\n\n".join("\n".join(block) for block in blocks)
+
+
+def write_define_external_model(table, nrows, template, output,
+                                outer_core_clamp=None):
+    """
+    Write a copy of define_external_model.f90 with its model tables replaced
+
+    :type table: str
+    :param table: output of `model_table`
+    :type nrows: int
+    :param nrows: number of rows in each table, becomes NR_AK135F_NO_MUD
+    :type template: str
+    :param template: existing define_external_model.f90 to copy
+    :type output: str
+    :param output: path to write the new file to
+    :type outer_core_clamp: int
+    :param outer_core_clamp: optionally replace the table index that outer
+        core points are clamped to (the 'ii < 273' Venus edit)
+    :raises ValueError: if the template does not contain the expected tables
+    """
+    with open(template, "r") as f:
+        src = f.read()
+
+    src, n = re.subn(r"(?ms)^  radius_ak135\(.*^  Qmu_ak135\([^\n]*$",
+                     lambda _: table, src, count=1)
+    if not n:
+        raise ValueError(f"no radius_ak135...Qmu_ak135 tables in {template}")
+
+    src, n = re.subn(r"(NR_AK135F_NO_MUD\s*=\s*)\d+", rf"\g<1>{nrows}", src,
+                     count=1)
+    if not n:
+        raise ValueError(f"no NR_AK135F_NO_MUD parameter in {template}")
+
+    if outer_core_clamp is not None:
+        src = re.sub(r"ii < \d+\) ii = \d+",
+                     f"ii < {outer_core_clamp}) ii = {outer_core_clamp}", src)
+
+    with open(output, "w") as f:
+        f.write(src)
+
+
+def main(fid="V5-Th.out", template=None, output="define_external_model.f90",
+         table_output="model_layers.txt", tolerance=None):
+    """
+    Convert one Dumoulin .out file to define_external_model.f90 tables
+
+    :type tolerance: float
+    :param tolerance: optionally thin the model to the rows needed to stay
+        within this fraction of each property's range, see
+        `dumoulin_model.resample_profiles`
+    """
+    # Variable units: rho (kg/m^3), Vp (km/s), Vs (km/s)
+    radius, values = read_dumoulin(fid)
+    density, vp, vs = values[0, [PROPS["density"], PROPS["vp"], PROPS["vs"]]]
+
+    # Find layer boundaries based on jumps in Vs, shared with other values
+    boundaries = find_named_boundaries(radius, vs)
+    CoreMantB, CrustantB, UpMantLowMantB, DownMantB = boundaries
+    print(CoreMantB, UpMantLowMantB, CrustantB, DownMantB)
+
+    if tolerance is not None:
+        # Keep the named boundaries whatever their size, so the regions and
+        # Q values do not move, plus every other discontinuity
+        named = find_discontinuities(vs, n=4)
+        jumps = find_discontinuities(values[0, ELASTIC], threshold=0.02)
+        keep, report = resample_profiles(
+            radius, values[:1], tolerance,
+            boundaries=[np.union1d(named, jumps)])
+        keep = keep[0]
+        radius, density, vp, vs = (radius[keep], density[keep], vp[keep],
+                                   vs[keep])
+        print(f"kept {report['nkept'][0]} of {report['nrows'][0]} rows, "
+              f"max error {report['max_error'][0]:.2e} of the property "
+              f"ranges")
+
+    table = model_table(radius, density, vp, vs, boundaries)
+    with open(table_output, "w") as f:
+        f.write(table + "\n")
+
+    if template is not None:
+        # The clamp is a table index, so it moves with the number of rows
+        outer_core_clamp = outer_core_clamp_index(radius, CoreMantB)
+        write_define_external_model(table, len(radius) + 1, template, output,
+                                    outer_core_clamp)
+        print(f"wrote {output} with NR_AK135F_NO_MUD = {len(radius) + 1}, "
+              f"outer core clamped to row {outer_core_clamp}")
+
 
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("fid", nargs="?", default="V5-Th.out",
+                        help="Dumoulin .out model file")
+    parser.add_argument("-t", "--template", default=None,
+                        help="define_external_model.f90 to splice into")
+    parser.add_argument("-o", "--output", default="define_external_model.f90",
+                        help="spliced Fortran file to write")
+    parser.add_argument("--table", default="model_layers.txt",
+                        help="plain table output")
+    parser.add_argument("--tolerance", type=float, default=None,
+                        help="drop rows reproduced within this fraction of "
+                             "each property's range, e.g., 1E-3")
+    args = parser.parse_args()
+    main(args.fid, args.template, args.output, args.table, args.tolerance)
@@ -0,0 +1,217 @@
+"""
+Set up one SPECFEM2D run directory per Dumoulin et al. 2017 Venus model.
+
+For every .out file matching the pattern, a copy of a template run (by default
+venus_models_2D/V5_Th) is made with the model written into its
+define_external_model.f90 (outer core clamp included), its core-mantle and
+upper/lower mantle radii set in the mesher, and DATA/Par_file, DATA/SOURCE
+and DATA/STATIONS copied over (optionally with Par_file values changed).
+Models are processed in parallel worker processes, so a 20-50 model sweep is
+a single command:
+
+    python make_model_runs.py "V[145]-*.out" -o venus_models_2D \
+        --par NSTEP=100000 --par NPROC=8 --workers 8
+"""
+import os
+import re
+import shutil
+import argparse
+from glob import glob
+from time import perf_counter
+from concurrent.futures import ProcessPoolExecutor
+
+from dumoulin_model import read_dumoulin, PROPS
+from get_model import find_named_boundaries, model_table, \
+    outer_core_clamp_index, write_define_external_model
+from specfem_data import read_par_file, set_par_file_values
+
+
+# Files copied from the template run directory, besides the generated model
+DATA_FILES = ["Par_file", "SOURCE", "STATIONS"]
+MESHER = "create_mesh_AK135F_2D_with_central_cube_no_PML.F90"
+MODEL = "define_external_model.f90"
+
+
+def run_name(fid):
+    """
+    Run directory name for a model file, following the existing convention,
+    e.g., 'models/V5-Th.out' -> 'V5_Th'
+    """
+    return os.path.splitext(os.path.basename(fid))[0].replace("-", "_")
+
+
+def write_mesher(template, output, boundaries):
+    """
+    Write a copy of the mesher with its RCMB and R670 region interfaces
+    moved to the model's core-mantle and upper/lower mantle boundaries
+
+    :type template: str
+    :param template: existing create_mesh_*.F90 to copy
+    :type output: str
+    :param output: path to write the new file to
+    :type boundaries: tuple of float
+    :param boundaries: output of `get_model.find_named_boundaries` in km
+    :raises ValueError: if the template does not define RCMB and R670
+    """
+    CoreMantB, _, UpMantLowMantB, _ = boundaries
+    with open(template, "r") as f:
+        src = f.read()
+
+    for name, radius in [("RCMB", CoreMantB), ("R670", UpMantLowMantB)]:
+        src, n = re.subn(rf"(parameter :: {name}\s*=\s*)[\d.]+d0",
+                         rf"\g<1>{radius * 1000:.1f}d0", src, count=1)
+        if not n:
+            raise ValueError(f"no {name} parameter in {template}")
+
+    with open(output, "w") as f:
+        f.write(src)
+
+
+def make_run(fid, template_dir, output_dir, par=None, stations=None,
+             overwrite=False):
+    """
+    Build a complete run directory for a single model
+
+    :type fid: str
+    :param fid: Dumoulin .out model file
+    :type template_dir: str
+    :param template_dir: run directory to copy, containing DATA/ and
+        define_external_model.f90
+    :type output_dir: str
+    :param output_dir: directory to create the run directory in
+    :type par: dict
+    :param par: optional Par_file values to change
+    :type stations: str
+    :param stations: optional STATIONS file to use instead of the template's
+    :type overwrite: bool
+    :param overwrite: allow writing into an existing run directory
+    :rtype: dict
+    :return: summary of the generated run
+    :raises FileExistsError: if the run directory exists and not `overwrite`
+    """
+    tstart = perf_counter()
+    name = run_name(fid)
+    run_dir = os.path.join(output_dir, name)
+    if os.path.abspath(run_dir) == os.path.abspath(template_dir):
+        raise FileExistsError(f"{fid} would overwrite the template {run_dir}")
+    if os.path.exists(run_dir) and not overwrite:
+        raise FileExistsError(f"{run_dir} exists, use overwrite to replace it")
+    os.makedirs(os.path.join(run_dir, "DATA"), exist_ok=True)
+
+    # Model -> Fortran tables
+    radius, values = read_dumoulin(fid)
+    density, vp, vs = values[0, [PROPS["density"], PROPS["vp"], PROPS["vs"]]]
+    boundaries = find_named_boundaries(radius, vs)
+    table = model_table(radius, density, vp, vs, boundaries)
+    write_define_external_model(
+        table, len(radius) + 1, template=os.path.join(template_dir, MODEL),
+        output=os.path.join(run_dir, MODEL),
+        outer_core_clamp=outer_core_clamp_index(radius, boundaries[0]))
+
+    # DATA/ files and the mesher
+    for fname in DATA_FILES:
+        src = os.path.join(template_dir, "DATA", fname)
+        if fname == "STATIONS" and stations is not None:
+            src = stations
+        shutil.copyfile(src, os.path.join(run_dir, "DATA", fname))
+    if par:
+        par_file = os.path.join(run_dir, "DATA", "Par_file")
+        set_par_file_values(par_file, par_file, par)
+    if os.path.exists(os.path.join(template_dir, MESHER)):
+        write_mesher(os.path.join(template_dir, MESHER),
+                     os.path.join(run_dir, MESHER), boundaries)
+
+    return {"model": fid, "run_dir": run_dir, "nrows": len(radius) + 1,
+            "boundaries": boundaries, "time": perf_counter() - tstart}
+
+
+def make_runs(fids, template_dir="venus_models_2D/V5_Th",
+              output_dir="venus_models_2D", par=None, stations=None,
+              overwrite=False, workers=None):
+    """
+    Build run directories for many models in parallel worker processes
+
+    :type fids: list of str
+    :param fids: Dumoulin .out model files
+    :param template_dir, output_dir, par, stations, overwrite: see `make_run`
+    :type workers: int
+    :param workers: number of processes, defaults to the number of CPUs.
+        1 runs serially without a pool
+    :rtype: list of dict
+    :return: one summary per model, in the order of `fids`
+    :raises ValueError: if two models map to the same run directory
+    :raises FileExistsError: if a run directory exists and not `overwrite`,
+        checked for all models before any directory is written
+    """
+    names = [run_name(fid) for fid in fids]
+    if len(set(names)) != len(names):
+        raise ValueError(f"model files map to duplicate run names: {names}")
+
+    # Check every target up front rather than failing halfway through a sweep
+    for name in names:
+        run_dir = os.path.join(output_dir, name)
+        if os.path.abspath(run_dir) == os.path.abspath(template_dir) or \
+                (os.path.exists(run_dir) and not overwrite):
+            raise FileExistsError(f"{run_dir} exists or is the template, "
+                                  f"remove it from the sweep or overwrite")
+
+    kwargs = dict(template_dir=template_dir, output_dir=output_dir, par=par,
+                  stations=stations, overwrite=overwrite)
+    if workers == 1:
+        return [make_run(fid, **kwargs) for fid in fids]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(make_run, fid, **kwargs) for fid in fids]
+        return [future.result() for future in futures]
+
+
+def _parse_par(items):
+    """
+    Turn ['NSTEP=100000', 'SU_FORMAT=.true.'] into a dict of Par_file values
+    """
+    par = {}
+    for item in items or []:
+        key, value = item.split("=", 1)
+        par[key.strip()] = value.strip()
+    return par
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("pattern", nargs="?", default="V[145]-*.out",
+                        help="glob of Dumoulin .out model files")
+    parser.add_argument("-t", "--template", default="venus_models_2D/V5_Th",
+                        help="run directory to copy")
+    parser.add_argument("-o", "--output", default="venus_models_2D",
+                        help="where to create the run directories")
+    parser.add_argument("-p", "--par", action="append",
+                        help="Par_file value to change, e.g., NSTEP=100000. "
+                             "Can be given multiple times")
+    parser.add_argument("-s", "--stations", default=None,
+                        help="STATIONS file to use instead of the template's")
+    parser.add_argument("-w", "--workers", type=int, default=None,
+                        help="number of worker processes")
+    parser.add_argument("--overwrite", action="store_true",
+                        help="replace existing run directories")
+    args = parser.parse_args()
+
+    fids = sorted(glob(args.pattern))
+    if not fids:
+        raise FileNotFoundError(f"no model files match {args.pattern}")
+    par = _parse_par(args.par)
+    if par:
+        # Fail before any work if a parameter name is misspelled
+        missing = set(par) - set(read_par_file(
+            os.path.join(args.template, "DATA", "Par_file")))
+        if missing:
+            raise KeyError(f"parameters not in the template Par_file: "
+                           f"{sorted(missing)}")
+
+    tstart = perf_counter()
+    runs = make_runs(fids, template_dir=args.template, output_dir=args.output,
+                     par=par, stations=args.stations,
+                     overwrite=args.overwrite, workers=args.workers)
+    for run in runs:
+        print(f"{run['model']} -> {run['run_dir']} "
+              f"(NR_AK135F_NO_MUD = {run['nrows']}, {run['time']:.2f}s)")
+    print(f"set up {len(runs)} runs in {perf_counter() - tstart:.2f}s")
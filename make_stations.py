@@ -1,8 +1,10 @@
 """
-Make a STATIONS file for stations on the surface at various angles 
+Make a STATIONS file for stations on the surface at various angles
 """
 import numpy as np
 
+ANGLES = [90, 75, 60, 45, 30, 15, 0, -15, -30, -45, -60, -75, -90]
+
 def surface_xy(r, angle):
     x = r * 1E3 * np.cos(np.radians(angle))
     y = r * 1E3 * np.sin(np.radians(angle))
@@ -10,12 +12,21 @@ def surface_xy(r, angle):
 
 r_venus = 6051.8
 
-for angle in [90, 75, 60, 45, 30, 15, 0, -15, -30, -45, -60, -75, -90]:
-    x, y = surface_xy(r=r_venus, angle=angle)
-    if angle < 0:
-        name = str(angle).replace("-", "N")
-    else:
-        name = f"{angle:0>3}"
-    print(f"S{name}\tXX\t{x:10.2f}\t{y:10.2f}\t0.0\t0.0")
-
+def station_lines(angles=ANGLES, r=r_venus):
+    """
+    STATIONS lines for surface receivers at integer angles, named S075,
+    SN45, ... (see sem_picks.station_angle). All coordinates are computed
+    and formatted in one call, for dense receiver lines
+    """
+    angles = np.asarray(angles)
+    x, y = surface_xy(r=r, angle=angles)
+    names = np.where(angles < 0,
+                     np.char.replace(angles.astype(str), "-", "N"),
+                     np.char.zfill(angles.astype(str), 3))
+    xy = np.char.mod("%10.2f", np.column_stack([x, y]))
+    return [f"S{name}\tXX\t{x_}\t{y_}\t0.0\t0.0"
+            for name, (x_, y_) in zip(names, xy)]
 
+if __name__ == "__main__":
+    for line in station_lines():
+        print(line)
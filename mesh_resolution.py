@@ -0,0 +1,232 @@
+"""
+Estimate the resolution, stable time step and cost of a SPECFEM2D run from
+the mesh written by create_mesh_AK135F_2D_with_central_cube_no_PML.F90 and a
+Dumoulin et al. 2017 model (or a define_external_model.f90), instead of
+picking DT and NSTEP by trial and error.
+
+Every element's 5x5 GLL points are placed with the 9-node shape functions and
+the model is evaluated at each of them (see external_model.py), all
+vectorized over elements. Per element this gives the smallest GLL spacing and
+the Courant number (vp_max * DT / h_min), and the number of points per minimum
+wavelength (v_min * T / average GLL spacing), from which follow the largest
+stable DT, the shortest resolved period, the NSTEP for a record length and a
+core-hour estimate:
+
+    python mesh_resolution.py V5-Th.out -m MESH -d DATA --record-length 7000
+"""
+import os
+import argparse
+
+import numpy as np
+
+from dumoulin_model import read_dumoulin, PROPS
+from external_model import read_external_model, evaluate_model
+from get_model import find_named_boundaries, model_tables, \
+    outer_core_clamp_index
+from specfem_data import read_par_file
+from specfem_mesh import read_mesh
+
+
+# SPECFEM2D is compiled with NGLLX = NGLLZ = 5
+NGLL = 5
+GLL_POINTS = np.array([-1., -np.sqrt(3 / 7), 0., np.sqrt(3 / 7), 1.])
+
+
+def shape_functions(xi, eta):
+    """
+    Shape functions of a 9-node element (SPECFEM2D node order: corners
+    counterclockwise, then edge midpoints 1-2, 2-3, 3-4, 4-1, then center)
+
+    :type xi: np.ndarray
+    :param xi: local coordinates along the first element direction
+    :type eta: np.ndarray
+    :param eta: local coordinates along the second element direction
+    :rtype: np.ndarray
+    :return: (len(xi), len(eta), 9) weights of the 9 control nodes
+    """
+    xi, eta = np.meshgrid(xi, eta, indexing="ij")
+    sm, sp, s0 = xi * (xi - 1) / 2, xi * (xi + 1) / 2, 1 - xi ** 2
+    tm, tp, t0 = eta * (eta - 1) / 2, eta * (eta + 1) / 2, 1 - eta ** 2
+
+    return np.stack([sm * tm, sp * tm, sp * tp, sm * tp,
+                     s0 * tm, sp * t0, s0 * tp, sm * t0, s0 * t0], axis=-1)
+
+
+def load_model(fid):
+    """
+    Model tables from a Dumoulin .out file or from a define_external_model.f90
+
+    :type fid: str
+    :param fid: .out model file or define_external_model.f90
+    :rtype: tuple
+    :return: (tables, outer_core_clamp), see
+        external_model.read_external_model
+    """
+    if fid.endswith(".f90"):
+        return read_external_model(fid)
+
+    radius, values = read_dumoulin(fid)
+    density, vp, vs = values[0, [PROPS["density"], PROPS["vp"], PROPS["vs"]]]
+    boundaries = find_named_boundaries(radius, vs)
+    tables, _ = model_tables(radius, density, vp, vs, boundaries)
+    return tables, outer_core_clamp_index(radius, boundaries[0])
+
+
+def element_resolution(nodes, elements, materials, tables,
+                       outer_core_clamp=None, chunk=100000):
+    """
+    GLL spacing and model velocities of every element
+
+    :type nodes: np.ndarray
+    :param nodes: (npoin, 2) node coordinates, see specfem_mesh.read_mesh
+    :type elements: np.ndarray
+    :param elements: (nspec, 9) 0-based control nodes
+    :type materials: np.ndarray
+    :param materials: (nspec,) region flags
+    :type tables: dict
+    :param tables: model tables, see `load_model`
+    :type outer_core_clamp: int
+    :param outer_core_clamp: see external_model.evaluate_model
+    :type chunk: int
+    :param chunk: elements processed at once, bounds memory on large meshes
+    :rtype: dict
+    :return: (nspec,) arrays of h_min (smallest GLL spacing), h_avg
+        (average GLL spacing in the coarser element direction), vp_max and
+        v_min (smallest nonzero wave speed, i.e., vp in the fluid)
+    """
+    weights = shape_functions(GLL_POINTS, GLL_POINTS)
+    nspec = len(elements)
+    out = {key: np.empty(nspec) for key in ["h_min", "h_avg", "vp_max",
+                                            "v_min"]}
+    for start in range(0, nspec, chunk):
+        sl = slice(start, min(start + chunk, nspec))
+        gll = np.einsum("ija,sak->sijk", weights, nodes[elements[sl]])
+
+        # Distance between neighboring GLL points along both directions
+        d_xi = np.linalg.norm(np.diff(gll, axis=1), axis=-1)
+        d_eta = np.linalg.norm(np.diff(gll, axis=2), axis=-1)
+        out["h_min"][sl] = np.minimum(d_xi.min(axis=(1, 2)),
+                                      d_eta.min(axis=(1, 2)))
+        out["h_avg"][sl] = np.maximum(d_xi.mean(axis=(1, 2)),
+                                      d_eta.mean(axis=(1, 2)))
+
+        r = np.sqrt(gll[..., 0] ** 2 + gll[..., 1] ** 2)
+        values = evaluate_model(r, materials[sl, None, None], tables,
+                                outer_core_clamp)
+        out["vp_max"][sl] = values["vp"].max(axis=(1, 2))
+        out["v_min"][sl] = np.where(values["vs"] > 0, values["vs"],
+                                    values["vp"]).min(axis=(1, 2))
+
+    return out
+
+
+def estimate_run(res, dt, f0, record_length, courant=0.5, ppw=5.,
+                 nproc=1, seconds_per_point=2E-7):
+    """
+    Stability, resolution and cost of a run on a mesh
+
+    :type res: dict
+    :param res: output of `element_resolution`
+    :type dt: float
+    :param dt: time step to check, e.g., DT from the Par_file
+    :type f0: float
+    :param f0: dominant source frequency; a Ricker wavelet has energy up to
+        about 2.5 * f0
+    :type record_length: float
+    :param record_length: seconds of simulation needed
+    :type courant: float
+    :param courant: largest Courant number considered stable
+    :type ppw: float
+    :param ppw: GLL points per minimum wavelength needed for accuracy
+    :type nproc: int
+    :param nproc: number of MPI processes, for the wall time
+    :type seconds_per_point: float
+    :param seconds_per_point: core seconds per GLL point per time step,
+        best calibrated from a finished run (see the --calibrate option)
+    :rtype: dict
+    :return: summary values
+    """
+    courant_elem = res["vp_max"] * dt / res["h_min"]
+    ppw_elem = res["v_min"] / (2.5 * f0) / res["h_avg"]
+    dt_max = courant * (res["h_min"] / res["vp_max"]).min()
+    nstep = int(np.ceil(record_length / dt))
+    npoints = len(res["h_min"]) * NGLL * NGLL
+    core_hours = npoints * nstep * seconds_per_point / 3600
+
+    return {"nspec": len(res["h_min"]),
+            "npoints": npoints,
+            "dt": dt,
+            "courant_max": courant_elem.max(),
+            "unstable_elements": int((courant_elem > courant).sum()),
+            "dt_max": dt_max,
+            "shortest_period": (ppw * res["h_avg"] / res["v_min"]).max(),
+            "ppw_min": ppw_elem.min(),
+            "underresolved_elements": int((ppw_elem < ppw).sum()),
+            "record_length": record_length,
+            "nstep": nstep,
+            "nstep_at_dt_max": int(np.ceil(record_length / dt_max)),
+            "core_hours": core_hours,
+            "core_hours_at_dt_max": core_hours * dt / dt_max,
+            "wall_hours": core_hours / nproc,
+            }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("model", help="Dumoulin .out file or "
+                                      "define_external_model.f90")
+    parser.add_argument("-m", "--mesh", default="MESH",
+                        help="directory with the mesher output")
+    parser.add_argument("-d", "--data", default="DATA",
+                        help="DATA/ directory with Par_file and SOURCE")
+    parser.add_argument("--dt", type=float, default=None,
+                        help="time step to check, default Par_file DT")
+    parser.add_argument("--record-length", type=float, default=None,
+                        help="seconds to simulate, default Par_file "
+                             "NSTEP * DT")
+    parser.add_argument("--courant", type=float, default=0.5,
+                        help="largest stable Courant number")
+    parser.add_argument("--ppw", type=float, default=5.,
+                        help="points per minimum wavelength required")
+    parser.add_argument("--seconds-per-point", type=float, default=2E-7,
+                        help="core seconds per GLL point per time step")
+    parser.add_argument("--calibrate", type=float, default=None,
+                        help="wall time in seconds of a finished run with "
+                             "this mesh and Par_file, sets "
+                             "--seconds-per-point")
+    args = parser.parse_args()
+
+    par = read_par_file(os.path.join(args.data, "Par_file"))
+    source = read_par_file(os.path.join(args.data, "SOURCE"))
+    dt = args.dt or par["DT"]
+    record_length = args.record_length or par["NSTEP"] * par["DT"]
+
+    nodes, elements, materials = read_mesh(args.mesh)
+    tables, outer_core_clamp = load_model(args.model)
+    res = element_resolution(nodes, elements, materials, tables,
+                             outer_core_clamp)
+
+    seconds_per_point = args.seconds_per_point
+    if args.calibrate:
+        seconds_per_point = args.calibrate * par["NPROC"] / (
+                len(elements) * NGLL * NGLL * par["NSTEP"])
+
+    est = estimate_run(res, dt, source["f0"], record_length,
+                       courant=args.courant, ppw=args.ppw,
+                       nproc=par["NPROC"], seconds_per_point=seconds_per_point)
+
+    print(f"{est['nspec']} elements, {est['npoints']} GLL points")
+    print(f"DT = {dt:g} s: max Courant number {est['courant_max']:.3f}, "
+          f"{est['unstable_elements']} elements above {args.courant}")
+    print(f"largest stable DT: {est['dt_max']:.4g} s")
+    print(f"shortest resolved period ({args.ppw:g} points per wavelength): "
+          f"{est['shortest_period']:.2f} s")
+    print(f"f0 = {source['f0']:g} Hz: min {est['ppw_min']:.2f} points per "
+          f"wavelength at 2.5 * f0, {est['underresolved_elements']} "
+          f"elements below {args.ppw:g}")
+    print(f"{record_length:g} s record: NSTEP = {est['nstep']} at DT = "
+          f"{dt:g}, {est['nstep_at_dt_max']} at the largest stable DT")
+    print(f"cost: {est['core_hours']:.1f} core hours "
+          f"({est['wall_hours']:.1f} h on NPROC = {par['NPROC']}), "
+          f"{est['core_hours_at_dt_max']:.1f} core hours at the largest "
+          f"stable DT ({seconds_per_point:.3g} core s per point per step)")
@@ -0,0 +1,217 @@
+"""
+Vectorized strike/dip/rake -> moment tensor conversion.
+
+Same equations as strike_dip_rake_to_CMTSOLUTION.c (Onur TAN's dc2mt, as
+modified for SPECFEM by Dimitri Komatitsch), but for whole arrays of
+mechanisms at once, plus a CLI that streams a CSV of mechanisms to
+CMTSOLUTION blocks, SPECFEM2D SOURCE moment tensor lines or CSV:
+
+    python moment_tensor.py mechanisms.csv -f cmt > CMTSOLUTIONS
+    echo "310,66,-171,1E25" | python moment_tensor.py - -f source
+
+Input CSV columns are strike, dip, rake (degrees) and optionally the scalar
+moment M0 (default 1, i.e., unit tensors like the C tool). A header line is
+skipped automatically.
+"""
+import sys
+import argparse
+from itertools import islice
+
+import numpy as np
+
+
+AKI_RICHARDS = ["Mxx", "Myy", "Mzz", "Mxy", "Mxz", "Myz"]
+HARVARD = ["Mrr", "Mtt", "Mpp", "Mrt", "Mrp", "Mtp"]
+
+
+def sdr_to_aki_richards(strike, dip, rake, m0=1.):
+    """
+    Moment tensors in Aki & Richards (1980) convention (x north, y east,
+    z down) for any number of double couple mechanisms
+
+    :type strike: float or np.ndarray
+    :param strike: strike in degrees
+    :type dip: float or np.ndarray
+    :param dip: dip in degrees
+    :type rake: float or np.ndarray
+    :param rake: rake/slip in degrees
+    :type m0: float or np.ndarray
+    :param m0: scalar moment, the tensors are scaled by it
+    :rtype: np.ndarray
+    :return: array of shape (..., 6) ordered as AKI_RICHARDS
+    """
+    S, D, R = np.deg2rad(np.broadcast_arrays(strike, dip, rake))
+    sinD, cosD, sin2D, cos2D = np.sin(D), np.cos(D), np.sin(2*D), np.cos(2*D)
+    sinR, cosR = np.sin(R), np.cos(R)
+    sinS, cosS, sin2S, cos2S = np.sin(S), np.cos(S), np.sin(2*S), np.cos(2*S)
+
+    Mxx = -1.0 * (sinD * cosR * sin2S + sin2D * sinR * sinS * sinS)
+    Myy = (sinD * cosR * sin2S - sin2D * sinR * cosS * cosS)
+    Mzz = -1.0 * (Mxx + Myy)
+    Mxy = (sinD * cosR * cos2S + 0.5 * sin2D * sinR * sin2S)
+    Mxz = -1.0 * (cosD * cosR * cosS + cos2D * sinR * sinS)
+    Myz = -1.0 * (cosD * cosR * sinS - cos2D * sinR * cosS)
+
+    return np.stack([Mxx, Myy, Mzz, Mxy, Mxz, Myz], axis=-1) * \
+        np.asarray(m0, dtype=float)[..., None]
+
+
+def aki_richards_to_harvard(mt):
+    """
+    Convert Aki & Richards tensors to the Harvard CMTSOLUTION convention
+    (r up, t south, p east)
+
+    :type mt: np.ndarray
+    :param mt: (..., 6) ordered as AKI_RICHARDS
+    :rtype: np.ndarray
+    :return: (..., 6) ordered as HARVARD
+    """
+    Mxx, Myy, Mzz, Mxy, Mxz, Myz = np.moveaxis(np.asarray(mt), -1, 0)
+    return np.stack([Mzz, Mxx, Myy, Mxz, -1.0 * Myz, -1.0 * Mxy], axis=-1)
+
+
+def harvard_to_specfem2d(cmt):
+    """
+    In-plane moment tensor components for a SPECFEM2D SOURCE file, for a
+    section along the Aki & Richards x (north) axis with z pointing up:
+    Mxx = Mtt, Mzz = Mrr, Mxz = -Mrt
+
+    :type cmt: np.ndarray
+    :param cmt: (..., 6) ordered as HARVARD
+    :rtype: np.ndarray
+    :return: (..., 3) ordered as Mxx, Mzz, Mxz
+    """
+    Mrr, Mtt, _, Mrt, _, _ = np.moveaxis(np.asarray(cmt), -1, 0)
+    return np.stack([Mtt, Mrr, -1.0 * Mrt], axis=-1)
+
+
+def sdr_to_cmt(strike, dip, rake, m0=1.):
+    """
+    Both conventions at once, see `sdr_to_aki_richards`
+
+    :rtype: tuple of np.ndarray
+    :return: (aki_richards, harvard), each of shape (..., 6)
+    """
+    mt = sdr_to_aki_richards(strike, dip, rake, m0)
+    return mt, aki_richards_to_harvard(mt)
+
+
+# Output templates, filled for a whole chunk of events with one % operation
+CMTSOLUTION = (
+    "PDE 1970 01 01 00 00 00.00 0.0000 0.0000 0.0 0.0 0.0 event%(n)06d\n"
+    "event name:     event%(n)06d\n"
+    "time shift:       0.0000\n"
+    "half duration:    0.0000\n"
+    "latitude:         0.0000\n"
+    "longitude:        0.0000\n"
+    "depth:            0.0000\n"
+    "Mrr:     %(Mrr)14.6e\n"
+    "Mtt:     %(Mtt)14.6e\n"
+    "Mpp:     %(Mpp)14.6e\n"
+    "Mrt:     %(Mrt)14.6e\n"
+    "Mrp:     %(Mrp)14.6e\n"
+    "Mtp:     %(Mtp)14.6e\n"
+)
+SOURCE = (
+    "## event%(n)06d\n"
+    "source_type                     = 2\n"
+    "Mxx                             = %(Mxx)14.6e\n"
+    "Mzz                             = %(Mzz)14.6e\n"
+    "Mxz                             = %(Mxz)14.6e\n"
+)
+
+
+def format_blocks(template, columns):
+    """
+    Fill a %(name)-style template once per row with a single string
+    formatting call over the whole chunk, instead of a Python loop per event
+
+    :type template: str
+    :param template: one event's block, e.g., CMTSOLUTION
+    :type columns: dict
+    :param columns: template names mapped to 1D arrays of equal length
+    :rtype: str
+    :return: all blocks, concatenated
+    """
+    n = len(next(iter(columns.values())))
+    # Positional %-formatting of the repeated template, names in order
+    fmt = template
+    order = []
+    while "%(" in fmt:
+        start = fmt.index("%(")
+        name = fmt[start + 2:fmt.index(")", start)]
+        order.append(name)
+        fmt = fmt[:start + 1] + fmt[fmt.index(")", start) + 1:]
+    values = np.column_stack([columns[name] for name in order])
+    return (fmt * n) % tuple(values.ravel().tolist())
+
+
+def read_mechanisms(f, chunk=100000):
+    """
+    Stream (strike, dip, rake, m0) chunks from a CSV file handle
+
+    :type f: file
+    :param f: open text file
+    :type chunk: int
+    :param chunk: number of rows to parse at a time, bounds memory use
+    :rtype: generator of np.ndarray
+    :return: arrays of shape (n, 4); m0 defaults to 1 if not given
+    """
+    first = True
+    while True:
+        lines = list(islice(f, chunk))
+        if not lines:
+            return
+        if first:
+            first = False
+            try:
+                float(lines[0].split(",")[0])
+            except ValueError:
+                lines = lines[1:]  # header
+        data = np.loadtxt(lines, delimiter=",", ndmin=2)
+        if data.shape[1] == 3:
+            data = np.column_stack([data, np.ones(len(data))])
+        yield data[:, :4]
+
+
+def main(fid="-", fmt="cmt", chunk=100000, output=sys.stdout):
+    """
+    Convert a CSV of mechanisms chunk by chunk and write the result
+    """
+    f = sys.stdin if fid == "-" else open(fid, "r")
+    nevent = 0
+    try:
+        for data in read_mechanisms(f, chunk):
+            mt, cmt = sdr_to_cmt(*data.T)
+            n = np.arange(nevent + 1, nevent + len(data) + 1)
+            nevent += len(data)
+            if fmt == "cmt":
+                columns = {"n": n, **dict(zip(HARVARD, cmt.T))}
+                output.write(format_blocks(CMTSOLUTION, columns))
+            elif fmt == "source":
+                mxz = harvard_to_specfem2d(cmt)
+                columns = {"n": n, **dict(zip(["Mxx", "Mzz", "Mxz"], mxz.T))}
+                output.write(format_blocks(SOURCE, columns))
+            else:
+                np.savetxt(output, np.column_stack([data, mt, cmt]),
+                           fmt="%.6e", delimiter=",")
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+    return nevent
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("fid", nargs="?", default="-",
+                        help="CSV of strike,dip,rake[,m0], '-' for stdin")
+    parser.add_argument("-f", "--format", default="cmt",
+                        choices=["cmt", "source", "csv"],
+                        help="CMTSOLUTION blocks, SPECFEM2D SOURCE moment "
+                             "tensor lines, or CSV with the input columns "
+                             "followed by Aki&Richards and Harvard tensors")
+    parser.add_argument("-c", "--chunk", type=int, default=100000,
+                        help="rows converted per chunk")
+    args = parser.parse_args()
+    main(args.fid, args.format, args.chunk)
@@ -6,6 +6,9 @@ import numpy as np
 import matplotlib.pyplot as plt
 from glob import glob
 
+from dumoulin_model import read_dumoulin, find_discontinuities, layer_means, \
+    ELASTIC
+
 def set_plot_aesthetic(
         ax, ytick_fontsize=5., xtick_fontsize=5., tick_linewidth=1.5,
         tick_length=5., tick_direction="in", xlabel_fontsize=8.,
@@ -75,54 +78,47 @@ title = ["Temperature", "?", "Density", "P-wave Velocity", "S-wave Velocity"]
 ylabel = ["Temp (K)", "?", "rho (kg/m^3)", "Vp (km/s)", "Vs (km/s)"]
 
 # Read in the files used
-values = {}
 fids = sorted(glob("V[145]-*.out"))
+names = [fid.split(".")[0] for fid in fids]
 colors = ["C3", "C0", "C1", "C2", "C4", "C5", "C6"] 
-for fid in fids:
-    depth, *variables = np.loadtxt(fid, skiprows=1).T
-    values[fid.split(".")[0]] = variables
 
-# Flip the depth axis so that 0 is the surface (not the core)
-depth = depth[::-1]  
+# Files are read one at a time, so models may differ in radius sampling
+depths, models = [], []
+for fid in fids:
+    radius, values = read_dumoulin(fid)
+    # Flip the depth axis so that 0 is the surface (not the core)
+    depths.append(radius[::-1])
+    models.append(values[0])
+
+# Find layer boundaries of every model based on jumps in density, Vp and Vs,
+# then the depth average of every parameter within each layer
+boundaries = [find_discontinuities(model[ELASTIC], n=3) for model in models]
+averages = [layer_means(model, bounds)
+            for model, bounds in zip(models, boundaries)]
+for name, depth, bounds in zip(names, depths, boundaries):
+    for idx in bounds:
+        #Print the index that of the layer boundary
+        print(f"{name} boundary at depth {depth[idx]:.2f} km (idx {idx})")
 
 # Plot one paramter for all models on a single figure
-idxs = {}
 first = True
 f, ax = plt.subplots(1,3,figsize=(9,4), dpi=200)
-for i in range(len(variables)):
+for i in range(models[0].shape[0]):
     if choices and i not in choices:
         continue
 
-    for j, (name, value) in enumerate(values.items()):
-        model = np.array(value[i])
+    for j, (name, depth) in enumerate(zip(names, depths)):
+        model = models[j][i]
         ax[i-2].plot(model, depth, colors[j], lw=1, label=name)
-        
-        # Find layer boundaries for each model based on jumps in values
-        # Only do this for the first (density), then share with other values
-        if first:
-            diffs = model[:-1] - model[1:]
-            # Looking for indices for the 3 largest difference values
-            bigval = np.sort(diffs)[-3]
-            idxs[name] = np.argwhere(diffs >= bigval)
-        
-            #for idx, layer in zip(idxs[name], ["CMB", "MTZ"]):
-            for idx in zip(idxs[name]):
-                #plt.annotate(layer, xy=(90, depth[idx]-20), c=colors[j], fontsize=8)
-                #ax[i-2].axhline(depth[idx], c="k", linestyle="--", lw=1, zorder=10)
-                #Print the index that of the layer boundary
-                print(f"{name} boundary at depth {depth[idx][0]:.2f} km (idx {idx[0]})")
-
-        # Between each layer, find the depth average for the given layer
-        # Sorry this is pretty nasty, quick and dirty
-        layers = [0] + [_[0] for _ in idxs[name]] + [-1]  
-        for _k, k in enumerate(layers[:-1]):
-            k = k
-            l = layers[_k+1]
-            average = model[k:l].mean()
+
+        # Between each layer, print the depth average for the given layer
+        tops = np.concatenate([[0], boundaries[j] + 1])
+        bottoms = np.append(boundaries[j], len(depth) - 1)
+        for k, l, average in zip(tops, bottoms, averages[j][i]):
             print(f"{name} ({title[i]}) {depth[k]:.2f}-{depth[l]:.2f} = {average:.2f}")
 
     ax[i-2].invert_yaxis()
-    ax[i-2].set_ylim([depth.max(), 0])
+    ax[i-2].set_ylim([max(depth.max() for depth in depths), 0])
     ax[i-2].set_ylabel("Depth (km)")
     ax[i-2].set_xlabel(ylabel[i])
     ax[i-2].set_title(title[i])
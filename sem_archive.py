@@ -0,0 +1,333 @@
+"""
+Pack the ASCII seismograms of a SPECFEM run into one chunked HDF5 archive,
+and read stations or time windows back without touching the rest.
+
+A run directory (e.g., V1-Tc) holds one text file per station and component,
+XX.SN90.BXX.semd etc. These are parsed once (in parallel) and written to a
+single compressed dataset laid out station x component x time, chunked along
+time so that reading a window only decompresses the chunks that overlap it.
+The sampling interval, start time, station coordinates from STATIONS and the
+source parameters from SOURCE are stored alongside:
+
+    python sem_archive.py V1-Tc V1-Th V4-Tc --stations DATA/STATIONS \
+        --source DATA/SOURCE
+
+    st = read_sem_archive("V1-Tc.h5", stations=["S075", "SN90"],
+                          tmin=0, tmax=7000)
+"""
+import os
+import argparse
+from glob import glob
+from time import perf_counter
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import h5py
+import numpy as np
+from obspy import UTCDateTime, Stream, Trace
+
+from sem_ascii import read_sem_ascii
+from specfem_data import read_par_file, read_stations_file
+
+
+# 16384 samples are 64 kB (float32) to 128 kB (float64) per chunk before
+# compression, a few chunks per 140000 sample trace
+CHUNK_NPTS = 16384
+
+
+def _parse_name(fid):
+    """
+    Split a SPECFEM ASCII seismogram name, e.g., XX.SN90.BXX.semd
+
+    :rtype: tuple of str
+    :return: (network, station, channel, format)
+    """
+    net, sta, cha, fmt, *_ = os.path.basename(fid).split(".")
+    return net, sta, cha, fmt
+
+
+def _station_table(names, stations=None):
+    """
+    Station rows of the archive, in STATIONS (i.e., receiver) order if a
+    STATIONS file is given, otherwise sorted by name
+
+    :type names: set of tuple
+    :param names: (network, station) of every seismogram found
+    :type stations: str
+    :param stations: optional STATIONS file
+    :rtype: np.ndarray
+    :return: structured array with fields network, station, x, z,
+        elevation, burial; coordinates are NaN without a STATIONS file
+    :raises ValueError: if a seismogram's station is not in STATIONS
+    """
+    dtype = [("network", "S8"), ("station", "S32"), ("x", "f8"), ("z", "f8"),
+             ("elevation", "f8"), ("burial", "f8")]
+    if stations is None:
+        table = np.full(len(names), np.nan, dtype=dtype)
+        table["network"], table["station"] = zip(*sorted(names))
+        return table
+
+    rows = read_stations_file(stations)
+    missing = names - set(zip(rows["network"], rows["station"]))
+    if missing:
+        raise ValueError(f"{len(missing)} stations not in {stations}, e.g., "
+                         f"{'.'.join(sorted(missing)[0])}")
+    table = np.empty(len(rows), dtype=dtype)
+    for name in table.dtype.names:
+        table[name] = rows[name]
+    return table
+
+
+def _iter_parsed(fids, workers=None, prefetch=16):
+    """
+    Parse seismograms in a process pool and yield them in order, with at
+    most `prefetch` files in flight
+
+    :type fids: list of str
+    :param fids: ASCII seismograms
+    :type workers: int
+    :param workers: number of processes, 1 parses in this process
+    :type prefetch: int
+    :param prefetch: files parsed ahead of the consumer
+    :rtype: generator of tuple
+    :return: (times, data) of each file, see `read_sem_ascii`
+    """
+    if workers == 1:
+        for fid in fids:
+            yield read_sem_ascii(fid)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        queue = deque()
+        for fid in fids:
+            if len(queue) >= prefetch:
+                yield queue.popleft().result()
+            queue.append(executor.submit(read_sem_ascii, fid))
+        while queue:
+            yield queue.popleft().result()
+
+
+def pack_run(folder, output=None, pattern="*.sem?", stations=None,
+             source=None, dtype="f8", chunk=CHUNK_NPTS, compression="gzip",
+             workers=None, prefetch=16, precision=4):
+    """
+    Convert every ASCII seismogram of a run into one HDF5 archive. Files are
+    parsed in a process pool and written in order as they arrive, with at
+    most `prefetch` parsed or being parsed, so memory does not grow with the
+    number of files
+
+    :type folder: str
+    :param folder: run directory with the .sem? files
+    :type output: str
+    :param output: archive to write, defaults to <folder>.h5
+    :type pattern: str
+    :param pattern: glob of the seismograms to pack
+    :type stations: str
+    :param stations: optional STATIONS file of the run, for the station order
+        and coordinates
+    :type source: str
+    :param source: optional SOURCE (or CMTSOLUTION style 'key = value') file,
+        whose parameters are stored as attributes of the /source group
+    :type dtype: str
+    :param dtype: sample type to store, 'f4' halves the size at the cost of
+        the last digits of the ASCII values
+    :type chunk: int
+    :param chunk: samples per chunk along time
+    :type compression: str
+    :param compression: HDF5 compression filter, e.g., 'gzip', 'lzf' or None
+    :type workers: int
+    :param workers: number of parsing processes, 1 parses serially
+    :type prefetch: int
+    :param prefetch: files parsed ahead of the writer
+    :type precision: int
+    :param precision: decimals DT is rounded to, as `read_sem` does
+    :rtype: str
+    :return: path of the archive
+    :raises FileNotFoundError: if no files match `pattern`
+    :raises ValueError: if the seismograms do not share one time axis
+    """
+    fids = sorted(glob(os.path.join(folder, pattern)))
+    if not fids:
+        raise FileNotFoundError(f"no files matching {pattern} in {folder}")
+    if output is None:
+        output = f"{os.path.normpath(folder)}.h5"
+
+    names = [_parse_name(fid) for fid in fids]
+    table = _station_table({(net, sta) for net, sta, *_ in names}, stations)
+    rows = {(net.decode(), sta.decode()): i
+            for i, (net, sta) in enumerate(table[["network", "station"]])}
+    channels = sorted({cha for _, _, cha, _ in names})
+    fmt = names[0][3]
+
+    traces = _iter_parsed(fids, workers, prefetch)
+    try:
+        with h5py.File(output, "w") as f:
+            for (net, sta, cha, _), (times, data) in zip(names, traces):
+                if "data" not in f:
+                    npts = len(data)
+                    # Same DT as read_sem, so headers match either way
+                    delta = round(times[1] - times[0], precision)
+                    dset = f.create_dataset(
+                        "data", shape=(len(table), len(channels), npts),
+                        dtype=dtype, chunks=(1, 1, min(chunk, npts)),
+                        compression=compression, shuffle=bool(compression),
+                        fillvalue=np.nan)
+                    # Receivers without a seismogram stay NaN
+                    dset.attrs.update(delta=delta, t0=times[0], npts=npts,
+                                      format=fmt)
+                elif len(data) != npts or times[0] != dset.attrs["t0"]:
+                    raise ValueError(f"{net}.{sta}.{cha} has {len(data)} "
+                                     f"samples from {times[0]} s, expected "
+                                     f"{npts} from {dset.attrs['t0']} s")
+                dset[rows[net, sta], channels.index(cha)] = data
+
+            f.create_dataset("stations", data=table)
+            f.create_dataset("channels", data=np.array(channels, dtype="S"))
+            group = f.create_group("source")
+            if source is not None:
+                group.attrs.update(read_par_file(source))
+    finally:
+        traces.close()
+
+    return output
+
+
+def archive_info(fid):
+    """
+    Metadata of an archive, without reading any samples
+
+    :type fid: str
+    :param fid: archive written by `pack_run`
+    :rtype: dict
+    :return: delta, t0, npts, format, stations (structured array with
+        network, station and coordinates as str and float), channels (list
+        of str) and source (dict of SOURCE parameters, empty if none stored)
+    """
+    with h5py.File(fid, "r") as f:
+        info = dict(f["data"].attrs)
+        stations = f["stations"][()]
+        info["channels"] = [_.decode() for _ in f["channels"][()]]
+        info["source"] = {k: v.item() if isinstance(v, np.generic) else v
+                          for k, v in f["source"].attrs.items()}
+
+    info["stations"] = stations.astype([
+        (name, "U32" if stations.dtype[name].kind == "S" else "f8")
+        for name in stations.dtype.names])
+    info["npts"] = int(info["npts"])
+    return info
+
+
+def _select(names, keep, what):
+    """
+    Indices of the `keep` entries in `names`, all of them if `keep` is None
+
+    :raises KeyError: if a requested entry is not in the archive
+    """
+    if keep is None:
+        return list(range(len(names)))
+    if isinstance(keep, str):
+        keep = [keep]
+    missing = [_ for _ in keep if _ not in names]
+    if missing:
+        raise KeyError(f"{what} {missing} not in archive")
+    return [names.index(_) for _ in keep]
+
+
+def read_sem_archive(fid, stations=None, channels=None, tmin=None, tmax=None,
+                     origintime="1970-01-01T00:00:00", location=""):
+    """
+    Read seismograms from an archive into an ObsPy Stream with the same
+    headers `specfem_io.read_sem` gives the ASCII files. Only the chunks of
+    the selected stations, channels and time window are read and
+    decompressed
+
+    :type fid: str
+    :param fid: archive written by `pack_run`
+    :type stations: str or list of str
+    :param stations: station codes to read, in the order the traces should
+        be returned, e.g., ['S075', 'SN90']. Defaults to all stations, in
+        archive order
+    :type channels: str or list of str
+    :param channels: channels to read, e.g., 'BXX', defaults to all
+    :type tmin: float
+    :param tmin: start of the window in seconds, on the time axis of the
+        ASCII files (i.e., relative to `origintime`)
+    :type tmax: float
+    :param tmax: end of the window in seconds, inclusive
+    :type origintime: obspy.UTCDateTime
+    :param origintime: origin time of the event, defaults to a dummy value
+        of '1970-01-01T00:00:00'
+    :type location: str
+    :param location: location value for the traces
+    :rtype: obspy.Stream
+    :return: one Trace per station and channel that has data
+    """
+    with h5py.File(fid, "r") as f:
+        dset = f["data"]
+        delta, t0 = dset.attrs["delta"], dset.attrs["t0"]
+        npts, fmt = int(dset.attrs["npts"]), dset.attrs["format"]
+        table = f["stations"][()]
+        names = [_.decode() for _ in table["station"]]
+        all_channels = [_.decode() for _ in f["channels"][()]]
+
+        # Same rounding as the sample times in the ASCII files
+        start = 0 if tmin is None else \
+            max(0, int(np.ceil(round((tmin - t0) / delta, 6))))
+        end = npts if tmax is None else \
+            min(npts, int(np.floor(round((tmax - t0) / delta, 6))) + 1)
+
+        st = Stream()
+        for i in _select(names, stations, "stations"):
+            for j in _select(all_channels, channels, "channels"):
+                # One hyperslab per trace, which is exactly one row of chunks
+                data = dset[i, j, start:end]
+                if np.isnan(data).all():
+                    continue
+                stats = {"network": table["network"][i].decode(),
+                         "station": names[i], "location": location,
+                         "channel": all_channels[j],
+                         "starttime": UTCDateTime(origintime) + t0 +
+                         start * delta,
+                         "npts": len(data), "delta": delta,
+                         "mseed": {"dataquality": 'D'}, "format": fmt}
+                st.append(Trace(data=data, header=stats))
+
+    return st
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("folders", nargs="+",
+                        help="run directories to pack, each into <folder>.h5")
+    parser.add_argument("-p", "--pattern", default="*.sem?",
+                        help="glob of the seismograms to pack")
+    parser.add_argument("--stations", default=None,
+                        help="STATIONS file of the runs")
+    parser.add_argument("--source", default=None,
+                        help="SOURCE file of the runs")
+    parser.add_argument("-o", "--output", default=".",
+                        help="directory to write the archives to")
+    parser.add_argument("--dtype", default="f8", choices=["f4", "f8"],
+                        help="sample precision to store")
+    parser.add_argument("--chunk", type=int, default=CHUNK_NPTS,
+                        help="samples per chunk along time")
+    parser.add_argument("--compression", default="gzip",
+                        help="HDF5 compression filter, 'none' to disable")
+    parser.add_argument("-w", "--workers", type=int, default=None,
+                        help="number of parsing processes")
+    args = parser.parse_args()
+
+    compression = None if args.compression == "none" else args.compression
+    for folder in args.folders:
+        tstart = perf_counter()
+        name = f"{os.path.basename(os.path.normpath(folder))}.h5"
+        output = pack_run(folder, os.path.join(args.output, name),
+                          pattern=args.pattern, stations=args.stations,
+                          source=args.source, dtype=args.dtype,
+                          chunk=args.chunk, compression=compression,
+                          workers=args.workers)
+        nbytes = sum(os.path.getsize(_) for _ in
+                     glob(os.path.join(folder, args.pattern)))
+        print(f"{folder} -> {output}: {nbytes / 1E6:.1f} MB of text in "
+              f"{os.path.getsize(output) / 1E6:.1f} MB, "
+              f"{perf_counter() - tstart:.2f}s")
@@ -0,0 +1,103 @@
+"""
+Single-pass parser for SPECFEM ASCII seismograms (.sem?, .sem.ascii)
+
+Reads each file once as raw bytes and hands the whole buffer to NumPy's C
+float parser, rather than calling np.loadtxt once per column or looping over
+lines in Python. Handles both ASCII dialects SPECFEM has written over the
+years:
+
+    1) two whitespace separated columns, e.g. '  0.0000E+00  1.2345E-10'
+    2) comma separated values (post-2018), where Fortran list-directed output
+       collapses repeated values into N*value, e.g. '2*0.0000' for t=0, u=0
+"""
+import warnings
+import numpy as np
+
+
+_DIGITS = b"0123456789"
+_SEPARATORS = b" \t\r\n,"
+
+
+def _expand_repeats(raw):
+    """
+    Expand Fortran list-directed repeat tokens, e.g., 2*0.000 -> 0.000 0.000.
+    Splitting on '*' keeps the scan in C, the Python loop only runs once per
+    repeat token, which SPECFEM writes rarely (identical time and data values)
+    """
+    chunks = raw.split(b"*")
+    expanded = [chunks[0]]
+    for chunk in chunks[1:]:
+        # The repeat count is the integer directly preceding the '*'
+        head = expanded[-1]
+        stripped = head.rstrip(_DIGITS)
+        count = int(head[len(stripped):])
+
+        # The repeated value runs up to the next separator
+        for end, char in enumerate(chunk):
+            if char in _SEPARATORS:
+                break
+        else:
+            end = len(chunk)
+        value = chunk[:end]
+
+        expanded[-1] = stripped
+        expanded.append(b" ".join([value] * count) + chunk[end:])
+
+    return b"".join(expanded)
+
+
+def parse_sem_ascii(raw, ncol=2):
+    """
+    Convert the raw bytes of a SPECFEM ASCII seismogram into a 2D array.
+    Commas are treated as whitespace and N*value repeat tokens are expanded
+    before the buffer is parsed in one call
+
+    :type raw: bytes
+    :param raw: contents of a .sem? file, or any whole number of lines of one
+    :type ncol: int
+    :param ncol: number of columns expected per row, 2 for (time, data)
+    :rtype: np.ndarray
+    :return: float64 array with shape (ncol, nrows) so each column is a
+        contiguous row of the returned array
+    :raises ValueError: if the buffer contains non-numeric values or a
+        number of values that does not fill complete rows
+    """
+    if b"*" in raw:
+        raw = _expand_repeats(raw)
+    if b"," in raw:
+        raw = raw.replace(b",", b" ")
+
+    # NumPy only warns (and returns a partial array) on unparseable input, we
+    # want that to be a hard error like np.loadtxt
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", DeprecationWarning)
+        try:
+            values = np.fromstring(raw, dtype=np.float64, sep=" ")
+        except DeprecationWarning as e:
+            raise ValueError(f"could not parse SPECFEM ASCII data: {e}")
+
+    if values.size % ncol:
+        raise ValueError(f"SPECFEM ASCII data has {values.size} values which "
+                         f"does not split into {ncol} columns")
+
+    # Single transposed copy so that times and data are both C-contiguous
+    return values.reshape(-1, ncol).T.copy()
+
+
+def read_sem_ascii(fid):
+    """
+    Read a SPECFEM ASCII seismogram in a single pass
+
+    :type fid: str
+    :param fid: path of the given ascii file
+    :rtype: tuple of np.ndarray
+    :return: (times, data) as contiguous float64 arrays
+    """
+    with open(fid, "rb") as f:
+        raw = f.read()
+    try:
+        times, data = parse_sem_ascii(raw)
+    except ValueError as e:
+        raise ValueError(f"{fid}: {e}") from e
+
+    return times, data
@@ -0,0 +1,106 @@
+"""
+Memory-mapped access to SPECFEM binary seismograms
+
+SPECFEM2D writes one file per component when `save_binary_seismograms_single`
+or `save_binary_seismograms_double` is set, e.g., Ux_file_single_d.bin, with
+every receiver's trace stored back to back (receiver-major, no header). With
+`SU_FORMAT` the single precision output is instead written as Seismic Unix,
+e.g., Ux_file_single_d.su, where each trace is preceded by a 240 byte SEG-Y
+style header. SPECFEM3D writes the same SU layout per process.
+
+Nothing here reads the samples into memory; the returned arrays are views into
+an np.memmap, opened copy-on-write so in-place processing never touches the
+files on disk.
+"""
+import os
+import numpy as np
+
+
+# Subset of the 240 byte SEG-Y/SU trace header that SPECFEM fills in
+SU_HEADER_DTYPE = np.dtype({
+    "names": ["tracl", "tracr", "scalel", "scalco", "sx", "sy", "gx", "gy",
+              "ns", "dt"],
+    "formats": ["<i4", "<i4", "<i2", "<i2", "<i4", "<i4", "<i4", "<i4",
+                "<u2", "<u2"],
+    "offsets": [0, 4, 68, 70, 72, 76, 80, 84, 114, 116],
+    "itemsize": 240,
+})
+
+# SPECFEM2D binary file names encode component, precision and seismotype,
+# e.g., Uz_file_double_v.bin -> component 'z', float64, velocity ('semv')
+_PRECISION = {"single": np.float32, "double": np.float64}
+
+
+def parse_binary_name(fid):
+    """
+    Split a SPECFEM binary seismogram file name into its parts
+
+    :type fid: str
+    :param fid: e.g., 'OUTPUT_FILES/Ux_file_single_d.su'
+    :rtype: tuple
+    :return: (component, dtype, seismotype letter, file extension), e.g.,
+        ('x', np.float32, 'd', 'su')
+    :raises ValueError: if the name does not follow SPECFEM's convention
+    """
+    name, ext = os.path.splitext(os.path.basename(fid))
+    try:
+        comp, _, precision, seismotype = name.split("_")
+        dtype = _PRECISION[precision]
+    except (ValueError, KeyError):
+        raise ValueError(f"{fid} does not look like a SPECFEM binary "
+                         f"seismogram, expected e.g. 'Ux_file_single_d.bin'")
+    return comp[1:].lower(), dtype, seismotype, ext.lstrip(".")
+
+
+def memmap_sem_binary(fid, nrec, dtype=np.float32):
+    """
+    Map a headerless SPECFEM binary seismogram file (.bin) as a 2D array
+
+    :type fid: str
+    :param fid: path to the binary file
+    :type nrec: int
+    :param nrec: number of receivers written to the file, i.e., the number of
+        lines in the STATIONS file
+    :type dtype: np.dtype
+    :param dtype: np.float32 for *_single_* files, np.float64 for *_double_*
+    :rtype: np.memmap
+    :return: array of shape (nrec, nstep), row i is receiver i's trace
+    :raises ValueError: if the file size is not a multiple of nrec traces
+    """
+    itemsize = np.dtype(dtype).itemsize
+    nbytes = os.path.getsize(fid)
+    if nbytes % (nrec * itemsize):
+        raise ValueError(f"{fid} is {nbytes} bytes which does not split into "
+                         f"{nrec} traces of {np.dtype(dtype).name}")
+    nstep = nbytes // (nrec * itemsize)
+
+    return np.memmap(fid, dtype=dtype, mode="c", shape=(nrec, nstep))
+
+
+def memmap_su(fid):
+    """
+    Map a Seismic Unix file written by SPECFEM as a structured array of
+    (header, data) records. All traces are assumed to share the sample count
+    of the first header, which is always the case for SPECFEM output
+
+    :type fid: str
+    :param fid: path to the .su file
+    :rtype: np.memmap
+    :return: structured array of length nrec with fields 'header' (see
+        SU_HEADER_DTYPE) and 'data' (ns samples of float32 per trace)
+    :raises ValueError: if the file size is inconsistent with the header
+    """
+    first = np.fromfile(fid, dtype=SU_HEADER_DTYPE, count=1)
+    if not first.size:
+        raise ValueError(f"{fid} is empty")
+    ns = int(first["ns"][0])
+
+    trace_dtype = np.dtype([("header", SU_HEADER_DTYPE),
+                            ("data", np.float32, (ns,))])
+    nbytes = os.path.getsize(fid)
+    if nbytes % trace_dtype.itemsize:
+        raise ValueError(f"{fid} is {nbytes} bytes which is not a whole "
+                         f"number of {ns} sample SU traces")
+
+    return np.memmap(fid, dtype=trace_dtype, mode="c",
+                     shape=(nbytes // trace_dtype.itemsize,))
@@ -0,0 +1,129 @@
+"""
+Batched lowpass filtering for traces that share a sampling rate and length,
+e.g., all receivers of one simulation.
+
+ObsPy's Trace.filter() designs the Butterworth filter and copies the data once
+per trace. Here the traces are stacked into one 2D array, the second-order
+sections are designed once and the whole stack is filtered along the time axis
+in a single call. Results match Trace.filter('lowpass', ...) to floating point
+precision, including zerophase (a forward pass then a backward pass, as ObsPy
+does, not scipy's padded sosfiltfilt) so switching does not change figures.
+"""
+import numpy as np
+from scipy.signal import iirfilter, sosfilt, zpk2sos
+
+
+def lowpass_sos(freq, delta, corners=4):
+    """
+    Butterworth lowpass as second-order sections, designed the same way as
+    obspy.signal.filter.lowpass
+
+    :type freq: float
+    :param freq: corner frequency in Hz
+    :type delta: float
+    :param delta: sampling interval in seconds
+    :type corners: int
+    :param corners: filter corners / order
+    :rtype: np.ndarray
+    :return: second-order sections for scipy.signal.sosfilt
+    :raises ValueError: if `freq` is not below the Nyquist frequency
+    """
+    fe = 0.5 / delta
+    f = freq / fe
+    if not 0 < f < 1:
+        raise ValueError(f"lowpass corner {freq} Hz must be between 0 and the "
+                         f"Nyquist frequency {fe} Hz")
+    z, p, k = iirfilter(corners, f, btype="lowpass", ftype="butter",
+                        output="zpk")
+    return zpk2sos(z, p, k)
+
+
+def decimation_factor(freq, delta, oversample=10.):
+    """
+    Largest integer decimation factor that keeps the Nyquist frequency at
+    least `oversample` times above a lowpass corner, i.e., decimating after
+    the lowpass cannot alias. A 0.018 Hz lowpass of 20 Hz data gives 55
+
+    :type freq: float
+    :param freq: lowpass corner frequency in Hz
+    :type delta: float
+    :param delta: sampling interval in seconds
+    :type oversample: float
+    :param oversample: required ratio of new Nyquist to corner frequency
+    :rtype: int
+    :return: decimation factor, at least 1
+    """
+    return max(1, int(0.5 / (delta * freq * oversample)))
+
+
+def lowpass_stack(data, delta, freq, corners=4, zerophase=True,
+                  decimate=False, oversample=10.):
+    """
+    Lowpass every row of a 2D (trace x time) array in one call
+
+    :type data: np.ndarray
+    :param data: 2D array, one trace per row, or a 1D single trace
+    :type delta: float
+    :param delta: sampling interval shared by all traces, in seconds
+    :type freq: float
+    :param freq: corner frequency in Hz
+    :type corners: int
+    :param corners: filter corners / order
+    :type zerophase: bool
+    :param zerophase: filter forwards and backwards, doubling the order
+    :type decimate: bool
+    :param decimate: also downsample by `decimation_factor`, e.g., to the
+        bandwidth needed for plotting
+    :type oversample: float
+    :param oversample: see `decimation_factor`
+    :rtype: tuple
+    :return: (filtered array, sampling interval of the filtered array)
+    """
+    sos = lowpass_sos(freq, delta, corners)
+    filtered = sosfilt(sos, data, axis=-1)
+    if zerophase:
+        filtered = sosfilt(sos, filtered[..., ::-1], axis=-1)[..., ::-1]
+
+    if decimate:
+        factor = decimation_factor(freq, delta, oversample)
+        filtered = filtered[..., ::factor]
+        delta *= factor
+
+    return np.ascontiguousarray(filtered), delta
+
+
+def lowpass_stream(st, freq, corners=4, zerophase=True, decimate=False,
+                   oversample=10.):
+    """
+    Batched equivalent of st.filter('lowpass', ...). Traces are grouped by
+    (delta, npts) and each group is filtered as one stack; every trace's data
+    is replaced in place by its row of the filtered stack
+
+    :type st: obspy.Stream
+    :param st: traces to filter
+    :type freq: float
+    :param freq: corner frequency in Hz
+    :type corners: int
+    :param corners: filter corners / order
+    :type zerophase: bool
+    :param zerophase: filter forwards and backwards
+    :type decimate: bool
+    :param decimate: also downsample, see `lowpass_stack`
+    :type oversample: float
+    :param oversample: see `decimation_factor`
+    :rtype: obspy.Stream
+    :return: the same Stream, for chaining
+    """
+    groups = {}
+    for tr in st:
+        groups.setdefault((tr.stats.delta, tr.stats.npts), []).append(tr)
+
+    for (delta, _), traces in groups.items():
+        stack = np.vstack([tr.data for tr in traces])
+        filtered, new_delta = lowpass_stack(stack, delta, freq, corners,
+                                            zerophase, decimate, oversample)
+        for tr, data in zip(traces, filtered):
+            tr.data = data
+            tr.stats.delta = new_delta
+
+    return st
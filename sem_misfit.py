@@ -0,0 +1,242 @@
+"""
+Compare model runs against each other: for every pair of runs and every
+station, the cross-correlation time lag, the maximum correlation coefficient,
+the L2 waveform misfit and the amplitude ratio.
+
+All runs are read into one (run x station x time) array (see
+specfem_io.block) and Fourier transformed once. The cross-correlations of all
+run pairs and stations then come from a single batched irfft of the
+cross-spectra, in groups of pairs to bound memory, rather than a correlation
+per pair and station. The zero-lag correlation also gives the L2 misfit
+without another pass over the data. Dozens of candidate models can be ranked
+against a reference run:
+
+    python sem_misfit.py V1-Tc V1-Th V4-Tc --tmin 0 --tmax 7000 \
+        --lowpass 0.018 --reference V1-Tc -o misfit.npz
+"""
+import os
+import argparse
+from time import perf_counter
+
+import numpy as np
+from scipy.fft import rfft, irfft, next_fast_len
+from scipy.signal.windows import tukey
+
+from specfem_data import STATIONS
+from specfem_io.block import read_sem_block
+
+
+def load_runs(folders, stations=STATIONS, network="XX", channel="BXX",
+              tmin=None, tmax=None, lowpass=None, dtype=np.float64,
+              workers=None):
+    """
+    Read the same stations of several runs into one aligned array
+
+    :type folders: list of str
+    :param folders: run directories, e.g., ['V1-Tc', 'V1-Th', 'V4-Tc']
+    :type stations: list of str
+    :param stations: station codes, the order of the station axis
+    :type network: str
+    :param network: network code of the file names
+    :type channel: str
+    :param channel: channel of the file names
+    :type tmin: float
+    :param tmin: start of the time window in seconds
+    :type tmax: float
+    :param tmax: end of the time window in seconds
+    :type lowpass: float
+    :param lowpass: optional lowpass corner in Hz, applied (with decimation)
+        before windowing
+    :type dtype: np.dtype
+    :param dtype: sample type held in memory
+    :type workers: int
+    :param workers: number of parsing processes per run
+    :rtype: tuple
+    :return: ((nrun, nsta, npts) array, delta, time of the first sample)
+    :raises ValueError: if the runs do not share one time axis
+    """
+    data = None
+    for i, folder in enumerate(folders):
+        fids = [os.path.join(folder, f"{network}.{sta}.{channel}.semd")
+                for sta in stations]
+        block = read_sem_block(fids, dtype=dtype, workers=workers)
+        if lowpass:
+            block.lowpass(lowpass, decimate=True)
+        block = block.window(tmin, tmax)
+        if data is None:
+            data = np.empty((len(folders), len(stations), block.npts),
+                            dtype=dtype)
+            delta, t0 = block.delta, block.t0
+        elif (block.npts, block.delta, block.t0) != (data.shape[-1], delta,
+                                                     t0):
+            raise ValueError(f"{folder} has {block.npts} samples of "
+                             f"{block.delta} s from {block.t0} s, "
+                             f"{folders[0]} has {data.shape[-1]} of {delta} "
+                             f"s from {t0} s")
+        data[i] = block.data
+
+    return data, delta, t0
+
+
+def misfit_matrix(data, delta, max_lag=None, taper=0.05, chunk=2 ** 26):
+    """
+    Pairwise comparison of all runs at every station. For runs i and j,
+    lag[i, j] is the time by which run i is delayed relative to run j (the
+    shift of i that best matches j is -lag), cc[i, j] the normalized
+    correlation at that lag, l2[i, j] the L2 norm of (i - j) relative to
+    that of j, and amp_ratio[i, j] the ratio of the peak absolute
+    amplitudes of i and j
+
+    :type data: np.ndarray
+    :param data: (nrun, nsta, npts) traces on a common time axis, see
+        `load_runs`
+    :type delta: float
+    :param delta: sampling interval in seconds
+    :type max_lag: float
+    :param max_lag: largest lag searched in seconds, defaults to the whole
+        window
+    :type taper: float
+    :param taper: fraction of the window tapered (Tukey) at both ends, so
+        the window edges do not correlate
+    :type chunk: int
+    :param chunk: number of cross-correlation samples computed at once,
+        bounds memory for many runs
+    :rtype: dict
+    :return: 'lag' (s), 'cc', 'l2' and 'amp_ratio', each (nrun, nrun, nsta)
+    """
+    nrun, nsta, npts = data.shape
+    if taper:
+        data = data * tukey(npts, taper)
+
+    # Zero padding to 2 npts - 1 makes the circular correlation linear
+    nfft = next_fast_len(2 * npts - 1, real=True)
+    spectra = rfft(data, n=nfft, axis=-1)
+    energy = np.einsum("rst,rst->rs", data, data)
+    peak = np.abs(data).max(axis=-1)
+
+    max_shift = npts - 1 if max_lag is None else \
+        min(npts - 1, int(round(max_lag / delta)))
+    # Lags 0, 1, ..., max_shift then -max_shift, ..., -1 in irfft order
+    shifts = np.concatenate([np.arange(max_shift + 1),
+                             np.arange(-max_shift, 0)])
+
+    out = {key: np.zeros((nrun, nrun, nsta)) for key in
+           ["lag", "cc", "l2", "amp_ratio"]}
+    pairs = np.array([(i, j) for i in range(nrun) for j in range(i, nrun)])
+    step = max(1, chunk // (nsta * nfft))
+    for start in range(0, len(pairs), step):
+        ii, jj = pairs[start:start + step].T
+        xcorr = irfft(spectra[ii] * spectra[jj].conj(), n=nfft, axis=-1)
+        xcorr = xcorr[..., shifts]
+
+        norm = np.sqrt(energy[ii] * energy[jj])
+        norm[norm == 0] = 1.
+        best = np.abs(xcorr).argmax(axis=-1)
+        cc = np.take_along_axis(xcorr, best[..., None], axis=-1)[..., 0]
+        lag = shifts[best] * delta
+        out["cc"][ii, jj] = out["cc"][jj, ii] = cc / norm
+        out["lag"][ii, jj] = lag
+        out["lag"][jj, ii] = 0. - lag  # no -0.0
+
+        # |a - b|^2 = |a|^2 + |b|^2 - 2 a.b, with a.b the zero-lag term
+        diff = np.maximum(energy[ii] + energy[jj] - 2 * xcorr[..., 0], 0)
+        diff[ii == jj] = 0.  # rather than the square root of roundoff
+        with np.errstate(divide="ignore", invalid="ignore"):
+            out["l2"][ii, jj] = np.sqrt(diff / energy[jj])
+            out["l2"][jj, ii] = np.sqrt(diff / energy[ii])
+            out["amp_ratio"][ii, jj] = peak[ii] / peak[jj]
+            out["amp_ratio"][jj, ii] = peak[jj] / peak[ii]
+
+    return out
+
+
+def rank_runs(misfit, reference=None):
+    """
+    Order runs by their station-averaged L2 misfit
+
+    :type misfit: dict
+    :param misfit: output of `misfit_matrix`
+    :type reference: int
+    :param reference: index of the run to compare against, e.g., an
+        observed or preferred model. Without one, runs are ranked by their
+        average misfit to all other runs
+    :rtype: tuple of np.ndarray
+    :return: (run indices from best to worst, their average misfit)
+    """
+    l2 = np.nanmean(misfit["l2"], axis=-1)
+    if reference is not None:
+        score = l2[:, reference]
+    else:
+        nrun = len(l2)
+        score = (l2.sum(axis=1) - np.diag(l2)) / max(nrun - 1, 1)
+    order = np.argsort(score, kind="stable")
+    return order, score[order]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("folders", nargs="+",
+                        help="model run directories with .semd files")
+    parser.add_argument("-s", "--stations", nargs="+", default=STATIONS,
+                        help="station codes to compare")
+    parser.add_argument("-n", "--network", default="XX",
+                        help="network code of the file names")
+    parser.add_argument("-c", "--channel", default="BXX",
+                        help="channel of the file names")
+    parser.add_argument("--tmin", type=float, default=None,
+                        help="start of the time window in seconds")
+    parser.add_argument("--tmax", type=float, default=None,
+                        help="end of the time window in seconds")
+    parser.add_argument("--lowpass", type=float, default=None,
+                        help="lowpass corner frequency in Hz")
+    parser.add_argument("--max-lag", type=float, default=None,
+                        help="largest lag searched in seconds")
+    parser.add_argument("--taper", type=float, default=0.05,
+                        help="fraction of the window tapered at both ends")
+    parser.add_argument("-r", "--reference", default=None,
+                        help="run to rank the others against")
+    parser.add_argument("-w", "--workers", type=int, default=None,
+                        help="number of parsing processes")
+    parser.add_argument("-o", "--output", default=None,
+                        help="save the run x run x station tables to this "
+                             ".npz file")
+    args = parser.parse_args()
+
+    tstart = perf_counter()
+    data, delta, t0 = load_runs(args.folders, args.stations, args.network,
+                                args.channel, args.tmin, args.tmax,
+                                args.lowpass, workers=args.workers)
+    tread = perf_counter() - tstart
+    misfit = misfit_matrix(data, delta, args.max_lag, args.taper)
+    print(f"{len(args.folders)} runs x {len(args.stations)} stations x "
+          f"{data.shape[-1]} samples: read in {tread:.2f}s, compared in "
+          f"{perf_counter() - tstart - tread:.2f}s")
+
+    names = [os.path.basename(os.path.normpath(_)) for _ in args.folders]
+    reference = None
+    if args.reference:
+        reference = names.index(os.path.basename(
+            os.path.normpath(args.reference)))
+    order, score = rank_runs(misfit, reference)
+
+    ref = order[0] if reference is None else reference
+    print(f"{'station':>8} " + " ".join(
+        f"{name:>24}" for i, name in enumerate(names) if i != ref))
+    print(f"{'':>8} " + " ".join(
+        f"{'lag(s)    cc    l2 amp':>24}" for i in range(len(names))
+        if i != ref))
+    for k, sta in enumerate(args.stations):
+        print(f"{sta:>8} " + " ".join(
+            f"{misfit['lag'][i, ref, k]:7.1f} {misfit['cc'][i, ref, k]:5.2f} "
+            f"{misfit['l2'][i, ref, k]:5.2f} "
+            f"{misfit['amp_ratio'][i, ref, k]:4.2f}"
+            for i in range(len(names)) if i != ref))
+
+    against = f"against {names[ref]}" if reference is not None else \
+        "against all other runs"
+    print(f"ranking by mean L2 misfit {against}:")
+    for rank, (i, value) in enumerate(zip(order, score)):
+        print(f"{rank + 1:>4}. {names[i]:<16} {value:.3f}")
+
+    if args.output:
+        np.savez(args.output, runs=names, stations=args.stations, **misfit)
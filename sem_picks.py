@@ -0,0 +1,317 @@
+"""
+Pick arrivals in the synthetics of a run and tabulate travel time against
+epicentral distance.
+
+make_stations.py places receivers every 15 degrees on the surface and encodes
+the angle in the station name (S075 is at 75 degrees, SN45 at -45 degrees),
+with the source at the north pole (90 degrees), so the names give the
+epicentral distance of every trace. The picker works on a whole run at once
+(see specfem_io.block): STA/LTA ratios of all traces come from one cumulative
+sum along the time axis, or an envelope threshold from one batched Hilbert
+transform, and every trigger of every trace is found in one comparison.
+Later triggers (e.g., core phases) are kept alongside the first arrival:
+
+    python sem_picks.py V1-Tc V1-Th V4-Tc --lowpass 0.05 --sta 50 --lta 500 \
+        --threshold 3 -o travel_times.png
+"""
+import os
+import re
+import argparse
+from time import perf_counter
+
+import numpy as np
+
+from specfem_data import STATIONS
+from specfem_io.block import read_sem_block
+
+
+# Source position of the Venus runs (SOURCE xs = 0, zs = surface)
+SOURCE_ANGLE = 90.
+
+_STATION_NAME = re.compile(r"^S(N?)(\d+)$")
+
+
+def station_angle(stations):
+    """
+    Angle of a receiver from the x-axis, from its make_stations.py name
+
+    :type stations: str or list of str
+    :param stations: station codes, e.g., 'S075' or ['S000', 'SN90']
+    :rtype: np.ndarray
+    :return: angles in degrees, negative for 'SN' stations
+    :raises ValueError: if a name does not follow make_stations.py
+    """
+    angles = []
+    for sta in np.atleast_1d(stations):
+        match = _STATION_NAME.match(str(sta))
+        if not match:
+            raise ValueError(f"station {sta} is not named S<angle> or "
+                             f"SN<angle> by make_stations.py")
+        sign, angle = match.groups()
+        angles.append(-float(angle) if sign else float(angle))
+    return np.array(angles)
+
+
+def epicentral_distance(stations, source_angle=SOURCE_ANGLE):
+    """
+    Epicentral distance of receivers named by make_stations.py
+
+    :type stations: str or list of str
+    :param stations: station codes
+    :type source_angle: float
+    :param source_angle: angle of the source from the x-axis in degrees
+    :rtype: np.ndarray
+    :return: distances in degrees, between 0 and 180
+    """
+    distance = np.abs(source_angle - station_angle(stations)) % 360
+    return np.minimum(distance, 360 - distance)
+
+
+def sta_lta(data, nsta, nlta, water_level=1E-3):
+    """
+    Classic STA/LTA of every row of a 2D array, the short and long term
+    averages of the squared signal ending at each sample, from one
+    cumulative sum. Synthetics are numerically zero before the first
+    arrival, so a water level is added to the LTA to keep roundoff noise
+    from triggering
+
+    :type data: np.ndarray
+    :param data: (ntrace, npts) traces
+    :type nsta: int
+    :param nsta: short window length in samples
+    :type nlta: int
+    :param nlta: long window length in samples
+    :type water_level: float
+    :param water_level: fraction of each trace's mean square added to its
+        LTA
+    :rtype: np.ndarray
+    :return: (ntrace, npts) ratio, 0 for the first nsta - 1 samples
+    """
+    npts = data.shape[-1]
+    csum = np.zeros(data.shape[:-1] + (npts + 1,))
+    np.cumsum(np.square(data, dtype=np.float64), axis=-1, out=csum[..., 1:])
+
+    # Windows ending at samples nsta - 1, ..., npts - 1; the LTA window
+    # grows from the first sample until it is nlta long, so arrivals in the
+    # first LTA window can trigger too
+    end = np.arange(nsta, npts + 1)
+    length = np.minimum(end, nlta)
+    sta = (csum[..., end] - csum[..., end - nsta]) / nsta
+    lta = (csum[..., end] - csum[..., end - length]) / length
+    lta += water_level * csum[..., -1:] / npts
+
+    ratio = np.zeros(data.shape)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio[..., nsta - 1:] = np.where(lta > 0, sta / lta, 0.)
+    return ratio
+
+
+def envelope_ratio(data):
+    """
+    Envelope of every row of a 2D array relative to its maximum, from one
+    batched Hilbert transform
+
+    :type data: np.ndarray
+    :param data: (ntrace, npts) traces
+    :rtype: np.ndarray
+    :return: (ntrace, npts) envelope, 1 at each trace's peak
+    """
+    from scipy.signal import hilbert
+
+    env = np.abs(hilbert(data, axis=-1))
+    peak = env.max(axis=-1, keepdims=True)
+    peak[peak == 0] = 1.
+    return env / peak
+
+
+def triggers(ratio, threshold, min_separation=0, start=0):
+    """
+    Every sample where a characteristic function rises above a threshold
+
+    :type ratio: np.ndarray
+    :param ratio: (ntrace, npts) characteristic function, e.g., `sta_lta`
+    :type threshold: float
+    :param threshold: trigger level
+    :type min_separation: int
+    :param min_separation: triggers closer than this many samples to the
+        previous one on the same trace are dropped
+    :type start: int
+    :param start: triggers before this sample are dropped first, so they
+        cannot suppress later ones through `min_separation`
+    :rtype: list of np.ndarray
+    :return: sample indices of the triggers of each trace
+    """
+    above = ratio >= threshold
+    rising = above[:, 1:] & ~above[:, :-1]
+    rows, cols = np.nonzero(rising)
+    cols = cols + 1
+    rows, cols = rows[cols >= start], cols[cols >= start]
+
+    picks = np.split(cols, np.searchsorted(rows, np.arange(1, len(ratio))))
+    if min_separation:
+        for i, idx in enumerate(picks):
+            keep = [0] if len(idx) else []
+            for k in range(1, len(idx)):
+                if idx[k] - idx[keep[-1]] >= min_separation:
+                    keep.append(k)
+            picks[i] = idx[keep]
+    return picks
+
+
+def pick_block(block, method="stalta", sta=50., lta=500., threshold=3.,
+               min_separation=None, tmin=None):
+    """
+    Arrival times of every receiver of a run
+
+    :type block: specfem_io.block.SemBlock
+    :param block: traces of the run
+    :type method: str
+    :param method: 'stalta' for an STA/LTA trigger or 'envelope' for the
+        envelope rising above `threshold` times its maximum
+    :type sta: float
+    :param sta: short term window in seconds (stalta)
+    :type lta: float
+    :param lta: long term window in seconds (stalta)
+    :type threshold: float
+    :param threshold: STA/LTA trigger ratio, or fraction of the envelope
+        maximum (e.g., 0.1) for 'envelope'
+    :type min_separation: float
+    :param min_separation: seconds between two triggers on one trace,
+        defaults to `lta`
+    :type tmin: float
+    :param tmin: ignore triggers before this time, e.g., the source wavelet
+    :rtype: list of np.ndarray
+    :return: trigger times of each receiver in seconds relative to the
+        origin time, first arrival first
+    :raises ValueError: for an unknown `method`
+    """
+    if method == "stalta":
+        nsta = max(1, int(round(sta / block.delta)))
+        nlta = max(nsta + 1, int(round(lta / block.delta)))
+        ratio = sta_lta(block.data, nsta, nlta)
+    elif method == "envelope":
+        ratio = envelope_ratio(block.data)
+    else:
+        raise ValueError(f"unknown picking method {method}")
+
+    if min_separation is None:
+        min_separation = lta
+    start = 0 if tmin is None else \
+        max(0, int(np.ceil((tmin - block.t0) / block.delta - 1E-9)))
+    picks = triggers(ratio, threshold,
+                     int(round(min_separation / block.delta)), start)
+    return [block.t0 + idx * block.delta for idx in picks]
+
+
+def travel_time_table(block, picks, source_angle=SOURCE_ANGLE):
+    """
+    First arrival against distance, sorted by distance
+
+    :type block: specfem_io.block.SemBlock
+    :param block: traces the picks were made on
+    :type picks: list of np.ndarray
+    :param picks: output of `pick_block`
+    :type source_angle: float
+    :param source_angle: see `epicentral_distance`
+    :rtype: np.ndarray
+    :return: structured array with fields station, distance (degrees),
+        time (s, NaN if nothing triggered) and npicks
+    """
+    table = np.zeros(len(block), dtype=[("station", "U32"),
+                                        ("distance", "f8"), ("time", "f8"),
+                                        ("npicks", "i8")])
+    table["station"] = block.station
+    table["distance"] = epicentral_distance(block.station, source_angle)
+    table["time"] = [t[0] if len(t) else np.nan for t in picks]
+    table["npicks"] = [len(t) for t in picks]
+    return np.sort(table, order="distance")
+
+
+def plot_travel_times(ax, results, labels):
+    """
+    First arrivals (filled) and later triggers (open) against distance, one
+    color per run
+
+    :type ax: matplotlib.axes.Axes
+    :param ax: axis to plot on
+    :type results: list of tuple
+    :param results: (block, picks) of each run
+    :type labels: list of str
+    :param labels: run names for the legend
+    """
+    for (block, picks), label in zip(results, labels):
+        distance = epicentral_distance(block.station)
+        first = np.array([t[0] if len(t) else np.nan for t in picks])
+        order = np.argsort(distance)
+        line, = ax.plot(distance[order], first[order], "o-", label=label)
+        for dist, t in zip(distance, picks):
+            ax.plot(np.full(len(t) - 1, dist), t[1:], "o", mfc="none",
+                    color=line.get_color())
+    ax.set_xlabel("Epicentral distance (degrees)")
+    ax.set_ylabel("Travel time (s)")
+    ax.legend()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("folders", nargs="+",
+                        help="model run directories with .semd files")
+    parser.add_argument("-s", "--stations", nargs="+", default=STATIONS,
+                        help="station codes named by make_stations.py")
+    parser.add_argument("-n", "--network", default="XX",
+                        help="network code of the file names")
+    parser.add_argument("-c", "--channel", default="BXX",
+                        help="channel of the file names")
+    parser.add_argument("-m", "--method", default="stalta",
+                        choices=["stalta", "envelope"],
+                        help="characteristic function to trigger on")
+    parser.add_argument("--sta", type=float, default=50.,
+                        help="short term window in seconds")
+    parser.add_argument("--lta", type=float, default=500.,
+                        help="long term window in seconds")
+    parser.add_argument("--threshold", type=float, default=3.,
+                        help="STA/LTA ratio, or envelope fraction, to "
+                             "trigger on")
+    parser.add_argument("--min-separation", type=float, default=None,
+                        help="seconds between triggers, default --lta")
+    parser.add_argument("--tmin", type=float, default=None,
+                        help="ignore triggers before this time")
+    parser.add_argument("--lowpass", type=float, default=None,
+                        help="lowpass (and decimate) before picking, Hz")
+    parser.add_argument("-w", "--workers", type=int, default=None,
+                        help="number of parsing processes")
+    parser.add_argument("-o", "--output", default=None,
+                        help="save a travel time figure to this file")
+    args = parser.parse_args()
+
+    results, names = [], []
+    for folder in args.folders:
+        tstart = perf_counter()
+        fids = [os.path.join(folder, f"{args.network}.{sta}.{args.channel}"
+                                     f".semd") for sta in args.stations]
+        block = read_sem_block(fids, workers=args.workers)
+        tread = perf_counter() - tstart
+        if args.lowpass:
+            block.lowpass(args.lowpass, decimate=True)
+        picks = pick_block(block, args.method, args.sta, args.lta,
+                           args.threshold, args.min_separation, args.tmin)
+        results.append((block, picks))
+        names.append(os.path.basename(os.path.normpath(folder)))
+
+        print(f"{folder}: read in {tread:.2f}s, picked in "
+              f"{perf_counter() - tstart - tread:.2f}s")
+        print(f"{'station':>8} {'dist':>6} {'first(s)':>9}  later triggers")
+        for row in travel_time_table(block, picks):
+            later = picks[block.index(row["station"])][1:]
+            print(f"{row['station']:>8} {row['distance']:6.1f} "
+                  f"{row['time']:9.1f}  "
+                  f"{' '.join(f'{t:.1f}' for t in later)}")
+
+    if args.output:
+        import matplotlib
+        matplotlib.use("Agg")
+        from matplotlib import pyplot as plt
+
+        fig, ax = plt.subplots(figsize=(6, 5))
+        plot_travel_times(ax, results, names)
+        fig.savefig(args.output)
@@ -0,0 +1,93 @@
+"""
+Level-of-detail line plotting for long seismograms.
+
+A 140k sample trace drawn into an axis a few hundred pixels wide puts hundreds
+of points into every pixel column. Keeping only the minimum and maximum sample
+(in their original order) of each column draws the same picture, since the line
+still spans the full vertical extent of every column, with ~2 points per pixel
+instead. The reduction is redone for the visible range whenever the x-limits
+change, so zooming in brings back full detail.
+"""
+import numpy as np
+
+
+def minmax_decimate(t, y, xmin, xmax, ncols):
+    """
+    Reduce a regularly sampled line to the min/max pair of every pixel column
+    within [xmin, xmax]
+
+    :type t: np.ndarray
+    :param t: monotonically increasing sample times
+    :type y: np.ndarray
+    :param y: sample values
+    :type xmin: float
+    :param xmin: left edge of the visible range
+    :type xmax: float
+    :param xmax: right edge of the visible range
+    :type ncols: int
+    :param ncols: number of pixel columns the range is drawn into
+    :rtype: tuple of np.ndarray
+    :return: (t, y) of the reduced line. Lines with fewer than ~2 samples per
+        column are returned (sliced to the visible range) unchanged
+    """
+    # Keep one sample beyond each edge so the line runs off the axes
+    start = max(np.searchsorted(t, xmin, side="right") - 1, 0)
+    stop = min(np.searchsorted(t, xmax, side="left") + 1, len(t))
+    t, y = t[start:stop], y[start:stop]
+
+    ncols = max(int(ncols), 1)
+    per_col = len(t) // ncols
+    if per_col <= 2:
+        return t, y
+
+    # Full columns are reduced as a 2D block, the few leftover samples at the
+    # end are kept as they are
+    nfull = ncols * per_col
+    block = y[:nfull].reshape(ncols, per_col)
+    offsets = np.arange(ncols) * per_col
+    imin = block.argmin(axis=1) + offsets
+    imax = block.argmax(axis=1) + offsets
+
+    # Draw the two extremes of each column in the order they occur
+    idx = np.sort(np.column_stack([imin, imax]), axis=1).ravel()
+    idx = np.concatenate([idx, np.arange(nfull, len(t))])
+
+    return t[idx], y[idx]
+
+
+def plot_lod(ax, t, y, ncols=None, **kwargs):
+    """
+    Drop-in replacement for ax.plot(t, y, ...) that only hands matplotlib the
+    min/max envelope of each pixel column, recomputed on every x-limit change
+    (set_xlim, zoom, pan)
+
+    :type ax: matplotlib.axes.Axes
+    :param ax: axis to plot on
+    :type t: np.ndarray
+    :param t: monotonically increasing sample times
+    :type y: np.ndarray
+    :param y: sample values
+    :type ncols: int
+    :param ncols: number of columns to reduce to, defaults to twice the width
+        of `ax` in display pixels, so antialiased line edges also match
+    :param kwargs: passed to ax.plot, e.g., color, linewidth
+    :rtype: matplotlib.lines.Line2D
+    :return: the plotted line
+    """
+    t = np.asarray(t)
+    y = np.asarray(y)
+
+    def _ncols():
+        return ncols or 2 * ax.get_window_extent().width
+
+    # Initial reduction over the full trace so autoscaling sees the real
+    # data limits
+    line, = ax.plot(*minmax_decimate(t, y, t[0], t[-1], _ncols()), **kwargs)
+
+    def _update(ax_):
+        xmin, xmax = sorted(ax_.get_xlim())
+        line.set_data(*minmax_decimate(t, y, xmin, xmax, _ncols()))
+
+    ax.callbacks.connect("xlim_changed", _update)
+
+    return line
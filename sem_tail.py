@@ -0,0 +1,257 @@
+"""
+Incremental readers for SPECFEM ASCII seismograms that are still being
+written.
+
+With NTSTEP_BETWEEN_OUTPUT_SEISMOS = 1000, SPECFEM appends another 1000 rows
+to every .sem? file as the run progresses. Instead of re-reading whole files,
+each file remembers the byte offset it has parsed up to, reads only what was
+appended since (up to the last complete line) and extends a preallocated
+array that grows by doubling, so every poll costs time proportional to the
+new data only. A whole OUTPUT_FILES directory can be followed, with a live
+record section refreshed as data arrive:
+
+    python sem_tail.py OUTPUT_FILES --pattern "*.BXZ.semd" --interval 30 \
+        --nstep 140000 --output progress.png
+"""
+import os
+import argparse
+from glob import glob
+from time import perf_counter, sleep
+
+import numpy as np
+
+from sem_ascii import parse_sem_ascii
+
+
+class SemTail:
+    """
+    Follow one SPECFEM ASCII seismogram, parsing only appended rows
+
+    :type fid: str
+    :param fid: path to the .sem? file, which need not exist yet
+    :type capacity: int
+    :param capacity: number of rows to preallocate, e.g., NSTEP, so the
+        arrays never have to grow. Grows by doubling when exceeded
+    """
+    def __init__(self, fid, capacity=None):
+        self.fid = fid
+        self.offset = 0
+        self.npts = 0
+        self._buffer = np.empty((2, capacity or 1024))
+
+    @property
+    def times(self):
+        """
+        Times of all rows read so far, a view into the growable buffer
+        """
+        return self._buffer[0, :self.npts]
+
+    @property
+    def data(self):
+        """
+        Samples of all rows read so far, a view into the growable buffer
+        """
+        return self._buffer[1, :self.npts]
+
+    def reset(self):
+        """
+        Forget everything read so far, e.g., when the file was rewritten
+        """
+        self.offset = 0
+        self.npts = 0
+
+    def _append(self, rows):
+        """
+        Copy parsed (2, n) rows into the buffer, doubling it if needed
+        """
+        n = rows.shape[1]
+        if self.npts + n > self._buffer.shape[1]:
+            capacity = max(2 * self._buffer.shape[1], self.npts + n)
+            buffer = np.empty((2, capacity))
+            buffer[:, :self.npts] = self._buffer[:, :self.npts]
+            self._buffer = buffer
+        self._buffer[:, self.npts:self.npts + n] = rows
+        self.npts += n
+
+    def poll(self):
+        """
+        Parse whatever complete lines were appended since the last poll. A
+        partially written last line is left for the next poll, and a file
+        that shrank (a restarted run) is read again from the start
+
+        :rtype: int
+        :return: number of new rows
+        :raises ValueError: if the appended data cannot be parsed
+        """
+        try:
+            size = os.path.getsize(self.fid)
+        except FileNotFoundError:
+            return 0
+        if size < self.offset:
+            self.reset()
+        if size == self.offset:
+            return 0
+
+        with open(self.fid, "rb") as f:
+            f.seek(self.offset)
+            raw = f.read(size - self.offset)
+        end = raw.rfind(b"\n") + 1
+        if not end:
+            return 0
+
+        try:
+            rows = parse_sem_ascii(raw[:end])
+        except ValueError as e:
+            raise ValueError(f"{self.fid}: {e}") from e
+        self._append(rows)
+        self.offset += end
+
+        return rows.shape[1]
+
+
+class SemDirTail:
+    """
+    Follow every seismogram matching a pattern in a directory, picking up
+    files that appear while the run goes on
+
+    :type path: str
+    :param path: directory SPECFEM writes seismograms to, e.g., OUTPUT_FILES
+    :type pattern: str
+    :param pattern: glob of the files to follow
+    :type capacity: int
+    :param capacity: rows to preallocate per file, see `SemTail`
+    """
+    def __init__(self, path, pattern="*.sem?", capacity=None):
+        self.path = path
+        self.pattern = pattern
+        self.capacity = capacity
+        self.tails = {}
+
+    def __getitem__(self, fid):
+        return self.tails[fid]
+
+    def __iter__(self):
+        return iter(self.tails.values())
+
+    def __len__(self):
+        return len(self.tails)
+
+    def poll(self):
+        """
+        Look for new files and parse the rows appended to all of them
+
+        :rtype: dict
+        :return: file names mapped to their number of new rows, for files
+            that changed
+        """
+        for fid in sorted(glob(os.path.join(self.path, self.pattern))):
+            if fid not in self.tails:
+                self.tails[fid] = SemTail(fid, self.capacity)
+
+        updated = {}
+        for fid, tail in self.tails.items():
+            n = tail.poll()
+            if n:
+                updated[fid] = n
+        return updated
+
+
+def plot_live(path, pattern="*.sem?", interval=30., nstep=None, dt=None,
+              output=None, max_polls=None):
+    """
+    Follow a directory and redraw a normalized record section after every
+    poll that brought new data, until interrupted or the traces are complete
+
+    :type path: str
+    :param path: directory SPECFEM writes seismograms to
+    :type pattern: str
+    :param pattern: glob of the files to plot, e.g., '*.BXZ.semd'
+    :type interval: float
+    :param interval: seconds between polls
+    :type nstep: int
+    :param nstep: NSTEP of the run, used to preallocate, fix the time axis
+        and stop once every trace is complete
+    :type dt: float
+    :param dt: DT of the run, for the time axis
+    :type output: str
+    :param output: save the figure here after every refresh (e.g., on a
+        cluster without a display) instead of showing it
+    :type max_polls: int
+    :param max_polls: stop after this many polls
+    """
+    import matplotlib
+    if output:
+        matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    from sem_plot import minmax_decimate
+
+    follower = SemDirTail(path, pattern, capacity=nstep)
+    fig, ax = plt.subplots(figsize=(8, 6))
+    fig.subplots_adjust(left=0.2)
+    ax.set_xlabel("Time (s)")
+    ax.set_yticks([])
+    lines = {}
+    npoll = 0
+    while True:
+        tstart = perf_counter()
+        updated = follower.poll()
+        npoll += 1
+        if updated:
+            for i, (fid, tail) in enumerate(follower.tails.items()):
+                if fid not in lines:
+                    lines[fid], = ax.plot([], [], color="k", linewidth=0.7)
+                    ax.text(0, -i, os.path.basename(fid), fontsize=7,
+                            verticalalignment="center",
+                            horizontalalignment="right",
+                            transform=ax.get_yaxis_transform())
+                if not tail.npts:
+                    continue
+                # Only min/max per pixel column is drawn, see sem_plot.py
+                t, y = minmax_decimate(tail.times, tail.data, tail.times[0],
+                                       tail.times[-1], 2000)
+                scale = np.abs(y).max() or 1.
+                lines[fid].set_data(t, 0.8 * y / (2 * scale) - i)
+
+            tmin = min(tail.times[0] for tail in follower if tail.npts)
+            tmax = max(tail.times[-1] for tail in follower if tail.npts)
+            if nstep and dt:
+                tmax = tmin + nstep * dt
+            ax.set_xlim(tmin, tmax)
+            ax.set_ylim(-len(follower), 1)
+            tnow = max(tail.times[-1] for tail in follower if tail.npts)
+            ax.set_title(f"{path}: t = {tnow:.1f} s, {sum(updated.values())} "
+                         f"new rows in {perf_counter() - tstart:.3f}s")
+            if output:
+                fig.savefig(output)
+            else:
+                plt.pause(0.01)
+
+        done = nstep and len(follower) and \
+            all(tail.npts >= nstep for tail in follower)
+        if done or (max_polls and npoll >= max_polls):
+            break
+        if output:
+            sleep(interval)
+        else:
+            plt.pause(interval)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("path", nargs="?", default="OUTPUT_FILES",
+                        help="directory SPECFEM writes seismograms to")
+    parser.add_argument("-p", "--pattern", default="*.sem?",
+                        help="glob of the seismograms to follow")
+    parser.add_argument("-i", "--interval", type=float, default=30.,
+                        help="seconds between polls")
+    parser.add_argument("--nstep", type=int, default=None,
+                        help="NSTEP of the run, to preallocate and stop "
+                             "once complete")
+    parser.add_argument("--dt", type=float, default=None,
+                        help="DT of the run, for the time axis")
+    parser.add_argument("-o", "--output", default=None,
+                        help="save the record section to this file after "
+                             "every refresh instead of showing it")
+    args = parser.parse_args()
+    plot_live(args.path, args.pattern, args.interval, args.nstep, args.dt,
+              args.output)
@@ -0,0 +1,128 @@
+"""
+Readers for the plain text files that live in a SPECFEM2D DATA/ directory
+(Par_file, STATIONS), so that scripts can pull run parameters straight from a
+simulation directory instead of hard coding DT, NSTEP, receiver names etc.
+"""
+import numpy as np
+
+
+# Receivers of the Venus runs (make_stations.py), from the source at the
+# north pole (S075) down to the south pole (SN90)
+STATIONS = ["S075", "S060", "S045", "S030", "S015", "S000", "SN15", "SN30",
+            "SN45", "SN60", "SN75", "SN90"]
+
+
+def _convert_par_value(value):
+    """
+    Convert a Par_file value string into a Python type. Fortran booleans
+    become bool, Fortran double precision exponents (1.d10) are understood,
+    and anything that is not a number is returned as a string
+    """
+    if value.lower() in [".true.", "true"]:
+        return True
+    elif value.lower() in [".false.", "false"]:
+        return False
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    try:
+        return float(value.lower().replace("d", "e"))
+    except ValueError:
+        return value
+
+
+def read_par_file(fid, convert=True):
+    """
+    Read 'KEY = value' parameters from a SPECFEM Par_file (or SOURCE file).
+    Comments and lines without an '=' (e.g., the nbmodels material table)
+    are ignored. If a key is repeated, the first occurrence is kept, which
+    for SOURCE files means the parameters of the first source
+
+    :type fid: str
+    :param fid: path to the Par_file
+    :type convert: bool
+    :param convert: convert values to bool/int/float where possible,
+        otherwise return the raw strings
+    :rtype: dict
+    :return: parameter names mapped to their values
+    """
+    pars = {}
+    with open(fid, "r") as f:
+        for line in f:
+            line = line.split("#")[0].strip()
+            if "=" not in line:
+                continue
+            key, value = [_.strip() for _ in line.split("=", 1)]
+            if key in pars:
+                continue
+            pars[key] = _convert_par_value(value) if convert else value
+
+    return pars
+
+
+def read_stations_file(fid):
+    """
+    Read a SPECFEM STATIONS file into a structured array. Column names follow
+    SPECFEM2D (x, z in meters); for SPECFEM3D files the same columns hold
+    latitude and longitude (or UTM y, x). Row order matches the receiver
+    order SPECFEM uses in its binary and Seismic Unix seismograms
+
+    :type fid: str
+    :param fid: path to the STATIONS file
+    :rtype: np.ndarray
+    :return: structured array with fields station, network, x, z,
+        elevation, burial
+    """
+    dtype = [("station", "U32"), ("network", "U8"), ("x", "f8"),
+             ("z", "f8"), ("elevation", "f8"), ("burial", "f8")]
+    return np.loadtxt(fid, dtype=dtype, ndmin=1)
+
+
+def set_par_file_values(fid, output, values):
+    """
+    Copy a Par_file (or SOURCE file) with some parameters changed. Only the
+    values are replaced, alignment and trailing comments are kept, so the
+    output still diffs cleanly against the original
+
+    :type fid: str
+    :param fid: Par_file to copy
+    :type output: str
+    :param output: path to write the modified copy to, may equal `fid`
+    :type values: dict
+    :param values: parameter names mapped to their new values. bools are
+        written as Fortran logicals
+    :raises KeyError: if a parameter does not exist in `fid`
+    """
+    def _fortran(value):
+        if isinstance(value, bool):
+            return ".true." if value else ".false."
+        return str(value)
+
+    with open(fid, "r") as f:
+        lines = f.readlines()
+
+    remaining = dict(values)
+    for i, line in enumerate(lines):
+        if line.lstrip().startswith("#") or "=" not in line:
+            continue
+        key, rest = line.split("=", 1)
+        if key.strip() not in remaining:
+            continue
+        value = _fortran(remaining.pop(key.strip()))
+        # Keep everything after the old value: padding and comments
+        old = rest.split("#")[0].strip()
+        start = rest.index(old) if old else len(rest) - len(rest.lstrip())
+        tail = rest[start + len(old):]
+        if tail.strip():
+            # Keep trailing comments in their column where possible
+            pad = len(tail) - len(tail.lstrip(" "))
+            pad = max(pad + len(old) - len(value), 1)
+            tail = " " * pad + tail.lstrip(" ")
+        lines[i] = f"{key}={rest[:start]}{value}{tail}"
+
+    if remaining:
+        raise KeyError(f"parameters not found in {fid}: {list(remaining)}")
+
+    with open(output, "w") as f:
+        f.writelines(lines)
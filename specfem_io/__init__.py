@@ -0,0 +1,19 @@
+"""
+Readers for SPECFEM seismograms, importable from scripts and worker processes
+without side effects (this used to be io.py, which shadowed the standard
+library `io` module and plotted on import):
+
+    from specfem_io import read_sem, read_sem_dir, read_sem_block
+
+    streams = read_sem_dir(["V1-Tc", "V1-Th", "V4-Tc"], pattern="*.semd")
+    block = read_sem_block(sorted(glob("V1-Tc/*.semd")))  # one 2D array
+
+Record section figures are made by the command line tool
+`python -m specfem_io.record_section`. Setting SPECFEM_IO_PROFILE times the
+parse, header, filter, normalize and plot stages, see specfem_io.profiling.
+"""
+from specfem_io.sem import (read_sem, read_sem_metadata, append_sem_headers,
+                            read_sem_binary, read_sem_cached,
+                            prune_sem_cache, read_sem_dir)
+from specfem_io.block import (SemBlock, block_from_stream, read_sem_block,
+                              read_sem_block_binary)
@@ -0,0 +1,436 @@
+"""
+All seismograms of a run in one (receiver x time) array.
+
+An ObsPy Trace per receiver carries a Stats object, a header dict and its own
+data array; with thousands of STATIONS lines that overhead, and copies made
+to keep traces apart, dominate memory. A `SemBlock` instead holds one
+contiguous 2D array (float32 by default), a shared time axis given by t0 and
+delta, and per-receiver metadata columns. Filtering, normalization and record
+section plotting work on the whole block in place; ObsPy Traces, whose data
+are views of the block's rows, are only made on request:
+
+    block = read_sem_block(sorted(glob("V1-Tc/*.BXX.semd")))
+    block.lowpass(0.018, decimate=True).normalize()
+    block.plot(ax)
+    st = block.to_stream()
+"""
+import os
+import numbers
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+from obspy import UTCDateTime, Stream, Trace
+
+from sem_ascii import read_sem_ascii
+from sem_binary import parse_binary_name, memmap_sem_binary
+from specfem_data import read_stations_file
+from specfem_io.profiling import stage, collecting, merged
+from specfem_io.sem import _sem_cache_key, prune_sem_cache
+
+
+class SemBlock:
+    """
+    Seismograms of one run sharing a time axis, one receiver per row
+
+    :type data: np.ndarray
+    :param data: (nrec, npts) samples, kept as given (e.g., a memmap)
+    :type t0: float
+    :param t0: time of the first sample relative to `origintime` in seconds
+    :type delta: float
+    :param delta: sampling interval in seconds
+    :type station: list of str
+    :param station: station code of every row
+    :type network: list of str
+    :param network: network code of every row
+    :type channel: list of str
+    :param channel: channel of every row, e.g., 'BXX'
+    :type x: np.ndarray
+    :param x: receiver x coordinate of every row (STATIONS column 3), NaN
+        where unknown
+    :type z: np.ndarray
+    :param z: receiver z coordinate of every row (STATIONS column 4)
+    :type origintime: obspy.UTCDateTime
+    :param origintime: origin time the sample times are relative to
+    :type location: str
+    :param location: location code of all traces
+    :type format: str
+    :param format: seismogram type, e.g., 'semd'
+    """
+    __slots__ = ("data", "t0", "delta", "station", "network", "channel", "x",
+                 "z", "origintime", "location", "format")
+
+    def __init__(self, data, t0, delta, station, network, channel, x=None,
+                 z=None, origintime="1970-01-01T00:00:00", location="",
+                 format="semd"):
+        self.data = data
+        self.t0 = float(t0)
+        self.delta = float(delta)
+        nrec = len(data)
+        self.station = np.broadcast_to(np.asarray(station, dtype=str), nrec)
+        self.network = np.broadcast_to(np.asarray(network, dtype=str), nrec)
+        self.channel = np.broadcast_to(np.asarray(channel, dtype=str), nrec)
+        self.x = np.full(nrec, np.nan) if x is None else np.asarray(x, float)
+        self.z = np.full(nrec, np.nan) if z is None else np.asarray(z, float)
+        self.origintime = UTCDateTime(origintime)
+        self.location = location
+        self.format = format
+
+    def __len__(self):
+        return len(self.data)
+
+    def __repr__(self):
+        return (f"SemBlock({len(self)} receivers x {self.npts} samples of "
+                f"{self.data.dtype}, t0={self.t0:g} s, delta={self.delta:g} "
+                f"s)")
+
+    def __getitem__(self, key):
+        """
+        Receivers by row index, slice, boolean mask or station code(s).
+        Integers (Python or NumPy) and slices give views of the data,
+        anything else a copy
+        """
+        if isinstance(key, str):
+            key = [key]
+        if isinstance(key, numbers.Integral):
+            key = int(key)
+            key = slice(key, key + 1 or None)
+        elif not isinstance(key, slice):
+            key = np.asarray(key)
+            if key.dtype.kind == "U":
+                key = np.array([self.index(sta) for sta in key], dtype=int)
+        return SemBlock(self.data[key], self.t0, self.delta,
+                        self.station[key], self.network[key],
+                        self.channel[key], self.x[key], self.z[key],
+                        self.origintime, self.location, self.format)
+
+    @property
+    def npts(self):
+        return self.data.shape[-1]
+
+    @property
+    def times(self):
+        """
+        Sample times relative to `origintime`, shared by all receivers
+        """
+        return self.t0 + self.delta * np.arange(self.npts)
+
+    def index(self, station):
+        """
+        Row of a station code
+
+        :raises KeyError: if no receiver has that code
+        """
+        rows = np.flatnonzero(self.station == station)
+        if not len(rows):
+            raise KeyError(f"no receiver {station}")
+        return int(rows[0])
+
+    def set_coordinates(self, stations):
+        """
+        Fill `x` and `z` from a STATIONS file, matching network and station
+
+        :type stations: str
+        :param stations: STATIONS file of the run
+        :rtype: SemBlock
+        :return: self, for chaining
+        :raises KeyError: if a receiver is not in the STATIONS file
+        """
+        rows = read_stations_file(stations)
+        lookup = {(net, sta): i for i, (net, sta) in
+                  enumerate(zip(rows["network"], rows["station"]))}
+        for i, key in enumerate(zip(self.network, self.station)):
+            if key not in lookup:
+                raise KeyError(f"{'.'.join(key)} not in {stations}")
+            self.x[i] = rows["x"][lookup[key]]
+            self.z[i] = rows["z"][lookup[key]]
+        return self
+
+    def window(self, tmin=None, tmax=None):
+        """
+        Receivers cut to a time window, a view of the data
+
+        :type tmin: float
+        :param tmin: start of the window in seconds, relative to origintime
+        :type tmax: float
+        :param tmax: end of the window in seconds, inclusive
+        :rtype: SemBlock
+        """
+        start = 0 if tmin is None else \
+            max(0, int(np.ceil(round((tmin - self.t0) / self.delta, 6))))
+        end = self.npts if tmax is None else \
+            min(self.npts,
+                int(np.floor(round((tmax - self.t0) / self.delta, 6))) + 1)
+        return SemBlock(self.data[:, start:end], self.t0 + start * self.delta,
+                        self.delta, self.station, self.network, self.channel,
+                        self.x, self.z, self.origintime, self.location,
+                        self.format)
+
+    def lowpass(self, freq, corners=4, zerophase=True, decimate=False,
+                oversample=10.):
+        """
+        Lowpass (and optionally decimate) all receivers in one batched call,
+        see sem_filter.lowpass_stack. The data keep their dtype
+
+        :rtype: SemBlock
+        :return: self, for chaining
+        """
+        # scipy is only needed here, keep it out of reading processes
+        from sem_filter import lowpass_stack
+
+        with stage("filter") as rec:
+            rec["samples"] = self.data.size
+            filtered, delta = lowpass_stack(self.data, self.delta, freq,
+                                            corners, zerophase, decimate,
+                                            oversample)
+            if filtered.shape == self.data.shape:
+                self.data[:] = filtered
+            else:
+                self.data = filtered.astype(self.data.dtype)
+            self.delta = delta
+        return self
+
+    def normalize(self, per_trace=False):
+        """
+        Scale the data in place by the largest absolute amplitude of the
+        block (keeps relative amplitudes, as in a record section) or of each
+        receiver. All-zero rows are left as they are
+
+        :type per_trace: bool
+        :param per_trace: normalize every receiver on its own
+        :rtype: np.ndarray
+        :return: (nrec,) factors the rows were divided by
+        """
+        with stage("normalize") as rec:
+            rec["samples"] = self.data.size
+            if per_trace:
+                scale = np.nanmax(np.abs(self.data), axis=1)
+            else:
+                scale = np.full(len(self), np.nanmax(np.abs(self.data)))
+            scale[scale == 0] = 1.
+            self.data /= scale[:, None].astype(self.data.dtype)
+        return scale
+
+    def plot(self, ax, spacing=1., fill=0.8, labels=True, **kwargs):
+        """
+        Record section: receivers stacked top to bottom in row order, the
+        largest amplitude of the block filling `fill` of the spacing. Offsets
+        and scaling are applied by the line transforms, the data are not
+        copied, and each line is drawn at screen resolution (sem_plot.py)
+
+        :type ax: matplotlib.axes.Axes
+        :param ax: axis to plot on
+        :type spacing: float
+        :param spacing: vertical distance between receivers
+        :type fill: float
+        :param fill: fraction of `spacing` the largest amplitude fills
+        :type labels: bool
+        :param labels: write the station codes left of the axis
+        :param kwargs: passed to ax.plot, defaults to thin black lines
+        :rtype: np.ndarray
+        :return: (nrec,) y position of every receiver
+        """
+        from matplotlib.transforms import Affine2D
+        from sem_plot import plot_lod
+
+        kwargs.setdefault("color", "k")
+        kwargs.setdefault("linewidth", 0.7)
+        with stage("plot") as rec:
+            rec["samples"] = self.data.size
+            max_amp = np.nanmax(np.abs(self.data)) or 1.
+            y_positions = spacing * np.arange(len(self))[::-1]
+            times = self.times
+            for y, data, sta in zip(y_positions, self.data, self.station):
+                transform = Affine2D().scale(1, fill * spacing / max_amp) \
+                    .translate(0, y) + ax.transData
+                plot_lod(ax, times, data, transform=transform, **kwargs)
+                if labels:
+                    ax.text(-0.01, y, sta, fontsize=8,
+                            verticalalignment="center",
+                            horizontalalignment="right",
+                            transform=ax.get_yaxis_transform())
+        ax.set_xlim(times[0], times[-1])
+        ax.set_ylim(-spacing, spacing * len(self))
+        ax.set_yticks(y_positions)
+        ax.set_yticklabels([])
+        return y_positions
+
+    def to_stream(self):
+        """
+        ObsPy Stream of the block, one Trace per receiver whose data is a
+        view of the block's row (so in-place processing of either shows in
+        both)
+
+        :rtype: obspy.Stream
+        """
+        starttime = self.origintime + self.t0
+        st = Stream()
+        for data, net, sta, cha in zip(self.data, self.network, self.station,
+                                       self.channel):
+            stats = {"network": str(net), "station": str(sta),
+                     "location": self.location, "channel": str(cha),
+                     "starttime": starttime, "npts": len(data),
+                     "delta": self.delta, "mseed": {"dataquality": 'D'},
+                     "format": self.format}
+            st.append(Trace(data=data, header=stats))
+        return st
+
+
+def block_from_stream(st, dtype=None):
+    """
+    Pack a Stream of equally sampled traces into a block
+
+    :type st: obspy.Stream
+    :param st: traces with the same starttime, delta and npts
+    :type dtype: np.dtype
+    :param dtype: sample type of the block, defaults to that of the traces
+    :rtype: SemBlock
+    :raises ValueError: if the traces do not share one time axis
+    """
+    first = st[0].stats
+    for tr in st:
+        if (tr.stats.npts, tr.stats.delta, tr.stats.starttime) != \
+                (first.npts, first.delta, first.starttime):
+            raise ValueError(f"{tr.id} does not share the time axis of "
+                             f"{st[0].id}")
+    data = np.empty((len(st), first.npts), dtype=dtype or st[0].data.dtype)
+    for row, tr in zip(data, st):
+        row[:] = tr.data
+    return SemBlock(data, 0., first.delta, [tr.stats.station for tr in st],
+                    [tr.stats.network for tr in st],
+                    [tr.stats.channel for tr in st],
+                    origintime=first.starttime, location=first.location,
+                    format=first.get("format", "semd"))
+
+
+def _read_sem_ascii(fid, cache_dir=None):
+    """
+    Pool task of `read_sem_block`: the first and last sample time and the
+    samples of one file, from `cache_dir` if it holds them (keyed and
+    evicted like `read_sem_cached`), otherwise parsed (a profiled parse
+    stage) and added to the cache
+    """
+    if cache_dir is not None:
+        path = os.path.join(cache_dir,
+                            f"{_sem_cache_key(fid, reader='block')}.npz")
+        try:
+            with np.load(path) as npz:
+                first, last, data = npz["first"][()], npz["last"][()], \
+                    npz["data"]
+            os.utime(path)  # mark as recently used for LRU eviction
+            return first, last, data
+        # Missing, evicted by another process mid-read, or a partial write
+        except (OSError, ValueError, KeyError):
+            pass
+
+    with stage("parse", fid) as rec:
+        times, data = read_sem_ascii(fid)
+        rec["samples"] = len(data)
+    first, last = times[0], times[-1]
+
+    if cache_dir is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, first=first, last=last, data=data)
+        os.replace(tmp_path, path)
+    return first, last, data
+
+
+def read_sem_block(fids, dtype=np.float32, stations=None,
+                   origintime="1970-01-01T00:00:00", location="",
+                   workers=None, cache_dir=None, cache_size=2E9):
+    """
+    Read ASCII seismograms (.sem?) straight into the rows of one
+    preallocated array, parsing files in a pool of processes. With a
+    `cache_dir`, the parsed samples of unchanged files are reloaded from it
+    instead, e.g., while iterating on a figure
+
+    :type fids: list of str
+    :param fids: seismograms in row order, e.g., sorted(glob('V1-Tc/*.semd'))
+    :type dtype: np.dtype
+    :param dtype: sample type of the block, float32 halves the memory
+    :type stations: str
+    :param stations: optional STATIONS file for the receiver coordinates
+    :type origintime: obspy.UTCDateTime
+    :param origintime: origin time of the event
+    :type location: str
+    :param location: location code of the traces
+    :type workers: int
+    :param workers: number of parsing processes, 1 parses serially
+    :type cache_dir: str
+    :param cache_dir: optional cache directory, shared with
+        `read_sem_cached`
+    :type cache_size: float
+    :param cache_size: maximum cache size in bytes, enforced once all files
+        have been read
+    :rtype: SemBlock
+    :raises FileNotFoundError: if `fids` is empty
+    :raises ValueError: if the files do not share one time axis
+    """
+    if not fids:
+        raise FileNotFoundError("no seismograms to read")
+
+    reader = partial(_read_sem_ascii, cache_dir=cache_dir)
+    if workers == 1:
+        parsed = map(reader, fids)
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        parsed = merged(executor.map(collecting(reader), fids))
+
+    try:
+        data = None
+        for i, (fid, (first, last, values)) in enumerate(zip(fids, parsed)):
+            if data is None:
+                t0, npts = first, len(values)
+                delta = round((last - first) / (npts - 1), 9)
+                data = np.empty((len(fids), npts), dtype=dtype)
+            elif len(values) != npts or first != t0:
+                raise ValueError(f"{fid} has {len(values)} samples from "
+                                 f"{first} s, expected {npts} from {t0} s")
+            data[i] = values
+    finally:
+        if workers != 1:
+            executor.shutdown()
+
+    if cache_dir is not None and os.path.isdir(cache_dir):
+        prune_sem_cache(cache_dir, cache_size)
+
+    names = [os.path.basename(fid).split(".") for fid in fids]
+    block = SemBlock(data, t0, delta, station=[_[1] for _ in names],
+                     network=[_[0] for _ in names],
+                     channel=[_[2] for _ in names], origintime=origintime,
+                     location=location, format=names[0][3])
+    if stations is not None:
+        block.set_coordinates(stations)
+    return block
+
+
+def read_sem_block_binary(fid, stations, delta, t0=0.,
+                          origintime="1970-01-01T00:00:00", location=""):
+    """
+    Wrap a SPECFEM binary seismogram file (e.g., Ux_file_single_d.bin) as a
+    block without reading it: the data are a copy-on-write memmap
+
+    :type fid: str
+    :param fid: path of the .bin file
+    :type stations: str
+    :param stations: STATIONS file of the run, for the number of receivers,
+        their codes and coordinates
+    :type delta: float
+    :param delta: sampling interval in seconds
+    :type t0: float
+    :param t0: time of the first sample, see specfem_io.read_sem_binary
+    :type origintime: obspy.UTCDateTime
+    :param origintime: origin time of the event
+    :type location: str
+    :param location: location code of the traces
+    :rtype: SemBlock
+    """
+    comp, dtype, seismotype, _ = parse_binary_name(fid)
+    rows = read_stations_file(stations)
+    data = memmap_sem_binary(fid, nrec=len(rows), dtype=dtype)
+    channel = "PRE" if comp == "p" else f"BX{comp.upper()}"
+    return SemBlock(data, t0, delta, rows["station"], rows["network"],
+                    channel, rows["x"], rows["z"], origintime, location,
+                    f"sem{seismotype}")
@@ -0,0 +1,245 @@
+"""
+Opt-in timing of the seismogram processing stages: parse, header, filter,
+normalize and plot (and render, for saved figures).
+
+Off by default, when every stage costs one function call. Set the
+SPECFEM_IO_PROFILE environment variable to an output prefix (or pass
+--profile to `python -m specfem_io.record_section`) and every stage records
+its wall time, the file it worked on, bytes read, samples processed and the
+peak RSS of its process. Files parsed in pool workers are timed there and
+sent back with the results. At exit the whole run is written as
+<prefix>.prof (cProfile of the main process, read with pstats or snakeviz)
+and <prefix>.json (per-file and per-stage totals), and the totals are
+printed to stderr:
+
+    SPECFEM_IO_PROFILE=rs python -m specfem_io.record_section V1-Tc V1-Th
+    python -m specfem_io.record_section V1-Tc V1-Th --profile rs
+    python -m pstats rs.prof
+"""
+import os
+import sys
+import json
+import atexit
+import resource
+import multiprocessing
+from contextlib import contextmanager
+from functools import partial
+from time import perf_counter
+
+
+ENV_VAR = "SPECFEM_IO_PROFILE"
+
+STAGES = ["parse", "header", "filter", "normalize", "plot", "render"]
+
+_prefix = None
+_profiler = None
+_tstart = None
+_records = []
+
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process so far in MB
+    """
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return rss / 1E6 if sys.platform == "darwin" else rss / 1E3
+
+
+def enabled():
+    """
+    True if stages are being recorded
+    """
+    return _prefix is not None
+
+
+def enable(prefix="specfem_io_profile"):
+    """
+    Start recording stages, and in the main process, cProfile. Both are
+    written to `prefix` at exit, see `dump`. Sets SPECFEM_IO_PROFILE so
+    spawned worker processes record their stages too
+
+    :type prefix: str
+    :param prefix: output path without extension
+    """
+    global _prefix, _profiler, _tstart
+    if enabled():
+        return
+    _prefix = prefix
+    _tstart = perf_counter()
+    os.environ[ENV_VAR] = prefix
+    if multiprocessing.parent_process() is None:
+        import cProfile
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+        atexit.register(dump)
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=_stop_inherited_profiler)
+
+
+def _stop_inherited_profiler():
+    """
+    In a forked child, stop the cProfile of the parent, which the child
+    inherits with the rest of its memory but never dumps. Workers only
+    record their stages, see `_collect`
+    """
+    global _profiler
+    if _profiler is None:
+        return
+    _profiler.disable()
+    _profiler = None
+    sys.setprofile(None)
+
+
+@contextmanager
+def stage(name, fid=None):
+    """
+    Record the wall time of the enclosed block as one `name` stage. The
+    yielded dict takes the number of samples processed, e.g.,
+    rec["samples"] = len(data); bytes are the size of `fid`
+
+    :type name: str
+    :param name: stage name, one of STAGES
+    :type fid: str
+    :param fid: file the stage reads, if any
+    """
+    if not enabled():
+        yield {}
+        return
+
+    rec = {"stage": name, "fid": fid, "pid": os.getpid(), "samples": 0,
+           "bytes": os.path.getsize(fid) if fid else 0}
+    tstart = perf_counter()
+    try:
+        yield rec
+    finally:
+        rec["wall"] = perf_counter() - tstart
+        rec["peak_rss_mb"] = peak_rss_mb()
+        _records.append(rec)
+
+
+def _collect(func, *args):
+    """
+    Pool task: run `func` and return its result with the stages it recorded
+    """
+    start = len(_records)
+    result = func(*args)
+    records = _records[start:]
+    del _records[start:]
+    return result, records
+
+
+def collecting(func):
+    """
+    Wrap a pool task so that the stages it records in the worker come back
+    with its result; unwrap the results with `merged`. `func` itself when
+    profiling is off
+
+    :type func: function
+    :param func: picklable task, e.g., a module level function
+    :rtype: function
+    """
+    return partial(_collect, func) if enabled() else func
+
+
+def merged(results):
+    """
+    Results of `collecting` tasks, with their stages added to this process
+
+    :type results: iterable
+    :param results: e.g., executor.map(collecting(func), jobs)
+    :rtype: generator or iterable
+    """
+    if not enabled():
+        return results
+    return _merge(results)
+
+
+def _merge(results):
+    for result, records in results:
+        _records.extend(records)
+        yield result
+
+
+def summary():
+    """
+    Totals of every stage recorded so far, and every record
+
+    :rtype: dict
+    :return: 'stages' maps stage names to calls, wall (s), bytes, samples,
+        throughput and the largest peak RSS (MB) of any process running it,
+        'files' holds one entry per recorded stage of a file
+    """
+    stages = {}
+    for rec in _records:
+        total = stages.setdefault(rec["stage"], {
+            "calls": 0, "wall": 0., "bytes": 0, "samples": 0,
+            "peak_rss_mb": 0.})
+        total["calls"] += 1
+        total["wall"] += rec["wall"]
+        total["bytes"] += rec["bytes"]
+        total["samples"] += rec["samples"]
+        total["peak_rss_mb"] = max(total["peak_rss_mb"], rec["peak_rss_mb"])
+    for total in stages.values():
+        wall = total["wall"] or float("nan")
+        total["mb_per_s"] = total["bytes"] / 1E6 / wall
+        total["msamples_per_s"] = total["samples"] / 1E6 / wall
+
+    order = {name: i for i, name in enumerate(STAGES)}
+    stages = dict(sorted(stages.items(),
+                         key=lambda _: order.get(_[0], len(STAGES))))
+    return {"elapsed": perf_counter() - _tstart if _tstart else 0.,
+            "peak_rss_mb": peak_rss_mb(),
+            "processes": len({rec["pid"] for rec in _records}),
+            "stages": stages,
+            "files": [rec for rec in _records if rec["fid"]]}
+
+
+def format_summary(totals):
+    """
+    Stage totals of `summary` as a table
+    """
+    lines = [f"{'stage':>10} {'calls':>6} {'wall(s)':>9} {'MB':>9} "
+             f"{'Msamples':>9} {'MB/s':>8} {'peak RSS':>9}"]
+    for name, total in totals["stages"].items():
+        lines.append(f"{name:>10} {total['calls']:6d} {total['wall']:9.3f} "
+                     f"{total['bytes'] / 1E6:9.1f} "
+                     f"{total['samples'] / 1E6:9.2f} "
+                     f"{total['mb_per_s']:8.1f} "
+                     f"{total['peak_rss_mb']:8.0f}M")
+    lines.append(f"{totals['elapsed']:.3f}s elapsed, "
+                 f"{totals['processes']} processes, peak RSS of this process "
+                 f"{totals['peak_rss_mb']:.0f} MB")
+    return "\n".join(lines)
+
+
+def dump(prefix=None):
+    """
+    Write <prefix>.prof (cProfile of the main process, if running) and
+    <prefix>.json (`summary`), and print the stage totals to stderr.
+    Registered to run at exit by `enable`
+
+    :type prefix: str
+    :param prefix: output path without extension, defaults to the one
+        given to `enable`
+    :rtype: dict
+    :return: the summary written
+    """
+    prefix = prefix or _prefix
+    written = []
+    if _profiler is not None:
+        _profiler.disable()
+        _profiler.dump_stats(f"{prefix}.prof")
+        written.append(f"{prefix}.prof")
+
+    totals = summary()
+    with open(f"{prefix}.json", "w") as f:
+        json.dump(totals, f, indent=2)
+    written.append(f"{prefix}.json")
+    print(format_summary(totals), file=sys.stderr)
+    print(f"wrote {' and '.join(written)}", file=sys.stderr)
+    return totals
+
+
+if os.environ.get(ENV_VAR):
+    enable(os.environ[ENV_VAR])
@@ -0,0 +1,149 @@
+"""
+Plot record sections of SPECFEM ASCII seismograms from several model runs.
+
+With several stations, every run gets a column of stacked traces normalized
+to the run's largest amplitude, so arrivals can be compared across models;
+with a single station, every run gets a row with that station's trace. Each
+run is read in parallel into one array (see specfem_io.block), lowpass
+filtered as a whole and drawn at screen resolution without copies. Parsed
+seismograms are cached in .sem_cache, so re-plotting unchanged runs (e.g.,
+while adjusting the figure) skips parsing:
+
+    python -m specfem_io.record_section V1-Tc V1-Th V4-Tc --lowpass 0.018
+    python -m specfem_io.record_section V1-Tc V1-Th V4-Tc -s SN90 -o SN90.png
+
+--profile times the parse, filter and plot stages of every file and writes a
+cProfile and JSON summary, see specfem_io.profiling.
+"""
+import os
+import argparse
+from time import perf_counter
+
+import matplotlib
+
+from sem_plot import plot_lod
+from specfem_data import STATIONS
+from specfem_io import profiling
+from specfem_io.block import read_sem_block
+
+
+def plot_record_section(axs, blocks, folders, xlim=(0, 7000)):
+    """
+    One column per run, traces stacked top to bottom in row order and
+    scaled so the largest amplitude of the run fills 80% of the spacing
+
+    :type axs: list of matplotlib.axes.Axes
+    :param axs: one axis per run
+    :type blocks: list of specfem_io.block.SemBlock
+    :param blocks: one block per run
+    :type folders: list of str
+    :param folders: run names, used as titles
+    :type xlim: tuple of float
+    :param xlim: time range to show in seconds
+    """
+    for i, (ax, folder, block) in enumerate(zip(axs, folders, blocks)):
+        block.plot(ax, labels=i == 0)
+        ax.set_title(folder)
+        if i == 0:
+            ax.set_ylabel("Normalized Amplitude of Displacement")
+            ax.yaxis.set_label_coords(-0.1, 0.5)
+        ax.set_xlabel("Time (s)")
+        ax.set_xlim(*xlim)
+
+
+def plot_station(axs, blocks, folders, xlim=(0, 7000)):
+    """
+    One row per run with the (single station) traces of that run
+
+    :type axs: list of matplotlib.axes.Axes
+    :param axs: one axis per run, top to bottom
+    :type blocks: list of specfem_io.block.SemBlock
+    :param blocks: one block per run
+    :type folders: list of str
+    :param folders: run names, used as titles
+    :type xlim: tuple of float
+    :param xlim: time range to show in seconds
+    """
+    for i, (ax, folder, block) in enumerate(zip(axs, folders, blocks)):
+        with profiling.stage("plot") as rec:
+            rec["samples"] = block.data.size
+            for data in block.data:
+                plot_lod(ax, block.times, data, color="k", linewidth=0.7)
+        ax.set_title(folder)
+        ax.set_xlim(*xlim)
+        if i == len(axs) - 1:
+            ax.set_xlabel("Time (s)")
+        else:
+            ax.set_xticklabels([])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("folders", nargs="*",
+                        default=["V1-Tc", "V1-Th", "V4-Tc"],
+                        help="model run directories with .semd files")
+    parser.add_argument("-s", "--stations", nargs="+", default=STATIONS,
+                        help="station codes, top to bottom")
+    parser.add_argument("-n", "--network", default="XX",
+                        help="network code of the file names")
+    parser.add_argument("-c", "--channel", default="BXX",
+                        help="channel of the file names")
+    parser.add_argument("--lowpass", type=float, default=0.018,
+                        help="lowpass corner frequency in Hz, 0 to disable")
+    parser.add_argument("--xlim", type=float, nargs=2, default=[0, 7000],
+                        help="time range to plot in seconds")
+    parser.add_argument("--cache-dir", default=".sem_cache",
+                        help="cache for parsed traces, 'none' to disable")
+    parser.add_argument("--dtype", default="float32",
+                        choices=["float32", "float64"],
+                        help="sample precision held in memory")
+    parser.add_argument("-w", "--workers", type=int, default=None,
+                        help="number of reading processes")
+    parser.add_argument("-o", "--output", default=None,
+                        help="save the figure to this file instead of "
+                             "showing it")
+    parser.add_argument("--profile", default=None, metavar="PREFIX",
+                        help="time every stage and write PREFIX.json and "
+                             "PREFIX.prof, like setting "
+                             f"{profiling.ENV_VAR}=PREFIX")
+    args = parser.parse_args()
+    if args.profile:
+        profiling.enable(args.profile)
+
+    if args.output:
+        matplotlib.use("Agg")
+    from matplotlib import pyplot as plt
+
+    tstart = perf_counter()
+    cache_dir = None if args.cache_dir == "none" else args.cache_dir
+    blocks = []
+    for folder in args.folders:
+        fids = [os.path.join(folder, f"{args.network}.{sta}.{args.channel}"
+                                     f".semd") for sta in args.stations]
+        blocks.append(read_sem_block(fids, dtype=args.dtype,
+                                     workers=args.workers,
+                                     cache_dir=cache_dir))
+    print(f"read {sum(len(block) for block in blocks)} traces in "
+          f"{perf_counter() - tstart:.2f}s")
+
+    if args.lowpass:
+        # One filter design for all stations, decimated to what the plot
+        # can show
+        for block in blocks:
+            block.lowpass(args.lowpass, corners=4, zerophase=True,
+                          decimate=True)
+
+    nrun = len(args.folders)
+    if len(args.stations) == 1:
+        fig, axs = plt.subplots(nrun, 1, figsize=(4, 5), squeeze=False)
+        plot_station(axs[:, 0], blocks, args.folders, args.xlim)
+    else:
+        fig, axs = plt.subplots(1, nrun, figsize=(4 * nrun, 5),
+                                squeeze=False)
+        plot_record_section(axs[0], blocks, args.folders, args.xlim)
+
+    if args.output:
+        with profiling.stage("render"):
+            fig.savefig(args.output)
+    else:
+        plt.show()
@@ -0,0 +1,515 @@
+
+"""
+Read SPECFEM seismograms (ASCII, binary and Seismic Unix) into ObsPy Streams.
+
+Only NumPy and ObsPy are imported with this module. PySEP, whose package
+import pulls in matplotlib and its record section and download tools, is only
+imported when SAC headers are actually appended, so worker processes that
+just parse files start quickly. Messages still go to PySEP's logger.
+"""
+import os
+import json
+import logging
+import hashlib
+import numpy as np
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, partial
+from glob import glob
+from obspy import UTCDateTime, Stream, Trace
+
+from sem_ascii import read_sem_ascii
+from sem_binary import parse_binary_name, memmap_sem_binary, memmap_su
+from specfem_data import read_par_file, read_stations_file
+from specfem_io.profiling import stage, collecting, merged
+
+
+# Same logger object `from pysep import logger` gives, once PySEP is imported
+logger = logging.getLogger("pysep")
+
+
+def read_sem(fid, origintime="1970-01-01T00:00:00", source=None, stations=None, 
+             location="", precision=4, source_format="CMTSOLUTION"):
+    """
+    Specfem3D outputs seismograms to ASCII (.sem? or .sem.ascii) files.
+    Converts SPECFEM synthetics into ObsPy Stream objects with the correct
+    header information. If `source` and `stations` files are also provided,
+    PySEP will write appropriate SAC headers to the underlying data.
+
+    :type fid: str
+    :param fid: path of the given ascii file
+    :type origintime: obspy.UTCDateTime
+    :param origintime: UTCDatetime object for the origintime of the event. If
+        None given, defaults to dummy value of '1970-01-01T00:00:00'
+    :type source: str
+    :param source: optional SPECFEM source file (e.g., CMTSOLUTION, SOURCE)
+        defining the event which generated the synthetics. Used to grab event
+        information and append as SAC headers to the ObsPy Stream
+    :type stations: str
+    :param stations: optional STATIONS file defining the station locations for
+        the SPECFEM generated synthetics, used to generate SAC headers
+    :type location: str
+    :param location: location value for a given station/component
+    :type precision: int
+    :param precision: dt precision determined by differencing two
+        adjancent time steps in the underlying ascii text file.
+    :rtype st: obspy.Stream.stream
+    :return st: stream containing header and data info taken from ascii file
+    """
+    # This was tested up to SPECFEM3D Cartesian git version 6895e2f7
+    # Both the two-column format and the comma separated format (SPECFEM
+    # changed to this at some point in 2018, with repeat values written as
+    # 2*value_float) are handled by a single bulk parse of the file
+    with stage("parse", fid) as rec:
+        times, data = read_sem_ascii(fid)
+        rec["samples"] = len(data)
+
+    # We assume that dt is constant after 'precision' decimal points
+    delta = round(times[1] - times[0], precision)
+
+    # Get metadata information from CMTSOLUTION and STATIONS files, parsed
+    # once per file and shared by every seismogram read afterwards
+    event = None
+    if source is None:
+        origintime = UTCDateTime(origintime)
+    else:
+        event = read_sem_metadata(source, stations, source_format)[0]
+        origintime = event.preferred_origin().time
+        logger.info(f"reading origintime from event: {origintime}")
+
+    # Honor that Specfem doesn't start exactly on 0 due to USER_T0
+    origintime += times[0]
+
+    # SPECFEM2D/SPECFEM3D_Cartesian style name format, e.g., NZ.BFZ.BXE.semd OR
+    # SPECFEM3D_Globe style name format, e.g., TA.O20K.BXR.sem.ascii
+    net, sta, cha, fmt, *_ = os.path.basename(fid).split(".")
+    stats = {"network": net, "station": sta, "location": location,
+             "channel": cha, "starttime": origintime, "npts": len(data),
+             "delta": delta, "mseed": {"dataquality": 'D'}, "format": fmt
+             }
+    st = Stream([Trace(data=data, header=stats)])
+
+    if event and stations:
+        st = append_sem_headers(st, source, stations, source_format)
+
+    return st
+
+
+@lru_cache(maxsize=32)
+def _read_sem_metadata(source, stations, source_format, stamps):
+    """
+    Cached worker for `read_sem_metadata`, `stamps` (modification time and
+    size of both files) is only part of the cache key so that edited files
+    are parsed again
+    """
+    from pysep.utils.io import read_events_plus, read_stations
+
+    event = read_events_plus(source, format=source_format)[0]
+    inv = None
+    if stations is not None:
+        try:
+            inv = read_stations(stations)
+        except ValueError:
+            # `read_stations` throws a ValueError for Cartesian coordinates
+            pass
+    return event, inv
+
+
+def read_sem_metadata(source, stations=None, source_format="CMTSOLUTION"):
+    """
+    Parse a source and STATIONS file once. Repeated calls with unchanged
+    files return the same objects, so reading hundreds of seismograms of one
+    run parses CMTSOLUTION and STATIONS only once per process
+
+    :type source: str
+    :param source: SPECFEM source file (e.g., CMTSOLUTION, SOURCE)
+    :type stations: str
+    :param stations: optional STATIONS file
+    :type source_format: str
+    :param source_format: format of `source`, passed to `read_events_plus`
+    :rtype: tuple
+    :return: (obspy.core.event.Event, obspy.Inventory or None). The
+        inventory is None if no `stations` were given or their coordinates
+        are Cartesian, in which case `append_sem_headers` reads `stations`
+        itself
+    """
+    stamps = []
+    for fid in [source, stations]:
+        if fid is not None:
+            stat = os.stat(fid)
+            stamps.append((stat.st_mtime_ns, stat.st_size))
+    return _read_sem_metadata(
+        os.path.abspath(source),
+        None if stations is None else os.path.abspath(stations),
+        source_format, tuple(stamps))
+
+
+def append_sem_headers(st, source, stations, source_format="CMTSOLUTION"):
+    """
+    Append SAC headers (event and station locations, distances etc.) to all
+    traces of a Stream in one pass, using the cached metadata of
+    `read_sem_metadata` and whichever of the geographic or Cartesian header
+    paths the STATIONS file needs
+
+    :type st: obspy.Stream
+    :param st: traces of the simulation that `source` defines
+    :type source: str
+    :param source: SPECFEM source file (e.g., CMTSOLUTION, SOURCE)
+    :type stations: str
+    :param stations: STATIONS file of the simulation
+    :type source_format: str
+    :param source_format: format of `source`, passed to `read_events_plus`
+    :rtype: obspy.Stream
+    :return: the Stream with SAC headers, or unchanged if they could not be
+        appended
+    """
+    with stage("header") as rec:
+        rec["samples"] = sum(tr.stats.npts for tr in st)
+        try:
+            from pysep.utils.cap_sac import (append_sac_headers,
+                                             append_sac_headers_cartesian)
+
+            event, inv = read_sem_metadata(source, stations, source_format)
+            if inv is not None:
+                st = append_sac_headers(st, event, inv)
+            else:
+                # If Cartesian coordinate system, slightly different header
+                # approach
+                st = append_sac_headers_cartesian(st, event, stations)
+        # Broad catch here as this is an optional step that might not always
+        # work or be possible
+        except Exception as e:
+            logger.warning(f"could not append SAC header to traces because "
+                           f"{e}")
+
+    return st
+
+
+def read_sem_binary(fid, stations=None, nrec=None, delta=None, par_file=None,
+                    origintime="1970-01-01T00:00:00", t0=0., network="XX",
+                    location=""):
+    """
+    Read SPECFEM binary seismograms (save_binary_seismograms_single/_double,
+    e.g., Ux_file_single_d.bin) or Seismic Unix output (SU_FORMAT, e.g.,
+    Ux_file_single_d.su) into an ObsPy Stream with one Trace per receiver.
+
+    The file is memory mapped and each Trace's data is a view into the map,
+    so no samples are read until they are used. The map is copy-on-write,
+    in-place processing (e.g., detrending) is safe and never modifies the file
+
+    :type fid: str
+    :param fid: path of the binary or SU seismogram file, the name has to
+        follow SPECFEM's '<U?>_file_<single|double>_<d|v|a|p>.<bin|su>'
+    :type stations: str
+    :param stations: optional STATIONS file used to run the simulation. Gives
+        station and network codes (in receiver order) and the number of
+        receivers for headerless .bin files. If not given, stations are
+        named S0001, S0002, ... like SPECFEM does for generated receivers
+    :type nrec: int
+    :param nrec: number of receivers in a .bin file, only needed if no
+        `stations` file is given. Ignored for SU files
+    :type delta: float
+    :param delta: sampling interval in seconds. If not given, taken from
+        `par_file` (DT * NTSTEP_BETWEEN_OUTPUT_SAMPLE) or, for SU files, from
+        the trace header (which only stores whole microseconds)
+    :type par_file: str
+    :param par_file: optional Par_file of the simulation, used for `delta`
+    :type origintime: obspy.UTCDateTime
+    :param origintime: origin time of the event, defaults to a dummy value
+        of '1970-01-01T00:00:00'
+    :type t0: float
+    :param t0: time of the first sample relative to `origintime` in seconds.
+        Binary files do not store time, so this is the first value of the
+        time column in the equivalent ASCII output (negative for SPECFEM2D,
+        which starts at -t0 of the source time function)
+    :type network: str
+    :param network: network code to use if no `stations` file is given
+    :type location: str
+    :param location: location value for the traces
+    :rtype st: obspy.Stream.stream
+    :return st: stream with one memory mapped trace per receiver
+    """
+    comp, dtype, seismotype, ext = parse_binary_name(fid)
+
+    if stations is not None:
+        stations = read_stations_file(stations)
+        nrec = len(stations)
+
+    if delta is None and par_file is not None:
+        pars = read_par_file(par_file)
+        delta = pars["DT"] * pars.get("NTSTEP_BETWEEN_OUTPUT_SAMPLE", 1)
+
+    if ext == "su":
+        su = memmap_su(fid)
+        traces = su["data"]
+        if delta is None:
+            delta = su["header"]["dt"][0] * 1E-6
+    else:
+        if nrec is None:
+            raise ValueError("binary seismograms have no header, `stations` "
+                             "or `nrec` is required to split the receivers")
+        traces = memmap_sem_binary(fid, nrec=nrec, dtype=dtype)
+        if delta is None:
+            raise ValueError("binary seismograms have no header, `delta` or "
+                             "`par_file` is required for the sampling rate")
+
+    if stations is not None and len(stations) != len(traces):
+        raise ValueError(f"{fid} has {len(traces)} traces but STATIONS "
+                         f"lists {len(stations)} receivers")
+
+    # SPECFEM2D names pressure seismograms e.g., XX.S0001.PRE.semp
+    channel = "PRE" if comp == "p" else f"BX{comp.upper()}"
+    starttime = UTCDateTime(origintime) + t0
+
+    st = Stream()
+    for irec, data in enumerate(traces):
+        if stations is not None:
+            net = str(stations["network"][irec])
+            sta = str(stations["station"][irec])
+        else:
+            net, sta = network, f"S{irec + 1:04d}"
+        stats = {"network": net, "station": sta, "location": location,
+                 "channel": channel, "starttime": starttime,
+                 "npts": len(data), "delta": delta,
+                 "mseed": {"dataquality": 'D'}, "format": f"sem{seismotype}"
+                 }
+        st.append(Trace(data=data, header=stats))
+
+    return st
+
+
+def _read_sem_filtered(fid, lowpass=None, corners=4, zerophase=True,
+                       **kwargs):
+    """
+    Worker for `read_sem_dir`: read a single file and optionally lowpass it.
+    Module level so that it can be pickled to pool processes
+    """
+    st = read_sem(fid, **kwargs)
+    if lowpass:
+        with stage("filter") as rec:
+            st.filter("lowpass", freq=lowpass, corners=corners,
+                      zerophase=zerophase)
+            rec["samples"] = st[0].stats.npts
+    return st[0]
+
+
+def _sem_cache_key(fid, **kwargs):
+    """
+    Cache key for a seismogram: the file's absolute path, modification time
+    and size (so edited or rewritten files are never served stale), plus
+    every read and filter parameter that changes the resulting Trace. The
+    `source` and `stations` files the headers come from are stamped the same
+    way, as in `read_sem_metadata`
+    """
+    stamps = []
+    for path in [fid, kwargs.get("source"), kwargs.get("stations")]:
+        if path is not None:
+            stat = os.stat(path)
+            stamps.append((os.path.abspath(path), stat.st_mtime_ns,
+                           stat.st_size))
+    key = json.dumps([stamps, sorted(kwargs.items())], default=str)
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def prune_sem_cache(cache_dir, cache_size=2E9):
+    """
+    Bound the total size of a seismogram cache by deleting least recently
+    used entries first. Reads touch the modification time of the entry they
+    hit, so mtime order is recency order
+
+    :type cache_dir: str
+    :param cache_dir: cache directory used with `read_sem_cached`
+    :type cache_size: float
+    :param cache_size: maximum total size of cached entries in bytes
+    """
+    entries = []
+    with os.scandir(cache_dir) as it:
+        for entry in it:
+            if entry.name.endswith(".npz"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+
+    total = sum(_[1] for _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= cache_size:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
+def read_sem_cached(fid, cache_dir=".sem_cache", cache_size=2E9,
+                    lowpass=None, corners=4, zerophase=True, **kwargs):
+    """
+    Cached `read_sem` plus optional lowpass filter. The filtered Trace is
+    stored as a single .npz (data array and JSON header) in `cache_dir`, so
+    re-reading an unchanged file with the same parameters skips parsing and
+    filtering entirely. Entries are invalidated automatically when the mtime
+    or size of the seismogram, or of the `source` and `stations` files passed
+    through `kwargs`, changes.
+
+    :type fid: str
+    :param fid: path of the given ascii file
+    :type cache_dir: str
+    :param cache_dir: directory to store cached traces in, created if needed
+    :type cache_size: float
+    :param cache_size: maximum total cache size in bytes, least recently used
+        entries are evicted after a new entry is written. None to skip
+        eviction, e.g., in worker processes that share one cache
+    :type lowpass: float
+    :param lowpass: optional lowpass corner frequency in Hz
+    :type corners: int
+    :param corners: filter corners for `lowpass`
+    :type zerophase: bool
+    :param zerophase: apply the `lowpass` filter forwards and backwards
+    :param kwargs: passed to `read_sem`
+    :rtype: obspy.Trace
+    :return: the (filtered) trace read from `fid`
+    """
+    key = _sem_cache_key(fid, lowpass=lowpass, corners=corners,
+                         zerophase=zerophase, **kwargs)
+    path = os.path.join(cache_dir, f"{key}.npz")
+
+    try:
+        with np.load(path) as npz:
+            tr = Trace(data=npz["data"], header=json.loads(str(npz["header"])))
+        os.utime(path)  # mark as recently used for LRU eviction
+        return tr
+    # Missing, evicted by another process mid-read, or a partial write
+    except (OSError, ValueError, KeyError):
+        pass
+
+    tr = _read_sem_filtered(fid, lowpass=lowpass, corners=corners,
+                            zerophase=zerophase, **kwargs)
+
+    # Derived or read-only values are recreated from data and delta on load
+    header = {k: v for k, v in tr.stats.items()
+              if k not in ["endtime", "npts", "sampling_rate"]}
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(f, data=tr.data,
+                 header=json.dumps(header, default=_json_default))
+    os.replace(tmp_path, path)  # atomic, readers never see a partial file
+
+    if cache_size is not None:
+        prune_sem_cache(cache_dir, cache_size)
+
+    return tr
+
+
+def _json_default(obj):
+    """
+    Serialize the ObsPy objects found in Trace.stats for the cache header
+    """
+    if isinstance(obj, Mapping):  # AttribDict, e.g., stats.sac, stats.mseed
+        return dict(obj)
+    if isinstance(obj, np.generic):
+        return obj.item()
+    return str(obj)  # UTCDateTime, restored by Stats on load
+
+
+def read_sem_dir(folders, pattern="*.semd", workers=None, lowpass=None,
+                 corners=4, zerophase=True, cache_dir=None, cache_size=2E9,
+                 **kwargs):
+    """
+    Read (and optionally lowpass filter) every SPECFEM ASCII seismogram
+    matching `pattern` in each of `folders`, spreading the parsing and
+    filtering of all files over a pool of worker processes.
+
+    Output order is deterministic and independent of which worker finishes
+    first: folders in the order given, and files in the order of `pattern`,
+    with the matches of each glob sorted by name
+
+    :type folders: str or list of str
+    :param folders: model run directories, e.g., ['V1-Tc', 'V1-Th', 'V4-Tc']
+    :type pattern: str or list of str
+    :param pattern: glob pattern(s) or file names relative to each folder.
+        Pass a list of names (e.g., 'XX.S075.BXX.semd', ...) to control the
+        trace order of a record section
+    :type workers: int
+    :param workers: number of worker processes, defaults to the number of
+        CPUs. 1 reads serially in this process without starting a pool
+    :type lowpass: float
+    :param lowpass: optional lowpass corner frequency in Hz applied to each
+        trace in the worker that read it
+    :type corners: int
+    :param corners: filter corners for `lowpass`
+    :type zerophase: bool
+    :param zerophase: apply the `lowpass` filter forwards and backwards
+    :type cache_dir: str
+    :param cache_dir: optional cache directory, see `read_sem_cached`. Files
+        that were already read with the same parameters are loaded from the
+        cache instead of being parsed and filtered again
+    :type cache_size: float
+    :param cache_size: maximum cache size in bytes, enforced once all files
+        have been read
+    :param kwargs: passed to `read_sem`, e.g., origintime, location. A
+        `source` and `stations` file (and `source_format`) are parsed once
+        for all files, see `append_sem_headers`
+    :rtype: list of obspy.Stream
+    :return: one Stream per folder, in the order of `folders`
+    :raises FileNotFoundError: if a folder has no files matching `pattern`
+    """
+    if isinstance(folders, str):
+        folders = [folders]
+    if isinstance(pattern, str):
+        pattern = [pattern]
+
+    fids = []
+    for folder in folders:
+        folder_fids = []
+        for pat in pattern:
+            folder_fids += sorted(glob(os.path.join(folder, pat)))
+        if not folder_fids:
+            raise FileNotFoundError(f"no files matching {pattern} in {folder}")
+        fids.append(folder_fids)
+
+    jobs = [fid for folder_fids in fids for fid in folder_fids]
+
+    # Parse the source and STATIONS once here rather than once per file in
+    # every worker: workers only get the origin time, headers are appended to
+    # each folder's Stream in one pass at the end
+    source = kwargs.pop("source", None)
+    stations = kwargs.pop("stations", None)
+    source_format = kwargs.pop("source_format", "CMTSOLUTION")
+    if source is not None:
+        event = read_sem_metadata(source, stations, source_format)[0]
+        kwargs["origintime"] = event.preferred_origin().time
+        logger.info(f"reading origintime from event: {kwargs['origintime']}")
+
+    kwargs.update(lowpass=lowpass, corners=corners, zerophase=zerophase)
+    logger.info(f"reading {len(jobs)} files from {len(folders)} folders")
+
+    # Workers share the cache, evict only once everyone has finished writing
+    if cache_dir is not None:
+        reader = partial(read_sem_cached, cache_dir=cache_dir,
+                         cache_size=None, **kwargs)
+    else:
+        reader = partial(_read_sem_filtered, **kwargs)
+
+    if workers == 1:
+        traces = [reader(fid) for fid in jobs]
+    else:
+        # Executor.map returns results in submission order
+        # Workers send their stage timings back with the traces when
+        # profiling, see specfem_io.profiling
+        chunksize = max(1, len(jobs) // (4 * (workers or os.cpu_count())))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            traces = list(merged(executor.map(collecting(reader), jobs,
+                                              chunksize=chunksize)))
+
+    if cache_dir is not None and os.path.isdir(cache_dir):
+        prune_sem_cache(cache_dir, cache_size)
+
+    streams, i = [], 0
+    for folder_fids in fids:
+        st = Stream(traces[i:i + len(folder_fids)])
+        if source is not None and stations is not None:
+            st = append_sem_headers(st, source, stations, source_format)
+        streams.append(st)
+        i += len(folder_fids)
+
+    return streams
@@ -0,0 +1,268 @@
+"""
+Readers for the external mesh files written by
+create_mesh_AK135F_2D_with_central_cube_no_PML.F90 into MESH/, i.e.,
+Nodes_, Mesh_, Material_, Surf_free_, Surf_abs_ and Symmetry_axis_elements_
+AK135F_NO_MUD, as NumPy arrays.
+
+The mesher writes these either formatted (list-directed text) or, with
+USE_BINARY_FOR_EXTERNAL_MESH_DATABASE, Fortran unformatted, where every
+write() is one record framed by 4 byte length markers. Both are detected
+automatically. Unformatted files are memory-mapped with a record dtype that
+steps over the markers, so nothing is read until it is used; formatted files
+are parsed with one np.loadtxt call each, whose C parser (NumPy >= 1.23) beat
+np.fromfile(sep=' ') and str.split() on these files.
+
+Element and node numbers in the files are 1-based Fortran indices; they are
+returned 0-based so they can index the node array directly:
+
+    nodes, elements, materials = read_mesh("MESH")
+    coords = nodes[elements]  # (nspec, 9, 2)
+"""
+import os
+import numpy as np
+
+
+# Suffix of every file the mesher writes
+MESH_NAME = "AK135F_NO_MUD"
+NGNOD = 9
+
+# Fortran unformatted record length marker (gfortran default)
+_MARKER = np.dtype("<i4")
+
+# Boundary element lists: element, number of nodes on the edge, the two edge
+# nodes and, for the symmetry axis, which edge (IBOTTOM, IRIGHT, ITOP, ILEFT)
+BOUNDARY_DTYPE = np.dtype([("ispec", "i8"), ("nnodes", "i8"), ("n1", "i8"),
+                           ("n2", "i8"), ("edge", "i8")])
+
+# Unformatted boundary records by record length. The symmetry axis writes its
+# number of nodes as the 3 character string ' 2 '
+_BOUNDARY_RECORDS = {
+    16: np.dtype([("ispec", "<i4"), ("nnodes", "<i4"), ("n1", "<i4"),
+                  ("n2", "<i4")]),
+    19: np.dtype([("ispec", "<i4"), ("nnodes", "S3"), ("n1", "<i4"),
+                  ("n2", "<i4"), ("edge", "<i4")]),
+}
+
+
+def is_unformatted(fid):
+    """
+    Fortran unformatted files start with the 4 byte length of their first
+    record, formatted mesh files with blanks and digits
+
+    :type fid: str
+    :param fid: path to a mesh file
+    :rtype: bool
+    """
+    with open(fid, "rb") as f:
+        head = f.read(_MARKER.itemsize)
+    # Text would read as a huge marker, e.g., four blanks are 0x20202020
+    return len(head) == _MARKER.itemsize and \
+        0 < np.frombuffer(head, dtype=_MARKER)[0] < 2 ** 16
+
+
+def _read_text(fid, dtype, header=True):
+    """
+    Parse a formatted mesh file, an optional count line followed by rows of
+    numbers, in one np.loadtxt call
+
+    :rtype: tuple
+    :return: (count from the header line or None, (nrows, ncols) array)
+    """
+    with open(fid, "r") as f:
+        count = int(f.readline()) if header else None
+        if count == 0:
+            return count, np.empty((0, 0), dtype=dtype)
+        return count, np.loadtxt(f, dtype=dtype, ndmin=2)
+
+
+def _memmap_records(fid, dtype, offset=0):
+    """
+    Memory-map a run of equally sized Fortran unformatted records
+
+    :type fid: str
+    :param fid: path to the unformatted file
+    :type dtype: np.dtype
+    :param dtype: contents of one record, without its markers
+    :type offset: int
+    :param offset: byte offset of the first record, e.g., past a header
+    :rtype: np.ndarray
+    :return: (nrecords,) copy-on-write view of the record contents
+    :raises ValueError: if the file does not split into such records
+    """
+    dtype = np.dtype(dtype)
+    record = np.dtype([("head", _MARKER), ("data", dtype), ("tail", _MARKER)])
+    nbytes = os.path.getsize(fid) - offset
+    if nbytes % record.itemsize:
+        raise ValueError(f"{fid}: {nbytes} bytes do not split into "
+                         f"{dtype.itemsize} byte records")
+    if not nbytes:
+        return np.empty(0, dtype=dtype)
+
+    records = np.memmap(fid, dtype=record, mode="c", offset=offset)
+    # Only look at the markers of the first and last record, checking all of
+    # them would read the whole file
+    for i in [0, -1]:
+        if not records["head"][i] == records["tail"][i] == dtype.itemsize:
+            raise ValueError(f"{fid}: unexpected record length "
+                             f"{records['head'][i]}, expected "
+                             f"{dtype.itemsize}")
+
+    return records["data"]
+
+
+def _read_unformatted_header(fid):
+    """
+    Read the single integer record that starts Nodes_, Mesh_ and boundary
+    files, e.g., npoin
+
+    :rtype: tuple of int
+    :return: (value, byte offset of the next record, length of that record)
+    """
+    header = np.fromfile(fid, dtype=_MARKER, count=4)
+    if len(header) < 3 or not header[0] == header[2] == _MARKER.itemsize:
+        raise ValueError(f"{fid}: expected a single integer header record")
+    reclen = int(header[3]) if len(header) == 4 else 0
+    return int(header[1]), 3 * _MARKER.itemsize, reclen
+
+
+def read_nodes(fid):
+    """
+    Read node coordinates from a Nodes_ file (npoin, then one 'x z' record
+    per node)
+
+    :type fid: str
+    :param fid: path to the Nodes_ file
+    :rtype: np.ndarray
+    :return: (npoin, 2) coordinates in meters, a memory-mapped view for
+        unformatted files
+    :raises ValueError: if the number of nodes does not match the header
+    """
+    if is_unformatted(fid):
+        npoin, offset, _ = _read_unformatted_header(fid)
+        nodes = _memmap_records(fid, ("<f8", (2,)), offset)
+    else:
+        npoin, nodes = _read_text(fid, np.float64)
+    if nodes.shape != (npoin, 2):
+        raise ValueError(f"{fid}: expected {npoin} nodes, found {len(nodes)}")
+    return nodes
+
+
+def read_elements(fid):
+    """
+    Read element connectivity from a Mesh_ file (nspec, then the 9 control
+    node numbers of each element)
+
+    :type fid: str
+    :param fid: path to the Mesh_ file
+    :rtype: np.ndarray
+    :return: (nspec, 9) 0-based node indices
+    :raises ValueError: if the number of elements does not match the header
+    """
+    if is_unformatted(fid):
+        nspec, offset, _ = _read_unformatted_header(fid)
+        elements = _memmap_records(fid, ("<i4", (NGNOD,)), offset)
+    else:
+        nspec, elements = _read_text(fid, np.int64)
+    if elements.shape != (nspec, NGNOD):
+        raise ValueError(f"{fid}: expected {nspec} elements of {NGNOD} "
+                         f"nodes, found {elements.shape}")
+    return np.asarray(elements) - 1
+
+
+def read_materials(fid):
+    """
+    Read the region flag (idoubling) of each element from a Material_ file,
+    which has no header
+
+    :type fid: str
+    :param fid: path to the Material_ file
+    :rtype: np.ndarray
+    :return: (nspec,) region flags, 1-4, see external_model.REGIONS
+    """
+    if is_unformatted(fid):
+        return _memmap_records(fid, "<i4")
+    return _read_text(fid, np.int64, header=False)[1][:, 0]
+
+
+def read_boundary(fid):
+    """
+    Read a boundary element list: Surf_free_, Surf_abs_ or
+    Symmetry_axis_elements_ (count, then one record per element edge)
+
+    :type fid: str
+    :param fid: path to the boundary file
+    :rtype: np.ndarray
+    :return: (count,) BOUNDARY_DTYPE array with 0-based ispec, n1 and n2;
+        edge is 0 for files that do not list it
+    :raises ValueError: if the number of records does not match the header
+    """
+    if is_unformatted(fid):
+        count, offset, reclen = _read_unformatted_header(fid)
+        columns = []
+        if count:
+            if reclen not in _BOUNDARY_RECORDS:
+                raise ValueError(f"{fid}: unknown {reclen} byte boundary "
+                                 f"record")
+            records = _memmap_records(fid, _BOUNDARY_RECORDS[reclen], offset)
+            for name in records.dtype.names:
+                column = records[name]
+                if column.dtype.kind == "S":
+                    column = column.astype(str)
+                columns.append(column.astype(np.int64))
+    else:
+        count, values = _read_text(fid, np.int64)
+        columns = list(values.T)
+
+    if columns and len(columns[0]) != count:
+        raise ValueError(f"{fid}: expected {count} boundary elements, found "
+                         f"{len(columns[0])}")
+
+    boundary = np.zeros(count, dtype=BOUNDARY_DTYPE)
+    for name, column in zip(BOUNDARY_DTYPE.names, columns):
+        boundary[name] = column
+    for name in ["ispec", "n1", "n2"]:
+        boundary[name] -= 1
+
+    return boundary
+
+
+def read_mesh(path="MESH", name=MESH_NAME):
+    """
+    Read the nodes, elements and materials of a mesh
+
+    :type path: str
+    :param path: directory with the mesher output
+    :type name: str
+    :param name: suffix of the file names, e.g., Nodes_<name>
+    :rtype: tuple of np.ndarray
+    :return: (nodes, elements, materials), see `read_nodes`,
+        `read_elements` and `read_materials`
+    :raises ValueError: if the number of materials does not match the
+        number of elements
+    """
+    nodes = read_nodes(os.path.join(path, f"Nodes_{name}"))
+    elements = read_elements(os.path.join(path, f"Mesh_{name}"))
+    materials = read_materials(os.path.join(path, f"Material_{name}"))
+    if len(materials) != len(elements):
+        raise ValueError(f"{len(materials)} materials for {len(elements)} "
+                         f"elements in {path}")
+    return nodes, elements, materials
+
+
+def read_boundaries(path="MESH", name=MESH_NAME):
+    """
+    Read whichever boundary element lists the mesher wrote
+
+    :type path: str
+    :param path: directory with the mesher output
+    :type name: str
+    :param name: suffix of the file names
+    :rtype: dict
+    :return: 'free', 'absorbing' and 'symmetry_axis' mapped to the output
+        of `read_boundary`, for the files that exist
+    """
+    files = {"free": f"Surf_free_{name}", "absorbing": f"Surf_abs_{name}",
+             "symmetry_axis": f"Symmetry_axis_elements_{name}"}
+    return {key: read_boundary(os.path.join(path, fname))
+            for key, fname in files.items()
+            if os.path.exists(os.path.join(path, fname))}
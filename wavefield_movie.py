@@ -0,0 +1,491 @@
+"""
+Render wavefield movies straight from SPECFEM2D's raw wavefield dumps
+(output_wavefield_dumps = .true.), instead of having the solver draw JPEGs
+with a colour scale and resolution fixed at run time.
+
+SPECFEM2D writes, per MPI rank, the coordinates of its unique GLL points once
+(OUTPUT_FILES/wavefield_grid_for_dumps_<rank>.{bin,txt}) and then one frame
+per NTSTEP_BETWEEN_OUTPUT_IMAGES, in the same point order
+(wavefield<it>_<SIMULATION_TYPE>_<rank>.{bin,txt}, e.g.,
+wavefield0001000_01_000.bin). The binary variants are Fortran direct access
+files, i.e., plain float64 (x, z) pairs for the grid and float32 values for
+the frames.
+
+The mapping from GLL points to movie pixels (the Delaunay triangle and
+barycentric weights of every pixel, or its nearest point) is computed once,
+optionally saved to disk, and reused for every frame, so a frame costs one
+gather and a colour lookup. Frames are rendered in a process pool and
+streamed in order into the video writer of dis_field_video.py:
+
+    python wavefield_movie.py OUTPUT_FILES -o movie_V5_Th.avi --width 1080 \
+        --clip 1E-6 --extent -3000 3000 3000 6100 --index raster_index.npz
+"""
+import os
+import re
+import argparse
+from glob import glob
+from collections import deque
+from time import perf_counter
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from dis_field_video import write_video
+
+
+# Components of a 2 component (P-SV) dump, plus the vector norm
+COMPONENTS = {"x": 0, "z": 1, "norm": None}
+
+# wavefield<it>_<SIMULATION_TYPE>_<rank>.<ext>, written by SPECFEM2D as
+# i7.7, i2.2 and i3.3; older dumps have no SIMULATION_TYPE field
+_DUMP_NAME = re.compile(r"^wavefield(\d+)_(?:\d+_)?(\d+)(\.bin|\.txt)$")
+_GRID_NAME = re.compile(r"^wavefield_grid_for_dumps_(\d+)(\.bin|\.txt)$")
+
+# Set in each worker process by `_init_worker`
+_WORKER = {}
+
+
+def list_dumps(path, stride=1):
+    """
+    Find the wavefield dumps of all ranks, grouped by time step
+
+    :type path: str
+    :param path: OUTPUT_FILES directory of a run
+    :type stride: int
+    :param stride: only use every `stride`-th dump
+    :rtype: tuple
+    :return: (grid files, frames); grid files has one path per rank, frames
+        is a list of (it, [path per rank]) in time step order
+    :raises FileNotFoundError: if there is no grid file, no dump, or a step
+        is missing a rank
+    :raises ValueError: if a rank has two dumps of one step, e.g., of two
+        simulation types
+    """
+    grids = [fid for fid in sorted(glob(os.path.join(
+        path, "wavefield_grid_for_dumps_*"))) if _GRID_NAME.match(
+        os.path.basename(fid))]
+    if not grids:
+        raise FileNotFoundError(f"no wavefield_grid_for_dumps_* in {path}, "
+                                f"set output_wavefield_dumps = .true.")
+    # Binary dumps if the run wrote both
+    ext = os.path.splitext(grids[0])[1]
+    grids = [fid for fid in grids if fid.endswith(ext)]
+    ranks = [int(_GRID_NAME.match(os.path.basename(fid)).group(1))
+             for fid in grids]
+
+    # Group the globbed paths by time step and rank, whatever the widths of
+    # the fields; the SIMULATION_TYPE field is optional
+    steps = {}
+    for fid in glob(os.path.join(path, f"wavefield[0-9]*{ext}")):
+        match = _DUMP_NAME.match(os.path.basename(fid))
+        if not match or match.group(3) != ext:
+            continue
+        it, rank = int(match.group(1)), int(match.group(2))
+        if rank in steps.setdefault(it, {}):
+            raise ValueError(f"{fid} and {steps[it][rank]} are both step "
+                             f"{it} of rank {rank}")
+        steps[it][rank] = fid
+    if not steps:
+        raise FileNotFoundError(f"no wavefield dumps in {path}")
+
+    frames = []
+    for it in sorted(steps)[::stride]:
+        missing = set(ranks) - set(steps[it])
+        if missing:
+            raise FileNotFoundError(f"no step {it} dump of rank(s) "
+                                    f"{sorted(missing)} in {path}")
+        frames.append((it, [steps[it][rank] for rank in ranks]))
+    return grids, frames
+
+
+def read_dump_grid(fids):
+    """
+    Read the GLL point coordinates of one or more ranks
+
+    :type fids: list of str
+    :param fids: wavefield_grid_for_dumps_<rank> files, .bin or .txt
+    :rtype: np.ndarray
+    :return: (npoints, 2) x, z coordinates of all ranks, concatenated
+    """
+    grids = []
+    for fid in fids:
+        if fid.endswith(".bin"):
+            grids.append(np.fromfile(fid, dtype="<f8").reshape(-1, 2))
+        else:
+            grids.append(np.loadtxt(fid, ndmin=2))
+    return np.concatenate(grids)
+
+
+def read_dump(fids, ncomp=2):
+    """
+    Read one wavefield frame of one or more ranks
+
+    :type fids: list of str
+    :param fids: wavefield<it>_<rank> files, .bin or .txt
+    :type ncomp: int
+    :param ncomp: values per point, 2 for P-SV vectors, 1 for pressure or
+        SH dumps
+    :rtype: np.ndarray
+    :return: (npoints, ncomp) values of all ranks, concatenated
+    """
+    frames = []
+    for fid in fids:
+        if fid.endswith(".bin"):
+            frames.append(np.fromfile(fid, dtype="<f4").reshape(-1, ncomp))
+        else:
+            frames.append(np.loadtxt(fid, ndmin=2))
+    return np.concatenate(frames)
+
+
+def build_raster_index(points, width, extent=None, method="linear"):
+    """
+    Precompute how every pixel of a movie frame is interpolated from the
+    GLL points, so that rendering a frame is a single gather
+
+    :type points: np.ndarray
+    :param points: (npoints, 2) x, z coordinates, see `read_dump_grid`
+    :type width: int
+    :param width: frame width in pixels, the height follows from `extent`
+    :type extent: list of float
+    :param extent: [xmin, xmax, zmin, zmax] region to show, defaults to the
+        bounds of the grid
+    :type method: str
+    :param method: 'linear' interpolates within a Delaunay triangulation of
+        the points, 'nearest' takes the closest point (faster to build)
+    :rtype: dict
+    :return: 'pixels' flat indices of the pixels covered by the mesh,
+        'vertices' and 'weights' (k, len(pixels)) to gather and sum, 'shape'
+        (height, width) and 'extent'
+    """
+    from scipy.spatial import Delaunay, cKDTree
+
+    if extent is None:
+        extent = [points[:, 0].min(), points[:, 0].max(),
+                  points[:, 1].min(), points[:, 1].max()]
+    xmin, xmax, zmin, zmax = extent
+    # Even dimensions keep common codecs happy
+    width = int(width) // 2 * 2
+    height = max(int(round(width * (zmax - zmin) / (xmax - xmin))) // 2 * 2,
+                 2)
+
+    # Pixel centers, top row first (z up)
+    x = xmin + (np.arange(width) + 0.5) * (xmax - xmin) / width
+    z = zmax - (np.arange(height) + 0.5) * (zmax - zmin) / height
+    pixels = np.column_stack([np.tile(x, height), np.repeat(z, width)])
+
+    if method == "nearest":
+        # Pixels farther from their nearest point than that point's local
+        # spacing are not covered by the mesh. Taking the farthest of the 4
+        # nearest neighbors keeps points shared between ranks (duplicates)
+        # and the closely spaced GLL points at element edges from masking
+        # their surroundings
+        tree = cKDTree(points)
+        spacing = tree.query(points, k=5)[0][:, -1]
+        distance, nearest = tree.query(pixels)
+        inside = distance < spacing[nearest]
+        vertices = nearest[:, None]
+        weights = np.ones((len(pixels), 1), dtype=np.float32)
+    else:
+        tri = Delaunay(points)
+        simplex = tri.find_simplex(pixels)
+        inside = simplex >= 0
+        simplex = np.where(inside, simplex, 0)
+        transform = tri.transform[simplex]
+        bary = np.einsum("pij,pj->pi", transform[:, :2],
+                         pixels - transform[:, 2])
+        vertices = tri.simplices[simplex]
+        weights = np.column_stack([bary, 1 - bary.sum(axis=1)])
+        weights = weights.astype(np.float32)
+
+    # Only covered pixels are kept, one contiguous row per triangle vertex
+    pixels = np.flatnonzero(inside)
+    return {"pixels": pixels,
+            "vertices": np.ascontiguousarray(vertices[pixels].T,
+                                             dtype=np.int32),
+            "weights": np.ascontiguousarray(weights[pixels].T),
+            "shape": (height, width), "extent": list(extent)}
+
+
+def save_raster_index(fid, index):
+    """
+    Save a raster index to an .npz so re-renders can skip building it
+    """
+    with open(fid, "wb") as f:
+        np.savez(f, **index)
+
+
+def load_raster_index(fid):
+    """
+    Load a raster index saved by `save_raster_index`
+    """
+    with np.load(fid) as data:
+        index = {key: data[key] for key in data.files}
+    index["shape"] = tuple(int(_) for _ in index["shape"])
+    index["extent"] = [float(_) for _ in index["extent"]]
+    return index
+
+
+def colormap_lut(cmap="seismic", background=(255, 255, 255)):
+    """
+    256 colour lookup table packed as one BGRA uint32 per entry (OpenCV's
+    channel order), with the background colour for pixels outside the mesh
+    appended as entry 256. Gathering one 4 byte word per pixel is several
+    times faster than gathering 3 separate bytes
+
+    :rtype: np.ndarray
+    :return: (257,) uint32
+    """
+    from matplotlib import colormaps
+
+    rgb = colormaps[cmap](np.linspace(0, 1, 256))[:, :3]
+    bgr = np.vstack([np.round(rgb[:, ::-1] * 255),
+                     np.array(background[::-1])]).astype(np.uint8)
+    lut = np.zeros(len(bgr), dtype=np.uint32)
+    lut.view(np.uint8).reshape(-1, 4)[:, :3] = bgr
+    return lut
+
+
+def _interpolate(values, index):
+    """
+    Values at the covered pixels, see `build_raster_index`
+    """
+    values = np.asarray(values, dtype=np.float32)
+    vertices, weights = index["vertices"], index["weights"]
+    covered = np.take(values, vertices[0])
+    covered *= weights[0]
+    for k in range(1, len(vertices)):
+        covered += np.take(values, vertices[k]) * weights[k]
+    return covered
+
+
+def rasterize(values, index):
+    """
+    Interpolate one frame of point values onto the pixel grid, e.g., to
+    plot or analyze it
+
+    :type values: np.ndarray
+    :param values: (npoints,) values in the order of the dump grid
+    :type index: dict
+    :param index: output of `build_raster_index`
+    :rtype: np.ndarray
+    :return: (height, width) float32 image, NaN outside the mesh
+    """
+    image = np.full(index["shape"], np.nan, dtype=np.float32)
+    image.ravel()[index["pixels"]] = _interpolate(values, index)
+    return image
+
+
+def render_frame(values, index, clip, lut):
+    """
+    Interpolate one frame onto the pixel grid and map it to colours with a
+    symmetric [-clip, clip] scale
+
+    :type values: np.ndarray
+    :param values: (npoints,) values in the order of the dump grid
+    :type index: dict
+    :param index: output of `build_raster_index`
+    :type clip: float
+    :param clip: amplitude at the ends of the colour scale
+    :type lut: np.ndarray
+    :param lut: output of `colormap_lut`
+    :rtype: np.ndarray
+    :return: (height, width, 3) BGR uint8 frame
+    """
+    import cv2
+
+    scaled = _interpolate(values, index)
+    scaled *= np.float32(127.5 / clip)
+    scaled += np.float32(127.5)
+    level = np.clip(scaled, 0, 255, out=scaled).astype(np.uint8)
+
+    height, width = index["shape"]
+    frame = np.full(height * width, lut[256], dtype=np.uint32)
+    frame[index["pixels"]] = lut[level]
+    return cv2.cvtColor(frame.view(np.uint8).reshape(height, width, 4),
+                        cv2.COLOR_BGRA2BGR)
+
+
+def component(frame, comp):
+    """
+    Pick a component of a (npoints, ncomp) dump, or the vector norm
+    """
+    if frame.shape[1] == 1:
+        return frame[:, 0]
+    if COMPONENTS[comp] is None:
+        return np.linalg.norm(frame, axis=1)
+    return frame[:, COMPONENTS[comp]]
+
+
+def _init_worker(index, lut, clip, comp, ncomp):
+    """
+    Keep the (large) raster index in each worker instead of pickling it with
+    every frame
+    """
+    _WORKER.update(index=index, lut=lut, clip=clip, comp=comp, ncomp=ncomp)
+
+
+def _render(fids):
+    """
+    Read, rasterize and colour one frame in a worker process
+    """
+    values = component(read_dump(fids, _WORKER["ncomp"]), _WORKER["comp"])
+    return render_frame(values, _WORKER["index"], _WORKER["clip"],
+                        _WORKER["lut"])
+
+
+def iter_rendered(frames, index, lut, clip, comp="z", ncomp=2, workers=None,
+                  prefetch=16):
+    """
+    Render frames in a process pool and yield them in order, with at most
+    `prefetch` frames in flight
+
+    :type frames: list
+    :param frames: output of `list_dumps`
+    :param index, lut, clip: see `render_frame`
+    :type comp: str
+    :param comp: component to show, see COMPONENTS
+    :type ncomp: int
+    :param ncomp: values per point in the dumps
+    :type workers: int
+    :param workers: number of processes, 1 renders in this process
+    :type prefetch: int
+    :param prefetch: frames rendered ahead of the writer
+    :rtype: generator of np.ndarray
+    """
+    initargs = (index, lut, clip, comp, ncomp)
+    if workers == 1:
+        _init_worker(*initargs)
+        for _, fids in frames:
+            yield _render(fids)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=initargs) as executor:
+        queue = deque()
+        for _, fids in frames:
+            if len(queue) >= prefetch:
+                yield queue.popleft().result()
+            queue.append(executor.submit(_render, fids))
+        while queue:
+            yield queue.popleft().result()
+
+
+def estimate_clip(frames, comp="z", ncomp=2, nsample=20):
+    """
+    Largest absolute value over an evenly spaced subset of the frames, a
+    default colour scale that stays fixed for the whole movie
+    """
+    step = max(len(frames) // nsample, 1)
+    return max(np.nanmax(np.abs(component(read_dump(fids, ncomp), comp)))
+               for _, fids in frames[::step])
+
+
+def make_movie(path, video_name, width=1080, extent=None, clip=None,
+               clip_fraction=1., comp="z", ncomp=2, cmap="seismic",
+               method="linear", index_file=None, stride=1, fps=20,
+               codec="MJPG", workers=None, prefetch=16):
+    """
+    Render the wavefield dumps of one run into a video
+
+    :type path: str
+    :param path: OUTPUT_FILES directory with the dumps
+    :type video_name: str
+    :param video_name: output video file
+    :param width, extent, method: see `build_raster_index`
+    :type clip: float
+    :param clip: amplitude at the ends of the colour scale, defaults to
+        `clip_fraction` times the largest amplitude (see `estimate_clip`)
+    :type clip_fraction: float
+    :param clip_fraction: fraction of the largest amplitude to clip at
+        when `clip` is not given, e.g., 0.1 to bring out weak phases
+    :param comp, ncomp: see `iter_rendered`
+    :type cmap: str
+    :param cmap: matplotlib colormap name
+    :type index_file: str
+    :param index_file: .npz to load the raster index from, or to save it to
+        if it does not exist yet. An existing index is used as is, so
+        delete it after changing the width, extent or method
+    :param stride: see `list_dumps`
+    :param fps, codec: see dis_field_video.write_video
+    :param workers, prefetch: see `iter_rendered`
+    :rtype: dict
+    :return: summary with the number of frames and the frames/s achieved
+    """
+    tstart = perf_counter()
+    grids, frames = list_dumps(path, stride)
+
+    if index_file and os.path.exists(index_file):
+        index = load_raster_index(index_file)
+    else:
+        index = build_raster_index(read_dump_grid(grids), width, extent,
+                                   method)
+        if index_file:
+            save_raster_index(index_file, index)
+    tindex = perf_counter() - tstart
+
+    if clip is None:
+        clip = clip_fraction * estimate_clip(frames, comp, ncomp)
+
+    nframes, width, height = write_video(
+        iter_rendered(frames, index, colormap_lut(cmap), clip, comp, ncomp,
+                      workers, prefetch),
+        video_name, fps, codec)
+
+    elapsed = perf_counter() - tstart
+    return {"video": video_name, "frames": nframes, "width": width,
+            "height": height, "clip": clip, "index_time": tindex,
+            "time": elapsed, "fps": nframes / (elapsed - tindex)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("path", nargs="?", default="OUTPUT_FILES",
+                        help="directory with the wavefield dumps")
+    parser.add_argument("-o", "--output", default="movie.avi",
+                        help="video file to write")
+    parser.add_argument("--width", type=int, default=1080,
+                        help="frame width in pixels")
+    parser.add_argument("--extent", type=float, nargs=4, default=None,
+                        metavar=("XMIN", "XMAX", "ZMIN", "ZMAX"),
+                        help="region to show in km, default all")
+    parser.add_argument("--clip", type=float, default=None,
+                        help="amplitude at the ends of the colour scale")
+    parser.add_argument("--clip-fraction", type=float, default=1.,
+                        help="clip at this fraction of the largest "
+                             "amplitude if --clip is not given")
+    parser.add_argument("-c", "--comp", default="z", choices=COMPONENTS,
+                        help="component to show")
+    parser.add_argument("--ncomp", type=int, default=2,
+                        help="values per point, 1 for pressure/SH dumps")
+    parser.add_argument("--cmap", default="seismic",
+                        help="matplotlib colormap")
+    parser.add_argument("--method", default="linear",
+                        choices=["linear", "nearest"],
+                        help="pixel interpolation")
+    parser.add_argument("--index", default=None,
+                        help=".npz to reuse the raster index from (created "
+                             "if it does not exist)")
+    parser.add_argument("--stride", type=int, default=1,
+                        help="use every n-th dump")
+    parser.add_argument("--fps", type=float, default=20,
+                        help="frames per second of the video")
+    parser.add_argument("--codec", default="MJPG",
+                        help="OpenCV four character codec code")
+    parser.add_argument("-w", "--workers", type=int, default=None,
+                        help="number of rendering processes")
+    parser.add_argument("--prefetch", type=int, default=16,
+                        help="frames rendered ahead of the encoder")
+    args = parser.parse_args()
+
+    extent = None if args.extent is None else [_ * 1E3 for _ in args.extent]
+    movie = make_movie(args.path, args.output, width=args.width,
+                       extent=extent, clip=args.clip,
+                       clip_fraction=args.clip_fraction, comp=args.comp,
+                       ncomp=args.ncomp, cmap=args.cmap, method=args.method,
+                       index_file=args.index, stride=args.stride,
+                       fps=args.fps, codec=args.codec, workers=args.workers,
+                       prefetch=args.prefetch)
+    print(f"Video '{movie['video']}' created successfully: "
+          f"{movie['frames']} frames of {movie['width']}x{movie['height']}, "
+          f"clip {movie['clip']:.3g}, raster index {movie['index_time']:.2f}s"
+          f", {movie['time']:.2f}s total ({movie['fps']:.1f} frames/s)")